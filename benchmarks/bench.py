@@ -0,0 +1,256 @@
+"""
+Benchmark suite: python -m benchmarks.bench [--output results.json] [--compare baseline.json]
+
+Measures instructions per second for each synthetic ROM on both engines and
+with an execution trace attached, frames per second of EmulatorScreen.render
+under the dummy SDL video driver, and ROM load / startup times. Every result is
+the best of several timings taken in interleaved rounds after a warm-up round
+(REPEATS, or STARTUP_REPEATS for the noisier process startups). Timings are CPU
+time, the process's or the child interpreter's for startups, rather than wall
+time, which on a shared machine also counts time spent running other work.
+
+Results are written as JSON; with --compare, any result worse than the baseline
+by more than --threshold is reported and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows: startups are timed by the wall clock
+
+from benchmarks.roms import ROMS
+from mychip8.chip8 import Chip8Hardware
+from mychip8.compiler import BlockCompiler
+from mychip8.trace import TraceWriter
+
+# Timings taken of each benchmark after a warm-up round, the best one is kept
+REPEATS = 5
+STARTUP_REPEATS = 15
+
+# CPU seconds of this process, what the in-process benchmarks are timed with
+clock = time.process_time
+
+
+def load(rom_data):
+    hardware = Chip8Hardware()
+    hardware.load_rom(rom_data)
+    return hardware
+
+
+def bench_cycle(rom_data, cycles):
+    """Instructions per second through Chip8Hardware.cycle."""
+    hardware = load(rom_data)
+    cycle = hardware.cycle
+    start = clock()
+    for _ in range(cycles):
+        cycle()
+    return cycles / (clock() - start)
+
+
+def bench_run(rom_data, cycles):
+    """Instructions per second through Chip8Hardware.run."""
+    hardware = load(rom_data)
+    start = clock()
+    hardware.run(cycles)
+    return cycles / (clock() - start)
+
+
+def bench_compiled(rom_data, cycles):
+    """Instructions per second through the BlockCompiler."""
+    hardware = load(rom_data)
+    engine = BlockCompiler(hardware)
+    start = clock()
+    engine.run(cycles)
+    return cycles / (clock() - start)
+
+
+def bench_trace(rom_data, cycles, compression):
+    """Instructions per second through Chip8Hardware.run with a TraceWriter attached."""
+    hardware = load(rom_data)
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = TraceWriter(hardware, os.path.join(directory, "bench.trace"), compression)
+        tracer.attach()
+        start = clock()
+        hardware.run(cycles)
+        tracer.close()
+        return cycles / (clock() - start)
+
+
+def bench_render(frames, hires=False):
+    """EmulatorScreen.render frames per second, with every frame dirty (128x64 on two planes with hires)."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    from mychip8.screen import EmulatorScreen
+    from mychip8.settings import STANDARD_SETTINGS
+
+    hardware = load(ROMS["sprites"]())
+    if hires:
+        hardware.set_resolution(128, 64)
+        hardware.planes[1][:] = [(row * 0x9E3779B97F4A7C15) & hardware.row_mask for row in range(64)]
+    app = EmulatorScreen(hardware, **STANDARD_SETTINGS)
+    app.init()
+
+    elapsed = 0.0
+    for _ in range(frames):
+        for _ in range(10):
+            hardware.cycle()
+        hardware.draw_flag = True
+
+        start = clock()
+        app.render()
+        elapsed += clock() - start
+
+    return frames / elapsed
+
+
+def bench_grid(frames, machines=64):
+    """GridView frames per second with that many machines, every tile dirty every frame."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    from mychip8.grid import GridView
+
+    view = GridView([load(ROMS["sprites"]()) for _ in range(machines)], scale=2)
+    view.init()
+
+    start = clock()
+    for _ in range(frames):
+        for tile in view.tiles:
+            tile.hardware.draw_flag = True
+        view.frame()
+    return frames / (clock() - start)
+
+
+def bench_load(repeat, reuse=False):
+    """
+    Seconds to load a full-size (0xE00 bytes) ROM into a fresh machine, or with
+    reuse into one machine that is reset each time.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".ch8", delete=False) as f:
+        f.write(bytes(range(256)) * 14)
+        path = f.name
+
+    try:
+        hardware = Chip8Hardware()
+        start = clock()
+        for _ in range(repeat):
+            if reuse:
+                hardware.reset()
+                hardware.load_rom(path)
+            else:
+                Chip8Hardware().load_rom(path)
+        return (clock() - start) / repeat
+    finally:
+        os.remove(path)
+
+
+def children_clock():
+    """CPU seconds used by the finished child processes."""
+    if resource is None:
+        return time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_startup(module):
+    """Seconds for a fresh interpreter to import module."""
+    start = children_clock()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True,
+                   env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"})
+    return children_clock() - start
+
+
+def run_suite(cycles=200_000, frames=300, quick=False):
+    """
+    Run everything, returns {name: {"value": float, "unit": str}}.
+
+    Benchmarks are timed in rounds, each one once per round after a warm-up
+    round, and the best timing of each is kept: the highest rate or the lowest
+    time. Interleaved, a few seconds of a slower machine cost a benchmark one of
+    its timings rather than all of them.
+    """
+    if quick:
+        cycles, frames = cycles // 10, frames // 10
+
+    # name -> (unit, repeats, benchmark, args)
+    suite = {}
+    for name, make_rom in ROMS.items():
+        rom_data = make_rom()
+        suite[f"cycle.{name}"] = ("ips", REPEATS, bench_cycle, (rom_data, cycles))
+        suite[f"compiled.{name}"] = ("ips", REPEATS, bench_compiled, (rom_data, cycles))
+
+    suite["run.alu"] = ("ips", REPEATS, bench_run, (ROMS["alu"](), cycles))
+    suite["trace.alu"] = ("ips", REPEATS, bench_trace, (ROMS["alu"](), cycles, None))
+    suite["trace.alu.gzip"] = ("ips", REPEATS, bench_trace, (ROMS["alu"](), cycles, "gzip"))
+
+    suite["render"] = ("fps", REPEATS, bench_render, (frames,))
+    suite["render.hires"] = ("fps", REPEATS, bench_render, (frames, True))
+    suite["render.grid64"] = ("fps", REPEATS, bench_grid, (frames // 5,))
+    suite["load_rom"] = ("s", REPEATS, bench_load, (1000,))
+    suite["load_rom.reset"] = ("s", REPEATS, bench_load, (1000, True))
+    suite["startup.headless"] = ("s", STARTUP_REPEATS, bench_startup, ("mychip8.run",))
+    suite["startup.screen"] = ("s", STARTUP_REPEATS, bench_startup, ("mychip8.screen",))
+
+    timings = {name: [] for name in suite}
+    for round_number in range(max(repeats for _, repeats, _, _ in suite.values()) + 1):
+        for name, (unit, repeats, benchmark, args) in suite.items():
+            if round_number > repeats:
+                continue
+            value = benchmark(*args)
+            if round_number: # Round 0 warms up: imports, caches, first display init
+                timings[name].append(value)
+
+    return {name: {"value": max(timings[name]) if unit in ("ips", "fps") else min(timings[name]), "unit": unit}
+            for name, (unit, _, _, _) in suite.items()}
+
+
+def compare(results, baseline, threshold):
+    """Names of the results that got worse than baseline by more than threshold (a ratio)."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        # Rates are better when higher, times when lower
+        change = (old - new) / old if result["unit"] in ("ips", "fps") else (new - old) / old
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description="MyChip8 benchmarks.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--quick", action="store_true", help="10x fewer iterations")
+    args = parser.parse_args(argv)
+
+    results = run_suite(quick=args.quick)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:20} {result['value']:>14.6g} {result['unit']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.6g} -> {new:.6g} ({change:.0%} worse)")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
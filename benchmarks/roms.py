@@ -0,0 +1,63 @@
+"""Synthetic ROMs that each stress one path of the emulator."""
+
+
+def assemble(*opcodes):
+    return b"".join(opcode.to_bytes(2, "big") for opcode in opcodes)
+
+
+def alu_rom():
+    """Tight loop of 8XYn arithmetic."""
+    return assemble(
+        0x6001, 0x6103, 0x6207,   # 0x200: V0, V1, V2 = 1, 3, 7
+        0x8014, 0x8125, 0x8216,   # 0x206: ADD, SUB, SHR
+        0x802E, 0x8117, 0x8231,   #        SHL, SUBN, OR
+        0x8012, 0x8123, 0x7001,   #        AND, XOR, ADD byte
+        0x1206,                   #        loop
+    )
+
+
+def sprite_rom():
+    """DXYN storm: 15-row sprites all over the screen, wrapping at the edges."""
+    return assemble(
+        0xA000,                   # 0x200: I = font (80 bytes of sprite data)
+        0xD01F, 0xD12F, 0xD20F,   # 0x202: three 15-row sprites
+        0x7003, 0x7105, 0x7209,   #        move them
+        0x1202,                   #        loop
+    )
+
+
+def cls_rom():
+    """CLS spam with a sprite in between so there is something to clear."""
+    return assemble(
+        0xA000,                   # 0x200: I = font
+        0x00E0, 0xD015, 0x7001,   # 0x202: CLS, draw, move
+        0x1202,                   #        loop
+    )
+
+
+def memcopy_rom():
+    """FX55 / FX65 block copies of all 16 registers."""
+    return assemble(
+        0xA400,                   # 0x200: I = 0x400
+        0xFF55, 0xFF65,           # 0x202: dump and load V0-VF
+        0x7001, 0x1202,           #        loop
+    )
+
+
+def call_rom(depth=15):
+    """CALL/RET chain `depth` levels deep."""
+    opcodes = [0x2204, 0x1200]    # 0x200: call the first level, repeat
+    for level in range(depth - 1):
+        # Each level calls the next one, which starts 4 bytes later
+        opcodes += [0x2204 + 4 * (level + 1), 0x00EE]
+    opcodes += [0x00EE]
+    return assemble(*opcodes)
+
+
+ROMS = {
+    "alu": alu_rom,
+    "sprites": sprite_rom,
+    "cls": cls_rom,
+    "memcopy": memcopy_rom,
+    "calls": call_rom,
+}
@@ -0,0 +1,145 @@
+"""
+Sound: a beeper that plays while the sound timer is nonzero.
+
+Every sound is a short looping buffer, generated once and kept as a
+pygame.mixer.Sound: the plain beep, or for XO-CHIP the 128-bit pattern loaded by
+F002 played at the FX3A pitch. After every timer tick (a Scheduler tick hook)
+the beeper only compares the timer, pattern and pitch with what is playing, and
+starts, switches or stops the looping buffer on its own mixer channel, so the
+emulation loop never builds samples or waits on the audio device. The mixer is
+opened with a buffer well under a frame (AUDIO_BUFFER samples), so a beep
+starts and stops within a frame of the tick that set or cleared the timer.
+
+NullBeeper has the same interface and only tracks what would play, for
+headless runs and machines without an audio device. pygame is only imported
+by Beeper, so NullBeeper works where pygame isn't installed.
+"""
+from array import array
+from collections import OrderedDict
+
+AUDIO_RATE = 48000
+AUDIO_BUFFER = 512          # Samples, about 11 ms at AUDIO_RATE
+AMPLITUDE = 8000
+
+# The plain beep is this pattern, a square wave with one period per pattern
+BEEP_PATTERN = bytes([0xFF] * 8 + [0x00] * 8)
+
+CACHE_SIZE = 64
+
+
+def pattern_rate(pitch):
+    """XO-CHIP pattern bits per second at a pitch (FX3A), 4000 at the default 64."""
+    return 4000 * 2 ** ((pitch - 64) / 48)
+
+
+def waveform(pattern, bits_per_second, sample_rate=AUDIO_RATE, channels=1):
+    """
+    One pass of a 16-byte pattern (most significant bit first, 1 high) as
+    signed 16-bit samples, each repeated for every channel, ready to loop.
+    """
+    bits = len(pattern) * 8
+    length = max(1, round(bits * sample_rate / bits_per_second))
+    levels = (-AMPLITUDE, AMPLITUDE)
+
+    samples = array("h")
+    for n in range(length):
+        bit = n * bits // length
+        samples.extend([levels[(pattern[bit >> 3] >> (7 - (bit & 7))) & 1]] * channels)
+    return samples
+
+
+class Beeper:
+    """
+    Plays the sound of a Chip8Hardware through pygame.mixer. Call update()
+    after every timer tick (tick_hook does, for Scheduler.tick_hooks) and
+    silence() while the machine is paused.
+    """
+
+    def __init__(self, hardware, volume=0.25, tone_hz=440):
+        import pygame
+
+        self.mixer = pygame.mixer
+        if not self.mixer.get_init():
+            self.mixer.init(AUDIO_RATE, -16, 1, AUDIO_BUFFER)
+        self.sample_rate, _, self.channels = self.mixer.get_init()
+
+        self.hardware = hardware
+        self.tone_hz = tone_hz
+        self.mixer.set_reserved(1)
+        self.channel = self.mixer.Channel(0)
+        self.channel.set_volume(volume)
+
+        self.sounds = OrderedDict()     # (pattern, pitch) -> Sound, pattern None for the beep
+        self.playing = None             # (pattern, pitch) being played, None when silent
+
+    def sound(self, pattern, pitch):
+        key = (pattern, pitch)
+        if key in self.sounds:
+            self.sounds.move_to_end(key)
+            return self.sounds[key]
+
+        if pattern is None:
+            samples = waveform(BEEP_PATTERN, self.tone_hz * len(BEEP_PATTERN) * 8, self.sample_rate, self.channels)
+        else:
+            samples = waveform(pattern, pattern_rate(pitch), self.sample_rate, self.channels)
+        self.sounds[key] = self.mixer.Sound(buffer=samples)
+        if len(self.sounds) > CACHE_SIZE:
+            self.sounds.popitem(last=False)
+        return self.sounds[key]
+
+    def update(self):
+        """Start, switch or stop the sound to match the machine."""
+        hardware = self.hardware
+        if hardware.sound_timer:
+            pattern = hardware.audio_pattern
+            # The plain beep ignores the pitch
+            pitch = hardware.pitch if pattern is not None else None
+            playing = self.playing
+            if playing is None or playing[0] != pattern or playing[1] != pitch:
+                self.start(pattern, pitch)
+        elif self.playing is not None:
+            self.silence()
+
+    def tick_hook(self, tick):
+        self.update()
+
+    def start(self, pattern, pitch):
+        self.channel.play(self.sound(pattern, pitch), loops=-1)
+        self.playing = (pattern, pitch)
+
+    def silence(self):
+        self.channel.stop()
+        self.playing = None
+
+    def close(self):
+        self.silence()
+        self.sounds.clear()
+
+
+class NullBeeper(Beeper):
+    """A Beeper without a mixer: playing tracks what would play, starts counts the sounds started."""
+
+    def __init__(self, hardware, volume=0.25, tone_hz=440):
+        self.hardware = hardware
+        self.playing = None
+        self.starts = 0
+
+    def start(self, pattern, pitch):
+        self.playing = (pattern, pitch)
+        self.starts += 1
+
+    def silence(self):
+        self.playing = None
+
+    def close(self):
+        self.playing = None
+
+
+def make_beeper(hardware, enabled=True, volume=0.25, tone_hz=440):
+    """A Beeper, or a NullBeeper when sound is disabled, pygame is missing or there is no audio device."""
+    if enabled:
+        try:
+            return Beeper(hardware, volume, tone_hz)
+        except (ImportError, RuntimeError):
+            pass # pygame.error is a RuntimeError
+    return NullBeeper(hardware, volume, tone_hz)
@@ -0,0 +1,179 @@
+"""
+Batch runner: python -m mychip8.batch ROMS... --frames N --report report.json
+
+Runs every ROM headless in a process pool and writes, per ROM, the final frame
+hash, a PNG screenshot, cycles executed, wall time and any exception raised.
+ROMS can be .ch8 files, directories (searched recursively) or manifests
+(.txt with one path per line, or .json with a list of paths).
+
+Every ROM starts from a machine reset with the same CXKK seed (--seed), so the
+report only changes when the emulator does. The quirk profile is --quirks, else
+the ROM's --quirk-db entry, else the default profile.
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from mychip8.quirks import PROFILES, build_machine, load_database, quirks_for_rom
+from mychip8.run import engine_runner
+
+REPORT_FIELDS = ["rom", "frame_hash", "screenshot", "cycles", "seconds", "error"]
+
+# Per worker process: (engine, quirks) -> (hardware, run), reset between ROMs instead of rebuilt
+_machines = {}
+# Per worker process: quirk database path -> database
+_databases = {}
+
+
+def collect_roms(sources):
+    """Expand files, directories and manifests into a sorted list of ROM paths."""
+    roms = []
+    for source in map(Path, sources):
+        if source.is_dir():
+            roms.extend(source.rglob("*.ch8"))
+        elif source.suffix == ".json":
+            roms.extend(Path(path) for path in json.loads(source.read_text()))
+        elif source.suffix == ".txt":
+            roms.extend(Path(line.strip()) for line in source.read_text().splitlines() if line.strip())
+        else:
+            roms.append(source)
+    return sorted(str(rom) for rom in roms)
+
+
+def write_png(hardware, path):
+    """Save the screen as a 1-bit grayscale PNG (the packed rows are already PNG scanlines)."""
+    row_bytes = (hardware.width + 7) // 8
+    frame = hardware.frame_bytes()
+    raw = b"".join(b"\x00" + frame[y * row_bytes:(y + 1) * row_bytes] for y in range(hardware.height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", hardware.width, hardware.height, 1, 0, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw))
+                + chunk(b"IEND", b""))
+
+
+def run_job(job):
+    """
+    Worker: run one ROM and return its report row. cycles counts the instructions
+    executed (a halt stops the count, a frame that raised isn't counted). Never
+    raises: errors running the ROM or saving its screenshot go in the row.
+    """
+    rom_path, frames, cycles_per_frame, engine, screenshot_dir, quirks, quirk_db, seed = job
+
+    result = dict.fromkeys(REPORT_FIELDS)
+    result.update(rom=rom_path, cycles=0)
+    start = time.perf_counter()
+
+    try:
+        with open(rom_path, "rb") as f:
+            rom_data = f.read()
+    except OSError as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    if quirks is None:
+        quirks = "default"
+        if quirk_db:
+            if quirk_db not in _databases:
+                _databases[quirk_db] = load_database(quirk_db)
+            quirks = quirks_for_rom(rom_data, _databases[quirk_db])
+
+    key = (engine, json.dumps(quirks, sort_keys=True))
+    if key not in _machines:
+        hardware = build_machine(quirks, seed=seed)
+        _machines[key] = hardware, engine_runner(hardware, engine)
+    hardware, run = _machines[key]
+
+    try:
+        hardware.reset(seed)
+        hardware.load_rom(rom_data)
+        for _ in range(frames):
+            result["cycles"] += run(cycles_per_frame)
+            hardware.tick_timers()
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error} (pc={hardware.pc:03X})"
+
+    result["seconds"] = time.perf_counter() - start
+    result["frame_hash"] = hardware.frame_hash()
+
+    if screenshot_dir:
+        name = Path(rom_path).stem + "-" + result["frame_hash"] + ".png"
+        path = os.path.join(screenshot_dir, name)
+        try:
+            write_png(hardware, path)
+            result["screenshot"] = path
+        except Exception as error:
+            screenshot_error = f"screenshot {type(error).__name__}: {error}"
+            result["error"] = f"{result['error']}; {screenshot_error}" if result["error"] else screenshot_error
+
+    return result
+
+
+def run_batch(roms, frames=600, cycles_per_frame=10, engine="interpreter",
+              screenshot_dir=None, workers=None, quirks=None, quirk_db=None, seed=0):
+    """
+    Run every ROM across a process pool, returns the report rows in ROM order.
+    quirks is a profile name for every ROM, None to look each one up in the
+    quirk_db file (default profile when it has no entry); seed seeds CXKK.
+    """
+    if screenshot_dir:
+        os.makedirs(screenshot_dir, exist_ok=True)
+
+    jobs = [(rom, frames, cycles_per_frame, engine, screenshot_dir, quirks, quirk_db, seed) for rom in roms]
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(jobs) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_job, jobs, chunksize=chunksize))
+
+
+def write_report(results, path):
+    """JSON or CSV depending on the extension of path."""
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump(results, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.batch", description="Run many CHIP-8 ROMs headless.")
+    parser.add_argument("roms", nargs="+", help=".ch8 files, directories or manifests")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--cycles-per-frame", type=int, default=10)
+    parser.add_argument("--engine", choices=("interpreter", "compiled"), default="interpreter")
+    parser.add_argument("--quirks", choices=PROFILES, help="quirk profile (default: from --quirk-db, else default)")
+    parser.add_argument("--quirk-db", help="JSON database of quirk profiles by ROM SHA-1")
+    parser.add_argument("--seed", type=int, default=0, help="CXKK seed every ROM starts with")
+    parser.add_argument("--screenshots", help="directory for the PNG screenshots")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--report", default="report.json", help="report path, .json or .csv")
+    args = parser.parse_args(argv)
+
+    roms = collect_roms(args.roms)
+    start = time.perf_counter()
+    results = run_batch(roms, args.frames, args.cycles_per_frame, args.engine,
+                        args.screenshots, args.workers, args.quirks, args.quirk_db, args.seed)
+    elapsed = time.perf_counter() - start
+
+    write_report(results, args.report)
+
+    failed = sum(1 for result in results if result["error"])
+    print(f"{len(results)} ROMs in {elapsed:.2f}s, {failed} failed, report: {args.report}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
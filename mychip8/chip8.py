@@ -1,78 +1,402 @@
-from random import randrange
-from mychip8.opcodes import OPCODE_TABLE, SUB_TABLE_0, SUB_TABLE_8, SUB_TABLE_E, SUB_TABLE_F
+import hashlib
+import os
+import struct
+from array import array
+from random import Random
+from mychip8.opcodes import OPCODE_TABLE, SUB_TABLE_0, SUB_TABLE_5, SUB_TABLE_8, SUB_TABLE_E, SUB_TABLE_F
+
+# pc, i, sp, delay_timer, sound_timer, width, height, plane_mask, pitch, audio pattern loaded,
+# waiting_key, then the RNG's cached gauss value (flag, value) ahead of the buffers in a snapshot
+SNAPSHOT_HEADER = struct.Struct("<HHhBBHHBBBB?d")
+# The Mersenne Twister state of random.Random: 624 words and the position in them
+RNG_STATE = struct.Struct("<625I")
+
+# Byte value -> its 8 pixels as 0/1 bytes, used to unpack screen rows
+BYTE_PIXELS = [bytes((byte >> (7 - bit)) & 1 for bit in range(8)) for byte in range(256)]
+
+# Resolutions selected by 00FE / 00FF
+LORES = (64, 32)
+HIRES = (128, 64)
+
+# Where the SCHIP/XO-CHIP 8x10 digits (FX30) start, right after the 4x5 font
+BIG_FONT_ADDRESS = 0x50
+
+# 4x5 digits at 0, then the SCHIP/XO-CHIP 8x10 digits at BIG_FONT_ADDRESS
+FONTSET = bytes([
+    0xF0, 0x90, 0x90, 0x90, 0xF0, # 0
+    0x20, 0x60, 0x20, 0x20, 0x70, # 1
+    0xF0, 0x10, 0xF0, 0x80, 0xF0, # 2
+    0xF0, 0x10, 0xF0, 0x10, 0xF0, # 3
+    0x90, 0x90, 0xF0, 0x10, 0x10, # 4
+    0xF0, 0x80, 0xF0, 0x10, 0xF0, # 5
+    0xF0, 0x80, 0xF0, 0x90, 0xF0, # 6
+    0xF0, 0x10, 0x20, 0x40, 0x40, # 7
+    0xF0, 0x90, 0xF0, 0x90, 0xF0, # 8
+    0xF0, 0x90, 0xF0, 0x10, 0xF0, # 9
+    0xF0, 0x90, 0xF0, 0x90, 0x90, # A
+    0xE0, 0x90, 0xE0, 0x90, 0xE0, # B
+    0xF0, 0x80, 0x80, 0x80, 0xF0, # C
+    0xE0, 0x90, 0x90, 0x90, 0xE0, # D
+    0xF0, 0x80, 0xF0, 0x80, 0xF0, # E
+    0xF0, 0x80, 0xF0, 0x80, 0x80, # F
+
+    # 8x10 digits for FX30, at BIG_FONT_ADDRESS
+    0xFF, 0xFF, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, # 0
+    0x18, 0x78, 0x78, 0x18, 0x18, 0x18, 0x18, 0x18, 0xFF, 0xFF, # 1
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, # 2
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 3
+    0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0x03, 0x03, # 4
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 5
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, # 6
+    0xFF, 0xFF, 0x03, 0x03, 0x06, 0x0C, 0x18, 0x18, 0x18, 0x18, # 7
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, # 8
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, # 9
+    0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3, # A
+    0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, # B
+    0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C, # C
+    0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC, # D
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, # E
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0  # F
+])
+
+# ROMs are loaded here, up to the end of memory
+PROGRAM_START = 0x200
+
+# XO-CHIP pitch register (FX3A) at power-on, 4000 pattern bits per second
+DEFAULT_PITCH = 64
+
+class IdleLoop(Exception):
+    """
+    Raised by the idle-loop handlers once the machine is spinning in a loop of
+    `period` instructions that changes nothing until the next timer tick or key event.
+    """
+
+    def __init__(self, period):
+        super().__init__(period)
+        self.period = period
+
+class Stop(Exception):
+    """
+    Raised by an instrumented handler (see dispatch_patches) to stop run() early.
+    ran says whether the instruction it stopped on has run; run() sets cycles to
+    how many of its cycles were used up before the stop.
+    """
+    ran = False
+    cycles = 0
 
 class Chip8Hardware:
+    __slots__ = ("width", "height", "row_mask", "screen", "planes", "plane_mask", "selected_planes",
+                 "draw_flag", "opcode_table", "opcode_table0", "opcode_table5", "opcode_table8",
+                 "opcode_tableE", "opcode_tableF", "memory", "address_mask", "v", "i", "pc", "stack", "sp",
+                 "flags", "keys", "waiting_key", "delay_timer", "sound_timer", "audio_pattern", "pitch", "rng", "decode_cache",
+                 "invalidation_hooks", "dispatch_patches")
+
     def __init__(self, opcode_table = OPCODE_TABLE, opcode_table0 = SUB_TABLE_0,
                  opcode_table8 = SUB_TABLE_8, opcode_tableE = SUB_TABLE_E,
-                 opcode_tableF = SUB_TABLE_F):
-        LARGURA, ALTURA = 64, 32
+                 opcode_tableF = SUB_TABLE_F, seed = None, opcode_table5 = SUB_TABLE_5,
+                 memory_size = 4096):
+        self.width, self.height = LORES
+        self.row_mask = (1 << self.width) - 1
 
-        self.screen = [[0 for _ in range(LARGURA)] for _ in range(ALTURA)]
+        # One int per row, the leftmost pixel is the most significant bit
+        self.screen = [0] * self.height
+        # XO-CHIP bitplanes, screen is the first one. DXYN, CLS and the scrolls
+        # work on the planes selected by FN01 (plane_mask bit 0 = first plane)
+        self.planes = [self.screen, [0] * self.height]
+        self.plane_mask = 1
+        self.selected_planes = [self.screen]
+        # Set by CLS/DXYN, cleared by whoever presents the frame
+        self.draw_flag = True
 
         self.opcode_table = opcode_table
         self.opcode_table0 = opcode_table0
+        self.opcode_table5 = opcode_table5
         self.opcode_table8 = opcode_table8
         self.opcode_tableE = opcode_tableE
         self.opcode_tableF = opcode_tableF
 
-        self.memory = [0] * 4096      # RAM
-        self.v = [0] * 16             # Registers V0-VF
-        self.i = 0                    # index
-        self.pc = 0x200               # Program Counter starts at 0x200
-        self.stack = [0] * 16         # Stack
-        self.sp = 0                   # Stack Pointer
+        self.memory = bytearray(memory_size)  # RAM, 4K or XO-CHIP's 64K
+        self.address_mask = memory_size - 1   # I wraps around at the end of memory
+        self.v = bytearray(16)            # Registers V0-VF
+        self.i = 0                        # index
+        self.pc = 0x200                   # Program Counter starts at 0x200
+        self.stack = array("H", [0] * 16) # Stack
+        self.sp = 0                       # Stack Pointer
+        self.flags = bytearray(16)        # SCHIP "RPL" user flags (FX75 / FX85)
 
-        self.keys = [0] * 16
+        self.keys = bytearray(16)
         self.waiting_key = 0
 
         self.delay_timer = 0
         self.sound_timer = 0
+        # XO-CHIP audio: the 16-byte (128 one-bit samples) pattern loaded by F002,
+        # None until then for the plain beep, and the FX3A pitch
+        self.audio_pattern = None
+        self.pitch = DEFAULT_PITCH
+
+        # Per-machine RNG for CXKK, seed it to make runs reproducible
+        self.rng = Random(seed)
+
+        # Decoded (handler, opcode) slots keyed by address, filled lazily by cycle()
+        self.decode_cache = [None] * len(self.memory)
+        self.invalidation_hooks = []
+        # Functions (address, slot) -> slot applied to every newly decoded slot,
+        # so tools can instrument dispatch without a check on every cycle
+        self.dispatch_patches = []
     
-        self.fontset = [
-            0xF0, 0x90, 0x90, 0x90, 0xF0, # 0
-            0x20, 0x60, 0x20, 0x20, 0x70, # 1
-            0xF0, 0x10, 0xF0, 0x80, 0xF0, # 2
-            0xF0, 0x10, 0xF0, 0x10, 0xF0, # 3
-            0x90, 0x90, 0xF0, 0x10, 0x10, # 4
-            0xF0, 0x80, 0xF0, 0x10, 0xF0, # 5
-            0xF0, 0x80, 0xF0, 0x90, 0xF0, # 6
-            0xF0, 0x10, 0x20, 0x40, 0x40, # 7
-            0xF0, 0x90, 0xF0, 0x90, 0xF0, # 8
-            0xF0, 0x90, 0xF0, 0x10, 0xF0, # 9
-            0xF0, 0x90, 0xF0, 0x90, 0x90, # A
-            0xE0, 0x90, 0xE0, 0x90, 0xE0, # B
-            0xF0, 0x80, 0x80, 0x80, 0xF0, # C
-            0xE0, 0x90, 0x90, 0x90, 0xE0, # D
-            0xF0, 0x80, 0xF0, 0x80, 0xF0, # E
-            0xF0, 0x80, 0xF0, 0x80, 0x80  # F
-        ]
-    
-        for i, byte in enumerate(self.fontset):
-            self.memory[i] = byte
+
+        self.memory[:len(FONTSET)] = FONTSET
+
+    def reset(self, seed=None):
+        """
+        Power-cycle the machine in place: memory holds only the fontset again and
+        every register, timer, key and plane is cleared. The opcode tables,
+        dispatch patches and invalidation hooks (e.g. a BlockCompiler) stay, so a
+        machine can be reused for ROM after ROM. seed reseeds the CXKK RNG,
+        without one it carries on.
+        """
+        self.memory[:] = bytes(len(self.memory))
+        self.memory[:len(FONTSET)] = FONTSET
+        self.invalidate_code(0, len(self.memory))
+
+        self.v[:] = bytes(16)
+        self.i = 0
+        self.pc = PROGRAM_START
+        self.stack[:] = array("H", [0] * 16)
+        self.sp = 0
+        self.flags[:] = bytes(16)
+        self.keys[:] = bytes(16)
+        self.waiting_key = 0
+        self.delay_timer = 0
+        self.sound_timer = 0
+        self.audio_pattern = None
+        self.pitch = DEFAULT_PITCH
+        if seed is not None:
+            self.rng.seed(seed)
+
+        self.set_resolution(*LORES)
+        self.select_planes(1)
+
+    def load_rom(self, rom):
+        """
+        Copy a ROM into memory at 0x200 in one go. rom is a file path or anything
+        supporting the buffer protocol (bytes, bytearray, memoryview, mmap).
+        Raises ValueError, before touching memory, if it does not fit.
+        Returns the ROM size.
+        """
+        capacity = len(self.memory) - PROGRAM_START
+
+        if isinstance(rom, (str, os.PathLike)):
+            with open(rom, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size > capacity:
+                    raise ValueError(f"{rom} is {size} bytes, only {capacity} fit in memory")
+                # Read straight into memory, no intermediate bytes object
+                with memoryview(self.memory) as memory:
+                    size = f.readinto(memory[PROGRAM_START:PROGRAM_START + size])
+        else:
+            with memoryview(rom) as data:
+                size = data.nbytes
+                if size > capacity:
+                    raise ValueError(f"ROM is {size} bytes, only {capacity} fit in memory")
+                self.memory[PROGRAM_START:PROGRAM_START + size] = data.cast("B")
+
+        self.invalidate_code(PROGRAM_START, PROGRAM_START + size)
+        return size
+
+    def tick_timers(self):
+        """Decrement the delay and sound timers, called at 60 Hz."""
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+        if self.sound_timer > 0:
+            self.sound_timer -= 1
+
+    def get_pixel(self, x, y):
+        """1 if the pixel at (x, y) is set."""
+        return (self.screen[y] >> (self.width - 1 - x)) & 1
+
+    def framebuffer(self):
+        """The screen unpacked into rows of 0/1 ints, for debugging and tooling."""
+        return [[(row >> shift) & 1 for shift in range(self.width - 1, -1, -1)]
+                for row in self.screen]
+
+    def frame_bytes(self, plane=0):
+        """The packed rows of a plane (the screen by default) as bytes."""
+        row_bytes = (self.width + 7) // 8
+        return b"".join(row.to_bytes(row_bytes, "big") for row in self.planes[plane])
+
+    def pixel_bytes(self):
+        """
+        One byte per pixel, row by row, ready for an 8-bit surface: the color
+        index, bit 0 from the first plane and bit 1 from the second.
+        """
+        pixels = b"".join(BYTE_PIXELS[byte] for byte in self.frame_bytes())
+        if not any(self.planes[1]):
+            return pixels
+
+        second = b"".join(BYTE_PIXELS[byte] for byte in self.frame_bytes(1))
+        # Every byte is 0 or 1, so shifting the whole frame as one int moves each into bit 1
+        return (int.from_bytes(pixels, "big") | int.from_bytes(second, "big") << 1).to_bytes(len(pixels), "big")
+
+    def frame_hash(self):
+        """Short hex digest of the current screen, to compare frames cheaply."""
+        frame = self.frame_bytes()
+        if any(self.planes[1]):
+            frame += self.frame_bytes(1)
+        return hashlib.blake2b(frame, digest_size=8).hexdigest()
+
+    def set_resolution(self, width, height):
+        """Switch between LORES and HIRES, which clears every plane."""
+        self.width, self.height = width, height
+        self.row_mask = (1 << width) - 1
+        for plane in self.planes:
+            plane[:] = [0] * height
+        self.draw_flag = True
+
+    def select_planes(self, mask):
+        self.plane_mask = mask
+        self.selected_planes = [plane for bit, plane in enumerate(self.planes) if mask & (1 << bit)]
+
+    def snapshot(self):
+        """The whole machine state as one bytes object (see restore)."""
+        _, rng_words, gauss_next = self.rng.getstate()
+        header = SNAPSHOT_HEADER.pack(self.pc, self.i, self.sp, self.delay_timer, self.sound_timer,
+                                      self.width, self.height, self.plane_mask, self.pitch,
+                                      self.audio_pattern is not None, self.waiting_key,
+                                      gauss_next is not None, gauss_next or 0.0)
+        return b"".join((header, RNG_STATE.pack(*rng_words), self.memory, self.v, self.stack.tobytes(),
+                         self.keys, self.flags, self.audio_pattern or bytes(16),
+                         self.frame_bytes(), self.frame_bytes(1)))
+
+    def restore(self, snapshot):
+        """Load a state taken by snapshot(), in place."""
+        (self.pc, self.i, self.sp, self.delay_timer, self.sound_timer,
+         width, height, plane_mask, self.pitch, has_pattern, self.waiting_key,
+         has_gauss, gauss_next) = SNAPSHOT_HEADER.unpack_from(snapshot)
+
+        # CXKK after a restore draws what it drew the first time
+        offset = SNAPSHOT_HEADER.size
+        version = self.rng.getstate()[0]
+        self.rng.setstate((version, RNG_STATE.unpack_from(snapshot, offset), gauss_next if has_gauss else None))
+        offset += RNG_STATE.size
+        memory = snapshot[offset:offset + len(self.memory)]
+        if memory != self.memory:
+            self.memory[:] = memory
+            self.invalidate_code(0, len(self.memory))
+        offset += len(self.memory)
+
+        self.v[:] = snapshot[offset:offset + 16]
+        offset += 16
+        stack_bytes = len(self.stack) * self.stack.itemsize
+        self.stack[:] = array("H", snapshot[offset:offset + stack_bytes])
+        offset += stack_bytes
+        self.keys[:] = snapshot[offset:offset + 16]
+        offset += 16
+        self.flags[:] = snapshot[offset:offset + 16]
+        offset += 16
+        self.audio_pattern = bytes(snapshot[offset:offset + 16]) if has_pattern else None
+        offset += 16
+
+        self.width, self.height = width, height
+        self.row_mask = (1 << width) - 1
+        row_bytes = (width + 7) // 8
+        for plane in self.planes:
+            plane[:] = [int.from_bytes(snapshot[offset + y * row_bytes:offset + (y + 1) * row_bytes], "big")
+                        for y in range(height)]
+            offset += height * row_bytes
+        self.select_planes(plane_mask)
+        self.draw_flag = True
 
     def cycle(self):
-        hi_bytes, lo_bytes = (self.memory[self.pc]), self.memory[self.pc+1]
-        opcode = (hi_bytes << 8)| lo_bytes
+        pc = self.pc
+        slot = self.decode_cache[pc]
+        if slot is None:
+            slot = self.decode_at(pc)
 
-        self.read_opcode(opcode)
-        return f'{hex(opcode)} at {hex(self.pc)}'
+        method, opcode = slot
+        if method is not None:
+            self.pc = pc + 2
+            try:
+                method(opcode)
+            except IdleLoop:
+                pass
+
+        return opcode
+
+    def run(self, cycles):
+        """
+        Execute `cycles` instructions. Busy-wait loops are fast-forwarded: once an
+        idle loop is detected the remaining whole iterations are skipped, which
+        leaves the machine in exactly the state running them would have.
+        A Stop raised by a handler is passed on with its cycles set.
+        Returns the number of instructions executed: cycles, or fewer if the
+        machine halted (0000) on the way.
+        """
+        cache = self.decode_cache
+        remaining = cycles
+
+        while remaining > 0:
+            try:
+                while remaining > 0:
+                    remaining -= 1
+                    pc = self.pc
+                    method, opcode = cache[pc] or self.decode_at(pc)
+                    if method is None:
+                        cycles -= remaining + 1 # Halted for good, the rest never runs
+                        remaining = 0
+                        break
+                    self.pc = pc + 2
+                    method(opcode)
+            except IdleLoop as idle:
+                remaining %= idle.period
+            except Stop as stop:
+                stop.cycles = cycles - remaining - (0 if stop.ran else 1)
+                raise
+
+        return cycles
+
+    def decode_at(self, address):
+        """Decode the instruction at address and store it in the decode cache."""
+        opcode = (self.memory[address] << 8) | self.memory[address + 1]
 
-    def read_opcode(self, opcode):
         if opcode == 0x0000:
-            return opcode
+            # Halt: the slot has no handler so the PC never moves
+            slot = (None, opcode)
+        else:
+            method = self.decode_opcode(opcode) or self.NOP
+            slot = (self.idle_variant(address, method, opcode), opcode)
 
-        self.pc += 2
+        for patch in self.dispatch_patches:
+            slot = patch(address, slot)
 
-        # Decode
+        self.decode_cache[address] = slot
+        return slot
+
+    def idle_variant(self, address, method, opcode):
+        """Swap in an idle-loop aware handler for the busy-wait patterns run() can skip."""
+        function = getattr(method, "__func__", None)
+
+        if function is Chip8Hardware.JUMP:
+            target = opcode & 0x0FFF
+            if target == address:
+                return self.JUMP_idle
+            if target == address - 4:
+                return self.JUMP_idle_timer
+        elif function is Chip8Hardware.LD_Vx_K:
+            return self.LD_Vx_K_idle
+
+        return method
+
+    def decode_opcode(self, opcode):
+        """Resolve an opcode to its bound handler (None if it isn't implemented)."""
         first = (opcode & 0xF000) >> 12
-        
+
         method_name = self.opcode_table.get(first)
         # Sub-selection logic
         if method_name == "TABLE_0":
             method_name = self.opcode_table0.get(opcode)
-            getattr(self, method_name)()
-            
-            return opcode
+        elif method_name == "TABLE_5":
+            method_name = self.opcode_table5.get(opcode & 0x000F)
         elif method_name == "TABLE_8":
             method_name = self.opcode_table8.get(opcode & 0x000F)
         elif method_name == "TABLE_E":
@@ -80,19 +404,57 @@ class Chip8Hardware:
         elif method_name == "TABLE_F":
             method_name = self.opcode_tableF.get(opcode & 0x00FF)
 
-        # Execute
         if method_name:
-            method = getattr(self, method_name)
+            return getattr(self, method_name)
+        return None
+
+    def invalidate_code(self, start, end):
+        """
+        Drop decoded slots for memory[start:end]. Must be called after anything
+        writes into memory, so self-modifying ROMs see the new instructions.
+        """
+        # The slot one byte before start also reads memory[start]
+        start = max(start - 1, 0)
+        end = min(end, len(self.decode_cache))
+        self.decode_cache[start:end] = [None] * (end - start)
+
+        for hook in self.invalidation_hooks:
+            hook(start, end)
+
+    def patch_dispatch(self, patch):
+        """Install a dispatch patch (see dispatch_patches) and re-decode everything."""
+        self.dispatch_patches.append(patch)
+        self.decode_cache[:] = [None] * len(self.decode_cache)
+
+    def unpatch_dispatch(self, patch):
+        """Remove a dispatch patch, restoring the plain handlers."""
+        self.dispatch_patches.remove(patch)
+        self.decode_cache[:] = [None] * len(self.decode_cache)
+
+    def read_opcode(self, opcode):
+        if opcode == 0x0000:
+            return opcode
+
+        self.pc += 2
+
+        method = self.decode_opcode(opcode)
+
+        # Execute
+        if method:
             method(opcode)
 
             return opcode
 
+    def NOP(self, opcode=None):
+        """Unknown opcodes (e.g. 0NNN SYS) are skipped."""
+
     # --- 0x0: SYSTEM INSTRUCTIONS ---
-    def CLS(self):
-        """00E0: Clear the display (fills the screen matrix with 0)."""
-        self.screen = [[0 for _ in range(64)] for _ in range(32)]
+    def CLS(self, opcode=None):
+        """00E0: Clear the display (zeroes every row in place)."""
+        self.screen[:] = [0] * self.height
+        self.draw_flag = True
     
-    def RET(self):
+    def RET(self, opcode=None):
         """00EE: Return from a subroutine. Pops the address from the stack."""
         self.sp -= 1
         self.pc = self.stack[self.sp]
@@ -110,6 +472,32 @@ class Chip8Hardware:
         self.sp += 1
         self.pc = address
     
+    # --- IDLE LOOPS (see run) ---
+    def JUMP_idle(self, opcode):
+        """1NNN jumping to itself: nothing changes until the program is interrupted."""
+        self.JUMP(opcode)
+        raise IdleLoop(1)
+
+    def JUMP_idle_timer(self, opcode):
+        """
+        1NNN closing a delay timer wait (NNN: LD Vx, DT / SE Vx, 0 / JP NNN).
+        Once Vx already holds DT (!= 0) every iteration is the same until the next timer tick.
+        """
+        self.JUMP(opcode)
+
+        # The loop body is checked here, it may have changed since decoding
+        hi, lo, hi2, lo2 = self.memory[self.pc:self.pc + 4]
+        if (hi & 0xF0 == 0xF0 and lo == 0x07 and hi2 == 0x30 | (hi & 0x0F) and lo2 == 0x00
+                and self.delay_timer != 0 and self.v[hi & 0x0F] == self.delay_timer):
+            raise IdleLoop(3)
+
+    def LD_Vx_K_idle(self, opcode):
+        """FX0A: while no key is pressed every retry is the same."""
+        pc = self.pc
+        self.LD_Vx_K(opcode)
+        if self.pc != pc:
+            raise IdleLoop(1)
+
     # --- 0x3, 0x4, 0x5 & 0x9: CONDITIONAL SKIPS ---
     def SE_Vx_byte(self, opcode):
         """3XKK: Skip next instruction if VX == KK."""
@@ -225,7 +613,7 @@ class Chip8Hardware:
         """CXKK: Set VX = (random byte) AND KK."""
         x = (opcode & 0x0F00) >> 8
         kk = (opcode & 0x00FF)
-        self.v[x] = randrange(256) & kk
+        self.v[x] = self.rng.randrange(256) & kk
 
     def DRW_Vx_Vy_nibble(self, opcode):
         """
@@ -237,26 +625,33 @@ class Chip8Hardware:
         x_reg = (opcode & 0x0F00) >> 8
         y_reg = (opcode & 0x00F0) >> 4
         height = (opcode & 0x000F)
-        x_start = self.v[x_reg] % 64
-        y_start = self.v[y_reg] % 32
+        x_start = self.v[x_reg] % self.width
+        y_start = self.v[y_reg] % self.height
 
-        self.v[0xF] = 0
+        # Where the sprite byte lands in the row; negative means it wraps around
+        shift = self.width - 8 - x_start
+        screen = self.screen
+        collision = 0
 
         for row in range(height):
 
             sprite_byte = self.memory[self.i + row]
+            if not sprite_byte:
+                continue
 
-            for col in range(8):
-                sprite_pixel = (sprite_byte >> (7 - col)) & 1
+            if shift >= 0:
+                bits = sprite_byte << shift
+            else:
+                bits = (sprite_byte >> -shift) | ((sprite_byte << (self.width + shift)) & self.row_mask)
 
-                if sprite_pixel == 1:
-                    curr_x = (x_start + col) % 64
-                    curr_y = (y_start + row) % 32
+            curr_y = (y_start + row) % self.height
+            if screen[curr_y] & bits:
+                collision = 1
 
-                    if self.screen[curr_y][curr_x] == 1:
-                        self.v[0xF] = 1
+            screen[curr_y] ^= bits
 
-                    self.screen[curr_y][curr_x] ^= 1
+        self.v[0xF] = collision
+        self.draw_flag = True
     
     def SKP_Vx(self, opcode):
         """ EX9E: Skip next instruction if key with the value of VX is pressed. """
@@ -306,7 +701,7 @@ class Chip8Hardware:
     def ADD_I_Vx(self, opcode):
         """ Fx1E: Set I = I + VX. """
         x = (opcode & 0x0F00) >> 8
-        self.i = (self.i + self.v[x]) & 0xFFF
+        self.i = (self.i + self.v[x]) & self.address_mask
 
     def LD_B_Vx(self, opcode):
         """ FX33 """
@@ -318,6 +713,8 @@ class Chip8Hardware:
         self.memory[self.i + 1] = (number % 100) // 10
         self.memory[self.i + 2] = (number % 10)
 
+        self.invalidate_code(self.i, self.i + 3)
+
     def LD_I_Vx(self, opcode):
         """ FX55 """
         x = (opcode & 0x0F00) >> 8
@@ -325,6 +722,8 @@ class Chip8Hardware:
         for count in range(x + 1):
             self.memory[self.i + count] = self.v[count]
 
+        self.invalidate_code(self.i, self.i + x + 1)
+
     def LD_Vx_I(self, opcode):
         """ Fx65 """
 
@@ -338,4 +737,301 @@ class Chip8Hardware:
         x = (opcode & 0x0F00) >> 8
         character = self.v[x] & 0x0F
         
-        self.i = character * 5
\ No newline at end of file
+        self.i = character * 5
+    # --- SUPER-CHIP / XO-CHIP (see opcodes.SCHIP_TABLES and XO_CHIP_TABLES) ---
+    def CLS_planes(self, opcode=None):
+        """00E0 (XO-CHIP): Clear the selected planes."""
+        for plane in self.selected_planes:
+            plane[:] = [0] * self.height
+        self.draw_flag = True
+
+    def SCD_nibble(self, opcode):
+        """00CN: Scroll the selected planes down N rows."""
+        n = opcode & 0x000F
+        for plane in self.selected_planes:
+            plane[:] = [0] * n + plane[:self.height - n]
+        self.draw_flag = True
+
+    def SCU_nibble(self, opcode):
+        """00DN (XO-CHIP): Scroll the selected planes up N rows."""
+        n = opcode & 0x000F
+        for plane in self.selected_planes:
+            plane[:] = plane[n:] + [0] * n
+        self.draw_flag = True
+
+    def SCR(self, opcode=None):
+        """00FB: Scroll the selected planes right 4 pixels."""
+        for plane in self.selected_planes:
+            plane[:] = [row >> 4 for row in plane]
+        self.draw_flag = True
+
+    def SCL(self, opcode=None):
+        """00FC: Scroll the selected planes left 4 pixels."""
+        row_mask = self.row_mask
+        for plane in self.selected_planes:
+            plane[:] = [(row << 4) & row_mask for row in plane]
+        self.draw_flag = True
+
+    def EXIT(self, opcode=None):
+        """00FD: Stop the interpreter, the PC stays on this instruction for good."""
+        self.pc -= 2
+        raise IdleLoop(1)
+
+    def LOW(self, opcode=None):
+        """00FE: 64x32 mode."""
+        self.set_resolution(*LORES)
+
+    def HIGH(self, opcode=None):
+        """00FF: 128x64 mode."""
+        self.set_resolution(*HIRES)
+
+    def skip_next(self):
+        """Skip the next instruction, all 4 bytes of it if it's an F000 NNNN."""
+        if self.memory[self.pc] == 0xF0 and self.memory[self.pc + 1] == 0x00:
+            self.pc += 4
+        else:
+            self.pc += 2
+
+    def SE_Vx_byte_xo(self, opcode):
+        """3XKK: Skip next instruction if VX == KK."""
+        if self.v[(opcode & 0x0F00) >> 8] == opcode & 0x00FF:
+            self.skip_next()
+
+    def SNE_Vx_byte_xo(self, opcode):
+        """4XKK: Skip next instruction if VX != KK."""
+        if self.v[(opcode & 0x0F00) >> 8] != opcode & 0x00FF:
+            self.skip_next()
+
+    def SE_Vx_Vy_xo(self, opcode):
+        """5XY0: Skip next instruction if VX == VY."""
+        if self.v[(opcode & 0x0F00) >> 8] == self.v[(opcode & 0x00F0) >> 4]:
+            self.skip_next()
+
+    def SNE_Vx_Vy_xo(self, opcode):
+        """9XY0: Skip next instruction if VX != VY."""
+        if self.v[(opcode & 0x0F00) >> 8] != self.v[(opcode & 0x00F0) >> 4]:
+            self.skip_next()
+
+    def SKP_Vx_xo(self, opcode):
+        """EX9E: Skip next instruction if key VX is pressed."""
+        if self.keys[self.v[(opcode & 0x0F00) >> 8]] == 1:
+            self.skip_next()
+
+    def SKNP_Vx_xo(self, opcode):
+        """EXA1: Skip next instruction if key VX is NOT pressed."""
+        if self.keys[self.v[(opcode & 0x0F00) >> 8]] == 0:
+            self.skip_next()
+
+    def LD_I_Vx_Vy(self, opcode):
+        """5XY2 (XO-CHIP): Store VX..VY at I (backwards if X > Y), I is unchanged."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        registers = self.v[min(x, y):max(x, y) + 1]
+        if x > y:
+            registers.reverse()
+        if self.i + len(registers) > len(self.memory):
+            raise IndexError("5XY2 writes past the end of memory")
+
+        self.memory[self.i:self.i + len(registers)] = registers
+        self.invalidate_code(self.i, self.i + len(registers))
+
+    def LD_Vx_Vy_I(self, opcode):
+        """5XY3 (XO-CHIP): Load VX..VY from I (backwards if X > Y), I is unchanged."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        values = self.memory[self.i:self.i + abs(x - y) + 1]
+        if len(values) != abs(x - y) + 1:
+            raise IndexError("5XY3 reads past the end of memory")
+        if x > y:
+            values.reverse()
+
+        self.v[min(x, y):max(x, y) + 1] = values
+
+    def LD_I_long(self, opcode):
+        """F000 NNNN (XO-CHIP): Set I to the 16-bit address in the next word."""
+        self.i = (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
+        self.pc += 2
+
+    def PLANE(self, opcode):
+        """FN01 (XO-CHIP): Select the planes DXYN, CLS and the scrolls work on (N is a bit mask)."""
+        self.select_planes((opcode & 0x0F00) >> 8)
+
+    def LD_AUDIO(self, opcode):
+        """F002 (XO-CHIP): Load the 16-byte audio pattern from memory at I."""
+        if self.i + 16 > len(self.memory):
+            raise IndexError("F002 reads past the end of memory")
+        self.audio_pattern = bytes(self.memory[self.i:self.i + 16])
+
+    def PITCH_Vx(self, opcode):
+        """FX3A (XO-CHIP): Set the audio pitch to VX, the pattern plays at 4000 * 2 ** ((VX - 64) / 48) bits/s."""
+        self.pitch = self.v[(opcode & 0x0F00) >> 8]
+
+    def LD_HF_Vx(self, opcode):
+        """FX30: Point I to the 8x10 font sprite for the digit in VX."""
+        self.i = BIG_FONT_ADDRESS + (self.v[(opcode & 0x0F00) >> 8] & 0x0F) * 10
+
+    def LD_R_Vx(self, opcode):
+        """FX75: Save V0..VX to the user flags."""
+        x = (opcode & 0x0F00) >> 8
+        self.flags[:x + 1] = self.v[:x + 1]
+
+    def LD_Vx_R(self, opcode):
+        """FX85: Load V0..VX from the user flags."""
+        x = (opcode & 0x0F00) >> 8
+        self.v[:x + 1] = self.flags[:x + 1]
+
+    def DRW_Vx_Vy_planes(self, opcode):
+        """
+        DXYN for SCHIP/XO-CHIP: draws at the current resolution on every selected
+        plane, each plane taking the sprite rows that follow the previous plane's.
+        DXY0 draws a 16x16 sprite (two bytes per row).
+        """
+        self.draw_sprite(opcode, big_sprites=True, clip=False)
+
+    def draw_sprite(self, opcode, big_sprites, clip):
+        """
+        DXYN on the selected planes. big_sprites makes DXY0 a 16x16 sprite, clip
+        cuts sprites at the screen edges instead of wrapping them around.
+        """
+        x_start = self.v[(opcode & 0x0F00) >> 8] % self.width
+        y_start = self.v[(opcode & 0x00F0) >> 4] % self.height
+        rows = opcode & 0x000F
+        sprite_width = 8
+        if rows == 0 and big_sprites:
+            rows, sprite_width = 16, 16
+
+        width, height, row_mask = self.width, self.height, self.row_mask
+        # Where the sprite row lands in the screen row; negative means it crosses the right edge
+        shift = width - sprite_width - x_start
+        visible_rows = min(rows, height - y_start) if clip else rows
+        memory = self.memory
+        collision = 0
+
+        for number, plane in enumerate(self.selected_planes):
+            address = self.i + number * rows * (sprite_width // 8)
+            for row in range(visible_rows):
+                if sprite_width == 16:
+                    bits = (memory[address] << 8) | memory[address + 1]
+                    address += 2
+                else:
+                    bits = memory[address]
+                    address += 1
+                if not bits:
+                    continue
+
+                if shift >= 0:
+                    bits <<= shift
+                elif clip:
+                    bits >>= -shift
+                else:
+                    bits = (bits >> -shift) | ((bits << (width + shift)) & row_mask)
+
+                curr_y = (y_start + row) % height
+                if plane[curr_y] & bits:
+                    collision = 1
+                plane[curr_y] ^= bits
+
+        self.v[0xF] = collision
+        self.draw_flag = True
+
+    # --- QUIRK VARIANTS (selected by quirks.py) ---
+    def ADD_Vx_Vy_vf_last(self, opcode):
+        """8XY4, VF written after the result (so VF as X ends up holding the carry)."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        sum_val = self.v[x] + self.v[y]
+        self.v[x] = sum_val & 0xFF
+        self.v[0xF] = 1 if sum_val > 255 else 0
+
+    def SUB_Vx_Vy_vf_last(self, opcode):
+        """8XY5, VF written after the result."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        flag = 1 if self.v[x] >= self.v[y] else 0
+        self.v[x] = (self.v[x] - self.v[y]) & 0xFF
+        self.v[0xF] = flag
+
+    def SUBN_Vx_Vy_vf_last(self, opcode):
+        """8XY7, VF written after the result."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        flag = 1 if self.v[y] >= self.v[x] else 0
+        self.v[x] = (self.v[y] - self.v[x]) & 0xFF
+        self.v[0xF] = flag
+
+    def SHR_Vx_Vy_vf_last(self, opcode):
+        """8XY6: Set VX = VX SHR 1, VF written after the result."""
+        x = (opcode & 0x0F00) >> 8
+        flag = self.v[x] & 0x1
+        self.v[x] >>= 1
+        self.v[0xF] = flag
+
+    def SHL_Vx_Vy_vf_last(self, opcode):
+        """8XYE: Set VX = VX SHL 1, VF written after the result."""
+        x = (opcode & 0x0F00) >> 8
+        flag = (self.v[x] & 0x80) >> 7
+        self.v[x] = (self.v[x] << 1) & 0xFF
+        self.v[0xF] = flag
+
+    def SHR_Vy(self, opcode):
+        """8XY6 (COSMAC VIP): Set VX = VY SHR 1, VF = the bit shifted out, written last."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        flag = self.v[y] & 0x1
+        self.v[x] = self.v[y] >> 1
+        self.v[0xF] = flag
+
+    def SHL_Vy(self, opcode):
+        """8XYE (COSMAC VIP): Set VX = VY SHL 1, VF = the bit shifted out, written last."""
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        flag = (self.v[y] & 0x80) >> 7
+        self.v[x] = (self.v[y] << 1) & 0xFF
+        self.v[0xF] = flag
+
+    def OR_Vx_Vy_vf_reset(self, opcode):
+        """8XY1 (COSMAC VIP): Set VX = VX OR VY, then VF = 0."""
+        self.OR_Vx_Vy(opcode)
+        self.v[0xF] = 0
+
+    def AND_Vx_Vy_vf_reset(self, opcode):
+        """8XY2 (COSMAC VIP): Set VX = VX AND VY, then VF = 0."""
+        self.AND_Vx_Vy(opcode)
+        self.v[0xF] = 0
+
+    def XOR_Vx_Vy_vf_reset(self, opcode):
+        """8XY3 (COSMAC VIP): Set VX = VX XOR VY, then VF = 0."""
+        self.XOR_Vx_Vy(opcode)
+        self.v[0xF] = 0
+
+    def JUMP_Vx(self, opcode):
+        """BXNN (CHIP-48/SCHIP): Jump to XNN + VX."""
+        self.pc = (opcode & 0x0FFF) + self.v[(opcode & 0x0F00) >> 8]
+
+    def LD_I_Vx_inc(self, opcode):
+        """FX55 (COSMAC VIP/XO-CHIP): Store V0..VX at I, then I += X + 1."""
+        self.LD_I_Vx(opcode)
+        self.i = (self.i + ((opcode & 0x0F00) >> 8) + 1) & self.address_mask
+
+    def LD_Vx_I_inc(self, opcode):
+        """FX65 (COSMAC VIP/XO-CHIP): Load V0..VX from I, then I += X + 1."""
+        self.LD_Vx_I(opcode)
+        self.i = (self.i + ((opcode & 0x0F00) >> 8) + 1) & self.address_mask
+
+    def LD_I_Vx_inc_x(self, opcode):
+        """FX55 (CHIP-48): Store V0..VX at I, then I += X."""
+        self.LD_I_Vx(opcode)
+        self.i = (self.i + ((opcode & 0x0F00) >> 8)) & self.address_mask
+
+    def LD_Vx_I_inc_x(self, opcode):
+        """FX65 (CHIP-48): Load V0..VX from I, then I += X."""
+        self.LD_Vx_I(opcode)
+        self.i = (self.i + ((opcode & 0x0F00) >> 8)) & self.address_mask
+
+    def DRW_Vx_Vy_nibble_clip(self, opcode):
+        """DXYN with sprites cut at the screen edges instead of wrapping."""
+        self.draw_sprite(opcode, big_sprites=False, clip=True)
+
+    def DRW_Vx_Vy_planes_clip(self, opcode):
+        """DRW_Vx_Vy_planes with sprites cut at the screen edges instead of wrapping."""
+        self.draw_sprite(opcode, big_sprites=True, clip=True)
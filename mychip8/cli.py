@@ -1,6 +1,7 @@
 from mychip8.settings import STANDARD_SETTINGS, PALETTES
 from mychip8.screen import EmulatorScreen
-from mychip8.chip8 import Chip8Hardware
+from mychip8.library import RomLibrary
+from mychip8.quirks import build_machine
 
 import tkinter as tk
 from tkinter import filedialog
@@ -24,12 +25,36 @@ def select_rom_file():
     root.destroy()
     return file_path
 
+def select_library_rom():
+    """Pick a ROM from the library index, returns the RomEntry or None."""
+    library = RomLibrary()
+
+    directory = input("Directory to scan (empty to use the index): ").strip()
+    if directory:
+        seen, changed, analysed = library.scan([directory])
+        print(f"{seen} ROMs, {changed} new or changed, {analysed} analysed.")
+
+    entries = library.entries(input("Search (empty for all): ").strip() or None)
+    library.close()
+    if not entries:
+        print("No ROMs found.")
+        return None
+
+    for number, entry in enumerate(entries, 1):
+        print(f"{number:4}. {os.path.basename(entry.path):32} {entry.platform:8} {entry.profile}")
+
+    choice = input("ROM number: ")
+    if not choice.isdigit() or not 1 <= int(choice) <= len(entries):
+        print("Invalid ROM choice.")
+        return None
+    return entries[int(choice) - 1]
+
 def cli_loop():
 
     print("\nMyChip8 Emulator CLI")
     print("Murilo R.B Silva - 2026\n")
 
-    print('\ncommands you can use: run, pallettes, exit\n')
+    print('\ncommands you can use: run, library, pallettes, exit\n')
 
     command = input("Enter command (type 'exit' to quit): ")
 
@@ -38,6 +63,13 @@ def cli_loop():
         run_emulator(rom_path, user_config)
         return True
 
+    if command == 'library':
+        entry = select_library_rom()
+        if entry:
+            run_emulator(entry.path, user_config, entry.quirks)
+            return True
+        return cli_loop()
+
     if command == "exit":
         print("Exiting emulator.")
         return False
@@ -62,13 +94,13 @@ def cli_loop():
     print(f"Command '{command}' not recognized.")
     cli_loop()
 
-def run_emulator(rom_path, settings):
-    # 1. Instancia o hardware
-    hardware = Chip8Hardware()
+def run_emulator(rom_path, settings, quirks="default"):
+    # 1. Instancia o hardware (com o perfil de quirks da ROM)
+    hardware = build_machine(quirks)
     
     # 2. Instancia a tela passando as configurações desempacotadas
     # O ** pega as chaves do dicionário e joga como argumentos nomeados
-    app = EmulatorScreen(hardware, **settings)
+    app = EmulatorScreen(hardware, quirks=quirks, **settings)
     
     # 3. Inicializa o pygame e entra no loop
     app.init()
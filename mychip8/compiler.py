@@ -0,0 +1,296 @@
+from mychip8.chip8 import Chip8Hardware, IdleLoop
+
+# Straight-line code for these handlers is generated inline.
+# Each template gets x, y, kk, nnn, address_mask, next_addr (address after the instruction)
+# and skip_addr (address after the next instruction, where a skip lands).
+INLINE_TEMPLATES = {
+    "LD_Vx_byte": "v[{x}] = {kk}",
+    "ADD_Vx_byte": "v[{x}] = (v[{x}] + {kk}) & 0xFF",
+    "LD_Vx_Vy": "v[{x}] = v[{y}]",
+    "OR_Vx_Vy": "v[{x}] |= v[{y}]",
+    "AND_Vx_Vy": "v[{x}] &= v[{y}]",
+    "XOR_Vx_Vy": "v[{x}] ^= v[{y}]",
+    "ADD_Vx_Vy": "t = v[{x}] + v[{y}]; v[15] = 1 if t > 255 else 0; v[{x}] = t & 0xFF",
+    "SUB_Vx_Vy": "v[15] = 1 if v[{x}] >= v[{y}] else 0; v[{x}] = (v[{x}] - v[{y}]) & 0xFF",
+    "SHR_Vx_Vy": "v[15] = v[{x}] & 0x1; v[{x}] >>= 1",
+    "SUBN_Vx_Vy": "v[15] = 1 if v[{y}] >= v[{x}] else 0; v[{x}] = (v[{y}] - v[{x}]) & 0xFF",
+    "SHL_Vx_Vy": "v[15] = (v[{x}] & 0x80) >> 7; v[{x}] = (v[{x}] << 1) & 0xFF",
+    "LD_I": "hw.i = {nnn}",
+    "LD_Vx_DT": "v[{x}] = hw.delay_timer",
+    "LD_DT_Vx": "hw.delay_timer = v[{x}]",
+    "LD_ST_Vx": "hw.sound_timer = v[{x}]",
+    "ADD_I_Vx": "hw.i = (hw.i + v[{x}]) & {address_mask}",
+    "LD_F_Vx": "hw.i = (v[{x}] & 0x0F) * 5",
+    # Quirk variants (see quirks.py)
+    "ADD_Vx_Vy_vf_last": "t = v[{x}] + v[{y}]; v[{x}] = t & 0xFF; v[15] = 1 if t > 255 else 0",
+    "SUB_Vx_Vy_vf_last": "t = 1 if v[{x}] >= v[{y}] else 0; v[{x}] = (v[{x}] - v[{y}]) & 0xFF; v[15] = t",
+    "SUBN_Vx_Vy_vf_last": "t = 1 if v[{y}] >= v[{x}] else 0; v[{x}] = (v[{y}] - v[{x}]) & 0xFF; v[15] = t",
+    "SHR_Vx_Vy_vf_last": "t = v[{x}] & 0x1; v[{x}] >>= 1; v[15] = t",
+    "SHL_Vx_Vy_vf_last": "t = (v[{x}] & 0x80) >> 7; v[{x}] = (v[{x}] << 1) & 0xFF; v[15] = t",
+    "SHR_Vy": "t = v[{y}] & 0x1; v[{x}] = v[{y}] >> 1; v[15] = t",
+    "SHL_Vy": "t = (v[{y}] & 0x80) >> 7; v[{x}] = (v[{y}] << 1) & 0xFF; v[15] = t",
+    "OR_Vx_Vy_vf_reset": "v[{x}] |= v[{y}]; v[15] = 0",
+    "AND_Vx_Vy_vf_reset": "v[{x}] &= v[{y}]; v[15] = 0",
+    "XOR_Vx_Vy_vf_reset": "v[{x}] ^= v[{y}]; v[15] = 0",
+}
+
+# Control flow ends the block, so these templates must set hw.pc themselves.
+TERMINATOR_TEMPLATES = {
+    "RET": "hw.sp -= 1; hw.pc = hw.stack[hw.sp]",
+    "JUMP": "hw.pc = {nnn}",
+    "CALL": "hw.stack[hw.sp] = {next_addr}; hw.sp += 1; hw.pc = {nnn}",
+    "JUMP_V0": "hw.pc = {nnn} + v[0]",
+    "JUMP_Vx": "hw.pc = {nnn} + v[{x}]",
+    "SE_Vx_byte": "hw.pc = {skip_addr} if v[{x}] == {kk} else {next_addr}",
+    "SNE_Vx_byte": "hw.pc = {skip_addr} if v[{x}] != {kk} else {next_addr}",
+    "SE_Vx_Vy": "hw.pc = {skip_addr} if v[{x}] == v[{y}] else {next_addr}",
+    "SNE_Vx_Vy": "hw.pc = {skip_addr} if v[{x}] != v[{y}] else {next_addr}",
+    "SKP_Vx": "hw.pc = {skip_addr} if hw.keys[v[{x}]] == 1 else {next_addr}",
+    "SKNP_Vx": "hw.pc = {skip_addr} if hw.keys[v[{x}]] == 0 else {next_addr}",
+}
+
+# Handlers called through their bound method that never touch the PC or write memory,
+# so the block can keep going after them.
+CALL_THROUGH = {"CLS", "DRW_Vx_Vy_nibble", "RND_Vx_byte", "LD_Vx_I", "NOP",
+                "CLS_planes", "DRW_Vx_Vy_planes", "SCD_nibble", "SCU_nibble", "SCR", "SCL", "LOW", "HIGH",
+                "PLANE", "LD_AUDIO", "PITCH_Vx", "LD_HF_Vx", "LD_R_Vx", "LD_Vx_R", "LD_Vx_Vy_I",
+                "DRW_Vx_Vy_nibble_clip", "DRW_Vx_Vy_planes_clip", "LD_Vx_I_inc", "LD_Vx_I_inc_x"}
+
+# Handlers that write memory but never touch the PC: the block keeps going after
+# them unless the write invalidated the block itself.
+MEMORY_WRITES = {"LD_B_Vx", "LD_I_Vx", "LD_I_Vx_inc", "LD_I_Vx_inc_x", "LD_I_Vx_Vy"}
+
+# FX55 / FX65 as slice copies. They also get n (X + 1), memory_size and call, the
+# handler call, which runs instead when the copy would leave memory so the
+# IndexError is the interpreter's.
+COPY_TEMPLATES = {
+    "LD_I_Vx": "if hw.i + {x} < {memory_size}: hw.memory[hw.i:hw.i + {n}] = v[:{n}]; invalidate(hw.i, hw.i + {n})\n"
+               "    else: {call}",
+    "LD_Vx_I": "if hw.i + {x} < {memory_size}: v[:{n}] = hw.memory[hw.i:hw.i + {n}]\n"
+               "    else: {call}",
+}
+COPY_TEMPLATES["LD_I_Vx_inc"] = COPY_TEMPLATES["LD_I_Vx"] + "\n    hw.i = (hw.i + {n}) & {address_mask}"
+COPY_TEMPLATES["LD_I_Vx_inc_x"] = COPY_TEMPLATES["LD_I_Vx"] + "\n    hw.i = (hw.i + {x}) & {address_mask}"
+COPY_TEMPLATES["LD_Vx_I_inc"] = COPY_TEMPLATES["LD_Vx_I"] + "\n    hw.i = (hw.i + {n}) & {address_mask}"
+COPY_TEMPLATES["LD_Vx_I_inc_x"] = COPY_TEMPLATES["LD_Vx_I"] + "\n    hw.i = (hw.i + {x}) & {address_mask}"
+
+
+class CompiledBlock:
+    def __init__(self, start, spans, length, function, source):
+        self.start = start
+        self.spans = spans        # (start, end) of each straight run of code compiled into the block
+        self.length = length      # Number of instructions (cycles) in the block
+        self.function = function
+        self.source = source
+
+
+class BlockCompiler:
+    """
+    Optional execution engine: compiles straight-line runs of CHIP-8 code into
+    Python functions and caches them by start address.
+
+    A block follows JUMPs and CALLs to their targets, and RETs back to the calls
+    it compiled itself, so a loop or a chain of subroutine calls becomes one
+    function. It stops where control flow depends on data (skips, computed
+    jumps, RETs to unknown callers) or at code it has already compiled.
+    """
+
+    def __init__(self, hardware, max_block_length=32):
+        self.hardware = hardware
+        self.max_block_length = max_block_length
+
+        self.blocks = {}
+        # Start addresses of the blocks covering each memory address (only covered ones)
+        self.owners = {}
+
+        hardware.invalidation_hooks.append(self.invalidate)
+
+    def invalidate(self, start, end):
+        """Forget every block that overlaps memory[start:end]."""
+        if start == 0 and end >= len(self.hardware.memory):
+            # All of memory, e.g. Chip8Hardware.reset
+            self.blocks.clear()
+            self.owners.clear()
+            return
+
+        stale = set()
+        owners = self.owners
+        for address in owners.keys() & range(start, end):
+            stale.update(owners[address])
+
+        for block_start in stale:
+            block = self.blocks.pop(block_start)
+            for span_start, span_end in block.spans:
+                for address in range(span_start, span_end):
+                    owners[address].remove(block_start)
+                    if not owners[address]:
+                        del owners[address]
+
+    def run(self, cycles):
+        """Execute exactly `cycles` instructions, returns the number executed."""
+        hw = self.hardware
+        blocks = self.blocks
+        executed = 0
+
+        if hw.dispatch_patches:
+            # Patched dispatch (profiler, debugger...) only exists in the interpreter
+            return hw.run(cycles)
+
+        while executed < cycles:
+            block = blocks.get(hw.pc)
+            if block is None:
+                block = self.compile(hw.pc)
+
+            if block is None:
+                # Halted: the interpreter skips the rest of the budget
+                executed += hw.run(cycles - executed)
+                break
+
+            if block.length > cycles - executed:
+                # Not enough budget left for the whole block
+                executed += hw.run(cycles - executed)
+                break
+
+            executed += block.length
+            try:
+                ran = block.function(hw)
+                if ran is not None:
+                    # It stopped after a write that rewrote its own code
+                    executed -= block.length - ran
+            except IdleLoop as idle:
+                # Skip the whole iterations left, like Chip8Hardware.run
+                executed = cycles - (cycles - executed) % idle.period
+
+        return executed
+
+    def compile(self, start):
+        """Compile the block starting at start, None if there is nothing to compile."""
+        hw = self.hardware
+        memory_size = len(hw.memory)
+
+        lines = ["def block(hw):", "    v = hw.v"]
+        handlers = {}
+        address = span_start = start
+        spans = []
+        compiled = set()    # Addresses of the instructions in the block
+        returns = []        # Return addresses pushed by the CALLs compiled so far
+        length = 0
+        terminated = False
+
+        while length < self.max_block_length and address + 1 < memory_size and address not in compiled:
+            method, opcode = hw.decode_cache[address] or hw.decode_at(address)
+            if method is None:
+                break  # 0x0000 halts, leave it to the interpreter
+
+            name = method.__name__
+            stock = getattr(Chip8Hardware, name, None) is method.__func__
+            operands = {
+                "x": (opcode & 0x0F00) >> 8,
+                "y": (opcode & 0x00F0) >> 4,
+                "kk": opcode & 0x00FF,
+                "nnn": opcode & 0x0FFF,
+                "address_mask": hw.address_mask,
+                "next_addr": address + 2,
+                "skip_addr": address + 4,
+            }
+            compiled.add(address)
+            length += 1
+            address += 2
+
+            if stock and name in INLINE_TEMPLATES:
+                lines.append("    " + INLINE_TEMPLATES[name].format(**operands))
+                continue
+
+            # Jumps, calls and returns to a known address carry on compiling there
+            target = None
+            if stock and name == "JUMP":
+                target = operands["nnn"]
+            elif stock and name == "CALL":
+                lines.append(f"    hw.stack[hw.sp] = {address}; hw.sp += 1")
+                returns.append(address)
+                target = operands["nnn"]
+            elif stock and name == "RET" and returns:
+                lines.append("    hw.sp -= 1")
+                target = returns.pop()
+            if target is not None:
+                spans.append((span_start, address))
+                address = span_start = target
+                continue
+
+            if stock and name in TERMINATOR_TEMPLATES:
+                lines.append("    " + TERMINATOR_TEMPLATES[name].format(**operands))
+                terminated = True
+                break
+
+            handler = f"h{len(handlers)}"
+            handlers[handler] = method
+
+            if stock and name in COPY_TEMPLATES:
+                lines.append("    " + COPY_TEMPLATES[name].format(
+                    n=operands["x"] + 1, memory_size=memory_size, call=f"{handler}({opcode})", **operands))
+            elif stock and (name in CALL_THROUGH or name in MEMORY_WRITES):
+                lines.append(f"    {handler}({opcode})")
+            else:
+                # Anything else may move the PC or rewrite code: run it last
+                lines.append(f"    hw.pc = {address}")
+                lines.append(f"    {handler}({opcode})")
+                terminated = True
+                break
+
+            if name in MEMORY_WRITES:
+                lines.append(f"    if {start} not in blocks: hw.pc = {address}; return {length}")
+
+        if length == 0:
+            return None
+
+        if not terminated:
+            lines.append(f"    hw.pc = {address}")
+        if span_start != address:
+            spans.append((span_start, address))
+
+        source = "\n".join(lines)
+        namespace = dict(handlers, blocks=self.blocks, invalidate=hw.invalidate_code)
+        exec(compile(source, f"<chip8 block {start:03X}>", "exec"), namespace)
+
+        block = CompiledBlock(start, spans, length, namespace["block"], source)
+        self.blocks[start] = block
+        for span_start, span_end in spans:
+            for owned in range(span_start, span_end):
+                self.owners.setdefault(owned, []).append(start)
+
+        return block
+
+
+def machine_state(hardware):
+    """Everything an engine can change, as a comparable tuple."""
+    return (hardware.pc, hardware.i, hardware.sp, bytes(hardware.v), hardware.stack.tobytes(),
+            bytes(hardware.memory), tuple(hardware.screen),
+            hardware.delay_timer, hardware.sound_timer)
+
+
+def verify_lockstep(rom_data, cycles, chunk=1):
+    """
+    Run rom_data on the interpreter and on the BlockCompiler side by side.
+    Returns None if both stay identical, or the cycle count of the first divergence.
+    """
+    # Same seed, so both draw the same RND_Vx_byte values
+    reference = Chip8Hardware(seed=0)
+    compiled = Chip8Hardware(seed=0)
+    for hardware in (reference, compiled):
+        hardware.load_rom(rom_data)
+
+    engine = BlockCompiler(compiled)
+    done = 0
+
+    while done < cycles:
+        step = min(chunk, cycles - done)
+
+        for _ in range(step):
+            reference.cycle()
+        engine.run(step)
+
+        done += step
+        if machine_state(reference) != machine_state(compiled):
+            return done
+
+    return None
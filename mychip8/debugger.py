@@ -0,0 +1,280 @@
+"""
+Debugger for Chip8Hardware: breakpoints, watchpoints, stepping and state views.
+
+Breakpoints and watchpoints are a dispatch patch that only wraps the slots
+that need it: the addresses with a breakpoint, and, while there are
+watchpoints, the instructions that access memory. Every other instruction runs
+its plain handler, and with nothing set the patch is removed altogether, so a
+machine that isn't being debugged runs (and compiles) exactly as before.
+
+A stop raises Break out of Chip8Hardware.run / cycle. On a breakpoint the PC is
+left on the instruction, which hasn't run; on a watchpoint the accessing
+instruction has run, so the memory shows what it did.
+"""
+import re
+from collections import namedtuple
+
+from mychip8.chip8 import Stop
+from mychip8.disasm import base_name, decode
+
+# condition: callable(hardware) -> bool or None, text: how it was written
+Breakpoint = namedtuple("Breakpoint", "address condition text temporary")
+# Watches memory[start:end]
+Watchpoint = namedtuple("Watchpoint", "start end read write")
+
+
+# Memory each handler accesses: base handler name -> (hardware, opcode) -> (start, end, writes)
+MEMORY_ACCESS = {
+    "DRW_Vx_Vy_nibble": lambda hw, op: (hw.i, hw.i + (op & 0x000F), False),
+    "DRW_Vx_Vy_planes": lambda hw, op: (hw.i, hw.i + (op & 0x000F or 32) * len(hw.selected_planes), False),
+    "LD_B_Vx": lambda hw, op: (hw.i, hw.i + 3, True),
+    "LD_I_Vx": lambda hw, op: (hw.i, hw.i + ((op & 0x0F00) >> 8) + 1, True),
+    "LD_Vx_I": lambda hw, op: (hw.i, hw.i + ((op & 0x0F00) >> 8) + 1, False),
+    "LD_AUDIO": lambda hw, op: (hw.i, hw.i + 16, False),
+    "LD_I_Vx_Vy": lambda hw, op: (hw.i, hw.i + abs(((op & 0x0F00) >> 8) - ((op & 0x00F0) >> 4)) + 1, True),
+    "LD_Vx_Vy_I": lambda hw, op: (hw.i, hw.i + abs(((op & 0x0F00) >> 8) - ((op & 0x00F0) >> 4)) + 1, False),
+}
+
+REGISTERS = {
+    **{f"V{n:X}": (lambda n: lambda hw: hw.v[n])(n) for n in range(16)},
+    "I": lambda hw: hw.i,
+    "PC": lambda hw: hw.pc,
+    "SP": lambda hw: hw.sp,
+    "DT": lambda hw: hw.delay_timer,
+    "ST": lambda hw: hw.sound_timer,
+}
+
+COMPARISONS = {
+    "==": int.__eq__, "!=": int.__ne__, "<": int.__lt__, "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__,
+}
+
+CONDITION = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>)\s*(\w+)\s*$")
+
+
+class Break(Stop):
+    """The debugger stopped the machine, reason says why."""
+
+    def __init__(self, reason, ran=False):
+        super().__init__(reason)
+        self.reason = reason
+        self.ran = ran
+
+
+def parse_condition(text):
+    """
+    "V3 == 5", "I >= 0x300", "V0 != V1"... as a callable(hardware) -> bool.
+    Operands are V0-VF, I, PC, SP, DT, ST or integers (0x for hex).
+    """
+    match = CONDITION.match(text)
+    if not match:
+        raise ValueError(f"bad condition: {text!r}")
+
+    def operand(token):
+        if token.upper() in REGISTERS:
+            return REGISTERS[token.upper()]
+        value = int(token, 0)
+        return lambda hardware: value
+
+    left, compare, right = operand(match[1]), COMPARISONS[match[2]], operand(match[3])
+    return lambda hardware: compare(left(hardware), right(hardware))
+
+
+def parse_breakpoint(text):
+    """"2A4" or "2A4 if V3 == 5" (hex address) as (address, condition text or None)."""
+    address, _, condition = text.partition(" if ")
+    return int(address, 16), condition.strip() or None
+
+
+def parse_watchpoint(text):
+    """"300", "300-30F", optionally followed by r, w or rw (default) as a Watchpoint."""
+    span, _, mode = text.strip().partition(" ")
+    first, _, last = span.partition("-")
+    start = int(first, 16)
+    end = int(last, 16) + 1 if last else start + 1
+    mode = mode.strip() or "rw"
+    return Watchpoint(start, end, "r" in mode, "w" in mode)
+
+
+class Debugger:
+    def __init__(self, hardware):
+        self.hardware = hardware
+        self.breakpoints = {}       # address -> [Breakpoint]
+        self.watchpoints = []
+        self.resume_at = None       # Breakpoint address the next run starts on, not stopped at once
+        self.stop_reason = None
+        self.attached = False
+
+    # --- Setting breakpoints and watchpoints ---
+
+    def break_at(self, address, condition=None, temporary=False):
+        """
+        Stop before the instruction at address runs, if condition holds: None,
+        a callable(hardware) or a string for parse_condition.
+        """
+        text = condition if isinstance(condition, str) else None
+        if isinstance(condition, str):
+            condition = parse_condition(condition)
+        self.breakpoints.setdefault(address, []).append(Breakpoint(address, condition, text, temporary))
+        self._changed(address)
+
+    def clear(self, address):
+        """Remove every breakpoint at address."""
+        if self.breakpoints.pop(address, None) is not None:
+            self._changed(address)
+
+    def watch(self, start, end=None, read=True, write=True):
+        """Stop after an instruction reads or writes memory[start:end] (end defaults to start + 1)."""
+        self.watchpoints.append(Watchpoint(start, end if end is not None else start + 1, read, write))
+        self._changed()
+
+    def unwatch(self, start):
+        self.watchpoints = [watchpoint for watchpoint in self.watchpoints if watchpoint.start != start]
+        self._changed()
+
+    def _changed(self, address=None):
+        """Attach or detach the patch, or re-decode the slots it wraps."""
+        hardware = self.hardware
+        wanted = bool(self.breakpoints or self.watchpoints)
+        if wanted and not self.attached:
+            hardware.patch_dispatch(self.patch)
+        elif not wanted and self.attached:
+            hardware.unpatch_dispatch(self.patch)
+        elif wanted and address is not None:
+            hardware.decode_cache[address] = None
+        elif wanted:
+            hardware.decode_cache[:] = [None] * len(hardware.decode_cache)
+        self.attached = wanted
+
+    def patch(self, address, slot):
+        method, opcode = slot
+        if method is None:
+            return slot
+
+        name = base_name(method.__name__)
+        if self.watchpoints and name in MEMORY_ACCESS:
+            method = self._watched(address, method, MEMORY_ACCESS[name])
+        if address in self.breakpoints:
+            method = self._stopping(address, method)
+        return (method, opcode)
+
+    def _stopping(self, address, method):
+        hardware = self.hardware
+
+        def stopping(opcode):
+            if self.resume_at == address:
+                self.resume_at = None
+            else:
+                for breakpoint in self.breakpoints.get(address, ()):
+                    if breakpoint.condition is None or breakpoint.condition(hardware):
+                        hardware.pc = address # Not executed yet
+                        if breakpoint.temporary:
+                            self.breakpoints[address].remove(breakpoint)
+                            if not self.breakpoints[address]:
+                                self.clear(address)
+                        reason = f"breakpoint {address:03X}"
+                        if breakpoint.text:
+                            reason += f" if {breakpoint.text}"
+                        raise Break(reason)
+            method(opcode)
+
+        stopping.__name__ = method.__name__
+        return stopping
+
+    def _watched(self, address, method, access):
+        hardware = self.hardware
+
+        def watched(opcode):
+            start, end, writes = access(hardware, opcode)
+            method(opcode)
+            for watchpoint in self.watchpoints:
+                if start < watchpoint.end and watchpoint.start < end and \
+                        (watchpoint.write if writes else watchpoint.read):
+                    raise Break(f"{'write' if writes else 'read'} {start:03X}-{end - 1:03X} at {address:03X}",
+                                ran=True)
+
+        watched.__name__ = method.__name__
+        return watched
+
+    # --- Running ---
+
+    def resume(self):
+        """Let the next instruction run even if it has a breakpoint (call before running on)."""
+        pc = self.hardware.pc
+        self.resume_at = pc if pc in self.breakpoints else None
+        self.stop_reason = None
+
+    def run(self, cycles):
+        """Run up to cycles instructions (timers don't tick), returns the stop reason or None."""
+        self.resume()
+        try:
+            self.hardware.run(cycles)
+        except Break as stop:
+            self.stop_reason = stop.reason
+        return self.stop_reason
+
+    def step(self):
+        """Run one instruction, returns the stop reason if a watchpoint fired."""
+        self.resume()
+        try:
+            self.hardware.cycle()
+        except Break as stop:
+            self.stop_reason = stop.reason
+        return self.stop_reason
+
+    def arm_step_over(self):
+        """
+        If the PC is on a CALL, set a temporary breakpoint where it returns to and
+        return True; the caller then runs on. False means a plain step() will do.
+        """
+        hardware = self.hardware
+        instruction = decode(hardware, hardware.pc)
+        if instruction.name != "CALL":
+            return False
+        depth = hardware.sp
+        self.break_at(hardware.pc + 2, lambda hw: hw.sp == depth, temporary=True)
+        return True
+
+    def arm_run_to_return(self):
+        """Set a temporary breakpoint where the current subroutine returns to, False outside of one."""
+        hardware = self.hardware
+        if hardware.sp == 0:
+            return False
+        depth = hardware.sp - 1
+        self.break_at(hardware.stack[depth], lambda hw: hw.sp == depth, temporary=True)
+        return True
+
+    def step_over(self, cycles=1_000_000):
+        return self.run(cycles) if self.arm_step_over() else self.step()
+
+    def run_to_return(self, cycles=1_000_000):
+        return self.run(cycles) if self.arm_run_to_return() else self.step()
+
+    # --- Views ---
+
+    def hex_view(self, start, rows=8, width=8):
+        """Lines of "ADDR  XX XX ..." from start (rounded down to a row)."""
+        memory = self.hardware.memory
+        start -= start % width
+        lines = []
+        for address in range(start, min(start + rows * width, len(memory)), width):
+            lines.append(f"{address:03X}  " + " ".join(f"{byte:02X}" for byte in memory[address:address + width]))
+        return lines
+
+    def stack_view(self):
+        """The return addresses on the stack, innermost first."""
+        hardware = self.hardware
+        return [f"{depth:X}: {hardware.stack[depth]:03X}" for depth in range(hardware.sp - 1, -1, -1)]
+
+    def disassembly(self, count=5):
+        """The next count instructions from the PC, as text."""
+        hardware = self.hardware
+        lines = []
+        address = hardware.pc
+        for _ in range(count):
+            if address >= len(hardware.memory) - 1:
+                break
+            instruction = decode(hardware, address)
+            marker = "*" if address in self.breakpoints else " "
+            lines.append(f"{marker}{address:03X} {instruction.text}")
+            address += instruction.size
+        return lines
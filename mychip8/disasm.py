@@ -0,0 +1,442 @@
+"""
+Static disassembler: python -m mychip8.disasm ROM [--quirks PROFILE] [--linear]
+
+Decodes through a machine's own opcode tables (so a quirk profile or platform
+gets the instructions it really runs) and explores the ROM by recursive descent
+from 0x200: basic blocks, CALL targets, both edges of every skip, and the
+targets of BNNN (BXNN) computed jumps whose register can be worked out inside
+the block. Whatever is never reached is data.
+
+Analyses are cached per ROM hash and opcode tables. A ControlFlowGraph can
+pre-warm a machine's decode cache with every reachable instruction.
+"""
+import argparse
+import hashlib
+from collections import OrderedDict, namedtuple
+
+from mychip8.chip8 import PROGRAM_START
+from mychip8.quirks import PROFILES, build_machine
+
+# name: handler name, None when the machine has no handler (it runs as NOP, or halts on 0000)
+# size: 2, or 4 for XO-CHIP's F000 NNNN
+Instruction = namedtuple("Instruction", "address opcode name size text")
+# successors: (address, kind), kind is "fall", "jump", "skip", "call", "return" or "computed"
+BasicBlock = namedtuple("BasicBlock", "start end instructions successors")
+
+# Quirk / platform variants of a handler disassemble and flow like the handler itself
+VARIANT_SUFFIXES = ("_xo", "_vf_last", "_vf_reset", "_clip", "_inc_x", "_inc")
+
+MNEMONICS = {
+    "CLS": "CLS",
+    "CLS_planes": "CLS",
+    "RET": "RET",
+    "JUMP": "JP {nnn:03X}",
+    "CALL": "CALL {nnn:03X}",
+    "SE_Vx_byte": "SE V{x:X}, {kk:02X}",
+    "SNE_Vx_byte": "SNE V{x:X}, {kk:02X}",
+    "SE_Vx_Vy": "SE V{x:X}, V{y:X}",
+    "SNE_Vx_Vy": "SNE V{x:X}, V{y:X}",
+    "LD_Vx_byte": "LD V{x:X}, {kk:02X}",
+    "ADD_Vx_byte": "ADD V{x:X}, {kk:02X}",
+    "LD_Vx_Vy": "LD V{x:X}, V{y:X}",
+    "OR_Vx_Vy": "OR V{x:X}, V{y:X}",
+    "AND_Vx_Vy": "AND V{x:X}, V{y:X}",
+    "XOR_Vx_Vy": "XOR V{x:X}, V{y:X}",
+    "ADD_Vx_Vy": "ADD V{x:X}, V{y:X}",
+    "SUB_Vx_Vy": "SUB V{x:X}, V{y:X}",
+    "SHR_Vx_Vy": "SHR V{x:X}, V{y:X}",
+    "SHR_Vy": "SHR V{x:X}, V{y:X}",
+    "SUBN_Vx_Vy": "SUBN V{x:X}, V{y:X}",
+    "SHL_Vx_Vy": "SHL V{x:X}, V{y:X}",
+    "SHL_Vy": "SHL V{x:X}, V{y:X}",
+    "LD_I": "LD I, {nnn:03X}",
+    "JUMP_V0": "JP V0, {nnn:03X}",
+    "JUMP_Vx": "JP V{x:X}, {nnn:03X}",
+    "RND_Vx_byte": "RND V{x:X}, {kk:02X}",
+    "DRW_Vx_Vy_nibble": "DRW V{x:X}, V{y:X}, {n:X}",
+    "DRW_Vx_Vy_planes": "DRW V{x:X}, V{y:X}, {n:X}",
+    "SKP_Vx": "SKP V{x:X}",
+    "SKNP_Vx": "SKNP V{x:X}",
+    "LD_Vx_DT": "LD V{x:X}, DT",
+    "LD_Vx_K": "LD V{x:X}, K",
+    "LD_DT_Vx": "LD DT, V{x:X}",
+    "LD_ST_Vx": "LD ST, V{x:X}",
+    "ADD_I_Vx": "ADD I, V{x:X}",
+    "LD_F_Vx": "LD F, V{x:X}",
+    "LD_B_Vx": "LD B, V{x:X}",
+    "LD_I_Vx": "LD [I], V{x:X}",
+    "LD_Vx_I": "LD V{x:X}, [I]",
+    "SCD_nibble": "SCD {n:X}",
+    "SCU_nibble": "SCU {n:X}",
+    "SCR": "SCR",
+    "SCL": "SCL",
+    "EXIT": "EXIT",
+    "LOW": "LOW",
+    "HIGH": "HIGH",
+    "LD_I_Vx_Vy": "SAVE V{x:X}-V{y:X}",
+    "LD_Vx_Vy_I": "LOAD V{x:X}-V{y:X}",
+    "LD_I_long": "LD I, {long:04X}",
+    "PLANE": "PLANE {x:X}",
+    "LD_AUDIO": "AUDIO",
+    "PITCH_Vx": "PITCH V{x:X}",
+    "LD_HF_Vx": "LD HF, V{x:X}",
+    "LD_R_Vx": "LD R, V{x:X}",
+    "LD_Vx_R": "LD V{x:X}, R",
+}
+
+SKIPS = {"SE_Vx_byte", "SNE_Vx_byte", "SE_Vx_Vy", "SNE_Vx_Vy", "SKP_Vx", "SKNP_Vx"}
+COMPUTED_JUMPS = {"JUMP_V0", "JUMP_Vx"}
+# No way to carry on after these
+STOPS = {"RET", "EXIT"}
+
+# Handlers that write no V register, everything else unknown to the constant
+# folding below clobbers VX and VF
+NO_REGISTER_WRITES = {
+    "CLS", "CLS_planes", "RET", "JUMP", "CALL", "LD_I", "JUMP_V0", "JUMP_Vx", "SKP_Vx", "SKNP_Vx",
+    "SE_Vx_byte", "SNE_Vx_byte", "SE_Vx_Vy", "SNE_Vx_Vy", "LD_DT_Vx", "LD_ST_Vx", "ADD_I_Vx",
+    "LD_F_Vx", "LD_B_Vx", "LD_I_Vx", "SCD_nibble", "SCU_nibble", "SCR", "SCL", "EXIT", "LOW", "HIGH",
+    "LD_I_Vx_Vy", "LD_I_long", "PLANE", "LD_AUDIO", "PITCH_Vx", "LD_HF_Vx", "LD_R_Vx",
+}
+
+# Computed jumps are only resolved to this many targets
+MAX_TARGETS = 16
+
+CACHE_SIZE = 64
+_cache = OrderedDict()   # (ROM sha1, memory size, tables) -> ControlFlowGraph
+
+
+def base_name(name):
+    """The handler a quirk or platform variant stands for, e.g. "SKP_Vx" for "SKP_Vx_xo"."""
+    for suffix in VARIANT_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def decode(hardware, address):
+    """The Instruction at address in hardware's memory."""
+    memory = hardware.memory
+    opcode = (memory[address] << 8) | memory[address + 1]
+    method = hardware.decode_opcode(opcode) if opcode else None
+    name = method.__name__ if method else None
+
+    size = 2
+    fields = {"x": (opcode & 0x0F00) >> 8, "y": (opcode & 0x00F0) >> 4, "n": opcode & 0x000F,
+              "kk": opcode & 0x00FF, "nnn": opcode & 0x0FFF}
+    if name == "LD_I_long":
+        size = 4
+        fields["long"] = (memory[address + 2] << 8) | memory[address + 3] if address + 3 < len(memory) else 0
+
+    if name is None:
+        text = "HALT" if opcode == 0 else f"DW {opcode:04X}"
+    else:
+        text = MNEMONICS.get(base_name(name), name).format(**fields)
+    return Instruction(address, opcode, name, size, text)
+
+
+def disassemble(hardware, start=PROGRAM_START, end=None):
+    """Linear sweep: an Instruction for every word from start to end (default: end of memory)."""
+    end = min(end or len(hardware.memory), len(hardware.memory) - 1)
+    instructions = []
+    address = start
+    while address < end:
+        instruction = decode(hardware, address)
+        instructions.append(instruction)
+        address += instruction.size
+    return instructions
+
+
+def _flow(hardware, instruction):
+    """(successors, whether execution can fall through to the next instruction)."""
+    name = base_name(instruction.name) if instruction.name else None
+    following = instruction.address + instruction.size
+
+    if instruction.opcode == 0 or name in STOPS or name in COMPUTED_JUMPS:
+        return [], False
+    if name == "JUMP":
+        return [(instruction.opcode & 0x0FFF, "jump")], False
+    if name == "CALL":
+        return [(instruction.opcode & 0x0FFF, "call"), (following, "return")], False
+    if name in SKIPS:
+        skipped = 2
+        if instruction.name.endswith("_xo") and following + 1 < len(hardware.memory) \
+                and decode(hardware, following).name == "LD_I_long":
+            skipped = 4
+        return [(following, "fall"), (following + skipped, "skip")], False
+    return [(following, "fall")], True
+
+
+def _combine(operation, first, second):
+    if first is None or second is None or len(first) * len(second) > MAX_TARGETS:
+        return None
+    return frozenset(operation(a, b) & 0xFF for a in first for b in second)
+
+
+def _fold(values, instruction):
+    """Track the possible values of V0-VF (frozensets, None when unknown) through one instruction."""
+    name = base_name(instruction.name) if instruction.name else None
+    opcode = instruction.opcode
+    x, y, kk = (opcode & 0x0F00) >> 8, (opcode & 0x00F0) >> 4, opcode & 0x00FF
+
+    if name is None or name in NO_REGISTER_WRITES:
+        return
+    if name == "LD_Vx_byte":
+        values[x] = frozenset((kk,))
+    elif name == "ADD_Vx_byte":
+        values[x] = _combine(int.__add__, values[x], (kk,))
+    elif name == "LD_Vx_Vy":
+        values[x] = values[y]
+    elif name in ("OR_Vx_Vy", "AND_Vx_Vy", "XOR_Vx_Vy"):
+        operation = {"OR_Vx_Vy": int.__or__, "AND_Vx_Vy": int.__and__, "XOR_Vx_Vy": int.__xor__}[name]
+        values[x] = _combine(operation, values[x], values[y])
+        if instruction.name.endswith("_vf_reset"):
+            values[0xF] = frozenset((0,))
+    elif name == "RND_Vx_byte":
+        # Any submask of KK
+        masks = {kk}
+        if 1 << bin(kk).count("1") <= MAX_TARGETS:
+            mask = kk
+            while mask:
+                mask = (mask - 1) & kk
+                masks.add(mask)
+            values[x] = frozenset(masks)
+        else:
+            values[x] = None
+    elif name in ("LD_Vx_I", "LD_Vx_R"):
+        values[:x + 1] = [None] * (x + 1)
+    elif name == "LD_Vx_Vy_I":
+        low, high = min(x, y), max(x, y)
+        values[low:high + 1] = [None] * (high - low + 1)
+    elif name.startswith("DRW"):
+        values[0xF] = None
+    else:
+        values[x] = values[0xF] = None
+
+
+class ControlFlowGraph:
+    """
+    What recursive descent from entry found in a machine's memory:
+
+    instructions  address -> Instruction, every reachable one
+    blocks        start -> BasicBlock
+    calls         CALL targets, sorted
+    computed      address of each BNNN -> its resolved targets (empty if unresolved)
+    references    addresses loaded into I by ANNN / F000 NNNN, sorted (sprites, tables)
+    code_map      one byte per memory address, 1 where a reachable instruction lies
+    memory        the memory image that was analysed
+    """
+
+    def __init__(self, hardware, entry=PROGRAM_START):
+        self.entry = entry
+        self.memory = bytes(hardware.memory)
+        self.computed = {}
+
+        # Resolving a computed jump can reveal new code, which can hold more of them
+        while True:
+            self._explore(hardware)
+            resolved = self._resolve()
+            if resolved == self.computed:
+                break
+            self.computed = resolved
+
+        self.calls = sorted(target for block in self.blocks.values()
+                            for target, kind in block.successors if kind == "call")
+        references = set()
+        for address, instruction in self.instructions.items():
+            if instruction.name == "LD_I":
+                references.add(instruction.opcode & 0x0FFF)
+            elif instruction.name == "LD_I_long":
+                references.add(int.from_bytes(self.memory[address + 2:address + 4], "big"))
+        self.references = sorted(references)
+
+        code_map = bytearray(len(self.memory))
+        for address, instruction in self.instructions.items():
+            code_map[address:address + instruction.size] = b"\x01" * instruction.size
+        self.code_map = bytes(code_map[:len(self.memory)])
+
+    def _explore(self, hardware):
+        limit = len(hardware.memory) - 1
+        self.instructions = {}
+        successors = {}
+        leaders = {self.entry}
+        pending = [self.entry]
+        for targets in self.computed.values():
+            leaders.update(targets)
+            pending.extend(targets)
+
+        while pending:
+            address = pending.pop()
+            while 0 <= address < limit and address not in self.instructions:
+                instruction = decode(hardware, address)
+                self.instructions[address] = instruction
+                flow, falls = _flow(hardware, instruction)
+                if address in self.computed:
+                    flow = [(target, "computed") for target in self.computed[address]]
+                successors[address] = flow
+
+                if falls:
+                    address += instruction.size
+                    continue
+                for target, _ in flow:
+                    leaders.add(target)
+                    pending.append(target)
+                break
+
+        self.blocks = {}
+        for start in sorted(leaders):
+            if start not in self.instructions:
+                continue
+            body = []
+            address = start
+            while True:
+                instruction = self.instructions[address]
+                body.append(instruction)
+                flow = successors[address]
+                following = address + instruction.size
+                if flow != [(following, "fall")] or following in leaders or following not in self.instructions:
+                    break
+                address = following
+            self.blocks[start] = BasicBlock(start, following, tuple(body),
+                                            tuple((target, kind) for target, kind in flow
+                                                  if target in self.instructions))
+
+    def _resolve(self):
+        """Targets of every computed jump, from what its own block puts in the register."""
+        resolved = {}
+        for block in self.blocks.values():
+            jump = block.instructions[-1]
+            if not jump.name or base_name(jump.name) not in COMPUTED_JUMPS:
+                continue
+
+            values = [None] * 16
+            for instruction in block.instructions[:-1]:
+                _fold(values, instruction)
+
+            register = 0 if base_name(jump.name) == "JUMP_V0" else (jump.opcode & 0x0F00) >> 8
+            possible = values[register]
+            targets = ()
+            if possible is not None:
+                targets = tuple(sorted(target for target in ((jump.opcode & 0x0FFF) + value for value in possible)
+                                       if target < len(self.memory) - 1))
+            # Never drop a target found before, so the exploration only grows and ends
+            resolved[jump.address] = tuple(sorted(set(targets) | set(self.computed.get(jump.address, ()))))
+        return resolved
+
+    def is_code(self, address):
+        return bool(self.code_map[address])
+
+    def data_ranges(self, start=PROGRAM_START, end=None):
+        """[start, end) runs of bytes no reachable instruction covers."""
+        end = end or len(self.code_map)
+        ranges = []
+        run_start = None
+        for address in range(start, end):
+            if self.code_map[address]:
+                if run_start is not None:
+                    ranges.append((run_start, address))
+                    run_start = None
+            elif run_start is None:
+                run_start = address
+        if run_start is not None:
+            ranges.append((run_start, end))
+        return ranges
+
+    def prewarm(self, hardware):
+        """Decode every reachable instruction into hardware's decode cache ahead of running it."""
+        cache = hardware.decode_cache
+        for address in self.instructions:
+            if cache[address] is None:
+                hardware.decode_at(address)
+
+    def listing(self, start=PROGRAM_START, end=None):
+        """Assembly text lines for memory[start:end]: labelled code, data as DB rows."""
+        end = end or len(self.code_map)
+        calls = set(self.calls)
+        lines = []
+        address = start
+        while address < end:
+            instruction = self.instructions.get(address)
+            if instruction:
+                if address in calls:
+                    lines.append(f"sub_{address:03X}:")
+                elif address in self.blocks:
+                    lines.append(f"block_{address:03X}:")
+                line = f"    {address:03X}  {instruction.opcode:04X}  {instruction.text}"
+                if address in self.computed:
+                    targets = self.computed[address]
+                    line += "  ; -> " + (", ".join(f"{target:03X}" for target in targets) if targets else "?")
+                lines.append(line)
+                address += instruction.size
+            elif self.code_map[address]:
+                address += 1 # Second byte of an instruction listed already
+            else:
+                row = bytearray()
+                row_start = address
+                while address < end and not self.code_map[address] and len(row) < 8:
+                    row.append(self.memory[address])
+                    address += 1
+                lines.append(f"    {row_start:03X}        DB " + " ".join(f"{byte:02X}" for byte in row))
+        return lines
+
+
+def _tables_key(hardware):
+    return tuple(tuple(sorted(table.items())) for table in (
+        hardware.opcode_table, hardware.opcode_table0, hardware.opcode_table5, hardware.opcode_table8,
+        hardware.opcode_tableE, hardware.opcode_tableF))
+
+
+def analyse(hardware, rom_size):
+    """
+    The ControlFlowGraph of the ROM loaded in hardware (rom_size bytes at 0x200),
+    cached per ROM hash, memory size and opcode tables.
+    """
+    rom = bytes(hardware.memory[PROGRAM_START:PROGRAM_START + rom_size])
+    key = (hashlib.sha1(rom).hexdigest(), len(hardware.memory), _tables_key(hardware))
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    graph = ControlFlowGraph(hardware)
+    _cache[key] = graph
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return graph
+
+
+def analyse_rom(rom, quirks="default"):
+    """ControlFlowGraph of a ROM (path or bytes) under a quirk profile name or quirks dict."""
+    hardware = build_machine(quirks)
+    return analyse(hardware, hardware.load_rom(rom))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.disasm", description="Disassemble a CHIP-8 ROM.")
+    parser.add_argument("rom", help="path to the ROM")
+    parser.add_argument("--quirks", choices=PROFILES, default="default", help="quirk profile / platform")
+    parser.add_argument("--linear", action="store_true", help="decode every word instead of following the code")
+    args = parser.parse_args(argv)
+
+    hardware = build_machine(args.quirks)
+    size = hardware.load_rom(args.rom)
+    end = PROGRAM_START + size
+
+    if args.linear:
+        for instruction in disassemble(hardware, PROGRAM_START, end):
+            print(f"    {instruction.address:03X}  {instruction.opcode:04X}  {instruction.text}")
+        return 0
+
+    graph = analyse(hardware, size)
+    code = sum(graph.code_map[PROGRAM_START:end])
+    resolved = sum(1 for targets in graph.computed.values() if targets)
+    print(f"; {len(graph.blocks)} blocks, {len(graph.calls)} subroutines, "
+          f"{resolved}/{len(graph.computed)} computed jumps resolved, {code} code / {size - code} data bytes")
+    # Code may run past the end of the ROM (into zeroed memory)
+    last = max([end] + [address + instruction.size for address, instruction in graph.instructions.items()
+                        if address >= PROGRAM_START])
+    for line in graph.listing(PROGRAM_START, last):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
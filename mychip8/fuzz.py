@@ -0,0 +1,576 @@
+"""
+Differential fuzzing: python -m mychip8.fuzz [--cases N] [--engines cycle,run,compiled]
+
+Generates random programs (random registers, I, timers, keys and data, then a
+stream of valid instructions) and runs each one on ReferenceChip8 and on every
+engine under test side by side, comparing a cheap digest of the machine
+(registers, timers, screen, and memory compared in place instead of copied)
+after every step, and building the whole state only once the digests differ.
+With --quirks every case runs once per quirk profile, on machines built with
+that profile's handlers. A diverging case is shrunk to a small reproducer ROM
+written next to a JSON file with the profile, keys, seed and schedule it needs.
+The exit code is 1 if anything diverged, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import time
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+
+from mychip8.chip8 import FONTSET
+from mychip8.compiler import BlockCompiler, machine_state
+from mychip8.quirks import PROFILES, build_machine
+
+# Profiles ReferenceChip8 can check: SCHIP / XO-CHIP instructions are not part of it
+FUZZ_PROFILES = [name for name, quirks in PROFILES.items() if quirks["platform"] == "chip-8"]
+
+# Names of the machine_state() fields, to say what diverged
+STATE_FIELDS = ("pc", "i", "sp", "v", "stack", "memory", "screen", "delay_timer", "sound_timer")
+
+
+def machine_digest(hardware):
+    """
+    machine_state() without copying memory: the digest holds the live buffer, so
+    it must be compared before the machine runs again. A bytearray comparison is
+    a memcmp, cheaper than a copy or a CRC of the 4K.
+    """
+    return (hardware.pc, hardware.i, hardware.sp, bytes(hardware.v), hardware.stack.tobytes(),
+            hardware.memory, tuple(hardware.screen), hardware.delay_timer, hardware.sound_timer)
+
+
+# keys: 16 bytes of key state, seed: the RND seed, step: cycles run between comparisons,
+# quirks: the quirk profile every machine is built with
+FuzzCase = namedtuple("FuzzCase", "case_id rom keys seed cycles_per_frame frames step quirks")
+# cycle: cycles run when the divergence showed up, frame: 60 Hz frames started by then
+Divergence = namedtuple("Divergence", "engine case_id quirks cycle frame detail")
+
+
+class ReferenceChip8:
+    """
+    A deliberately plain interpreter: one if/elif chain straight from the
+    instruction set, no caches or fast paths, sprites drawn pixel by pixel.
+    It pins down the semantics every engine has to reproduce, including the odd
+    corners: VF is written before the result (so 8XY5 with Y = F subtracts the
+    new flag) and RET below an empty stack indexes the stack from the end.
+    quirks (a profile name or dict from mychip8.quirks, CHIP-8 platform only)
+    switches in the other interpreters' answers to those corners.
+    """
+
+    def __init__(self, rom, keys=bytes(16), seed=0, quirks="default"):
+        self.quirks = PROFILES[quirks] if isinstance(quirks, str) else quirks
+        self.memory = bytearray(4096)
+        self.memory[:len(FONTSET)] = FONTSET
+        self.memory[0x200:0x200 + len(rom)] = rom
+        self.v = bytearray(16)
+        self.i = 0
+        self.pc = 0x200
+        self.stack = array("H", [0] * 16)
+        self.sp = 0
+        self.keys = bytearray(keys)
+        self.delay_timer = 0
+        self.sound_timer = 0
+        self.screen = [0] * 32
+        self.rng = Random(seed)
+
+    def tick_timers(self):
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+        if self.sound_timer > 0:
+            self.sound_timer -= 1
+
+    def run(self, cycles):
+        for _ in range(cycles):
+            self.step()
+
+    def step(self):
+        memory, v, quirks = self.memory, self.v, self.quirks
+        opcode = (memory[self.pc] << 8) | memory[self.pc + 1]
+        if opcode == 0x0000:
+            return # Halted
+        self.pc += 2
+
+        first = opcode >> 12
+        x = (opcode >> 8) & 0xF
+        y = (opcode >> 4) & 0xF
+        n = opcode & 0xF
+        kk = opcode & 0xFF
+        nnn = opcode & 0xFFF
+
+        if opcode == 0x00E0:
+            self.screen = [0] * 32
+        elif opcode == 0x00EE:
+            self.sp -= 1
+            self.pc = self.stack[self.sp]
+        elif first == 0x1:
+            self.pc = nnn
+        elif first == 0x2:
+            self.stack[self.sp] = self.pc
+            self.sp += 1
+            self.pc = nnn
+        elif first == 0x3:
+            if v[x] == kk:
+                self.pc += 2
+        elif first == 0x4:
+            if v[x] != kk:
+                self.pc += 2
+        elif first == 0x5:
+            if v[x] == v[y]:
+                self.pc += 2
+        elif first == 0x6:
+            v[x] = kk
+        elif first == 0x7:
+            v[x] = (v[x] + kk) % 256
+        elif first == 0x8:
+            if n in (0x4, 0x5, 0x7) and quirks["vf_last"] or \
+                    n in (0x6, 0xE) and (quirks["vf_last"] or quirks["shift_vy"]):
+                # VF written after the result, both from the operands as they were
+                source = v[y] if quirks["shift_vy"] else v[x]
+                if n == 0x4:
+                    result, flag = (v[x] + v[y]) % 256, int(v[x] + v[y] > 255)
+                elif n == 0x5:
+                    result, flag = (v[x] - v[y]) % 256, int(v[x] >= v[y])
+                elif n == 0x7:
+                    result, flag = (v[y] - v[x]) % 256, int(v[y] >= v[x])
+                elif n == 0x6:
+                    result, flag = source // 2, source % 2
+                else:
+                    result, flag = (source * 2) % 256, source // 128
+                v[x] = result
+                v[0xF] = flag
+            elif n == 0x0:
+                v[x] = v[y]
+            elif n == 0x1:
+                v[x] = v[x] | v[y]
+            elif n == 0x2:
+                v[x] = v[x] & v[y]
+            elif n == 0x3:
+                v[x] = v[x] ^ v[y]
+            elif n == 0x4:
+                total = v[x] + v[y]
+                v[0xF] = int(total > 255)
+                v[x] = total % 256
+            elif n == 0x5:
+                v[0xF] = int(v[x] >= v[y])
+                v[x] = (v[x] - v[y]) % 256
+            elif n == 0x6:
+                v[0xF] = v[x] % 2
+                v[x] = v[x] // 2
+            elif n == 0x7:
+                v[0xF] = int(v[y] >= v[x])
+                v[x] = (v[y] - v[x]) % 256
+            elif n == 0xE:
+                v[0xF] = v[x] // 128
+                v[x] = (v[x] * 2) % 256
+            if n in (0x1, 0x2, 0x3) and quirks["vf_reset"]:
+                v[0xF] = 0
+        elif first == 0x9:
+            if v[x] != v[y]:
+                self.pc += 2
+        elif first == 0xA:
+            self.i = nnn
+        elif first == 0xB:
+            self.pc = nnn + (v[x] if quirks["jump_vx"] else v[0])
+        elif first == 0xC:
+            v[x] = self.rng.randrange(256) & kk
+        elif first == 0xD:
+            self.draw(v[x] % 64, v[y] % 32, n)
+        elif first == 0xE:
+            if kk == 0x9E and self.keys[v[x]] == 1:
+                self.pc += 2
+            elif kk == 0xA1 and self.keys[v[x]] == 0:
+                self.pc += 2
+        elif first == 0xF:
+            if kk == 0x07:
+                v[x] = self.delay_timer
+            elif kk == 0x0A:
+                pressed = [key for key in range(16) if self.keys[key] == 1]
+                if pressed:
+                    v[x] = pressed[0]
+                else:
+                    self.pc -= 2
+            elif kk == 0x15:
+                self.delay_timer = v[x]
+            elif kk == 0x18:
+                self.sound_timer = v[x]
+            elif kk == 0x1E:
+                self.i = (self.i + v[x]) % 4096
+            elif kk == 0x29:
+                self.i = (v[x] % 16) * 5
+            elif kk == 0x33:
+                memory[self.i] = v[x] // 100
+                memory[self.i + 1] = v[x] // 10 % 10
+                memory[self.i + 2] = v[x] % 10
+            elif kk == 0x55:
+                for register in range(x + 1):
+                    memory[self.i + register] = v[register]
+                self.increment_i(x)
+            elif kk == 0x65:
+                for register in range(x + 1):
+                    v[register] = memory[self.i + register]
+                self.increment_i(x)
+
+    def increment_i(self, x):
+        """I after FX55 / FX65: unchanged, or moved past the registers (x+1) or to the last one (x)."""
+        if self.quirks["memory"] == "x+1":
+            self.i = (self.i + x + 1) % 4096
+        elif self.quirks["memory"] == "x":
+            self.i = (self.i + x) % 4096
+
+    def draw(self, x, y, height):
+        clip = self.quirks["clip"]
+        collision = 0
+        for row in range(height):
+            sprite_byte = self.memory[self.i + row]
+            if clip and y + row >= 32:
+                break
+            screen_y = (y + row) % 32
+            for col in range(8):
+                if clip and x + col >= 64:
+                    break
+                if sprite_byte & (0x80 >> col):
+                    bit = 1 << (63 - (x + col) % 64)
+                    if self.screen[screen_y] & bit:
+                        collision = 1
+                    self.screen[screen_y] ^= bit
+        self.v[0xF] = collision
+
+
+# --- Engines under test: case -> (run(cycles), tick_timers(), digest(), state()) ---
+def _hardware(case):
+    hardware = build_machine(case.quirks, seed=case.seed)
+    hardware.load_rom(case.rom)
+    hardware.keys[:] = case.keys
+    return hardware
+
+
+def cycle_engine(case):
+    """Chip8Hardware.cycle one instruction at a time."""
+    hardware = _hardware(case)
+    cycle = hardware.cycle
+
+    def run(cycles):
+        for _ in range(cycles):
+            cycle()
+
+    return run, hardware.tick_timers, lambda: machine_digest(hardware), lambda: machine_state(hardware)
+
+
+def run_engine(case):
+    """Chip8Hardware.run, with idle loops fast-forwarded."""
+    hardware = _hardware(case)
+    return hardware.run, hardware.tick_timers, lambda: machine_digest(hardware), lambda: machine_state(hardware)
+
+
+def compiled_engine(case):
+    hardware = _hardware(case)
+    return (BlockCompiler(hardware).run, hardware.tick_timers,
+            lambda: machine_digest(hardware), lambda: machine_state(hardware))
+
+
+def vector_engine(case):
+    """A one-lane VectorChip8."""
+    import numpy as np
+
+    from mychip8.vector import VectorChip8
+
+    machine = VectorChip8(1, seed=case.seed)
+    machine.load_rom(case.rom)
+    machine.keys[0] = list(case.keys)
+
+    def run(cycles):
+        for _ in range(cycles):
+            machine.step()
+            if machine.faulted[0]:
+                raise IndexError("lane faulted")
+
+    def digest():
+        # machine_digest of lane 0, without copying it into a Chip8Hardware
+        return (int(machine.pc[0]), int(machine.i[0]), int(machine.sp[0]), machine.v[0].tobytes(),
+                machine.stack[0].astype(np.uint16).tobytes(), machine.memory[0].tobytes(),
+                tuple(int.from_bytes(row, "big") for row in np.packbits(machine.screen[0], axis=1).tolist()),
+                int(machine.delay_timer[0]), int(machine.sound_timer[0]))
+
+    return run, machine.tick_timers, digest, lambda: machine_state(machine.lane_hardware(0))
+
+
+ENGINES = {
+    "cycle": cycle_engine,
+    "run": run_engine,
+    "compiled": compiled_engine,
+    "vector": vector_engine,
+}
+
+
+# --- Case generation ---
+INSTRUCTIONS = (
+    "00E0", "00EE", "1nnn", "2nnn", "3xkk", "4xkk", "5xy0", "6xkk", "7xkk",
+    "8xy0", "8xy1", "8xy2", "8xy3", "8xy4", "8xy5", "8xy6", "8xy7", "8xyE",
+    "8xy4", "8xy5", "8xy6", "8xy7", "8xyE", "9xy0", "Annn", "Bnnn", "Cxkk",
+    "Dxyn", "Ex9E", "ExA1", "Fx07", "Fx0A", "Fx15", "Fx18", "Fx1E", "Fx29",
+    "Fx33", "Fx55", "Fx65", "0nnn",
+)
+# Per template: the opcode with the fields zeroed, then whether it has nnn, kk, x, y and a nibble n
+TEMPLATE_FIELDS = {
+    template: (int("".join(char if char in "0123456789ABCDEF" else "0" for char in template), 16),
+               "nnn" in template, "kk" in template, "x" in template, "y" in template,
+               "n" in template.replace("nnn", ""))
+    for template in INSTRUCTIONS
+}
+
+
+def _instruction(rng, template, jump_targets, i_targets):
+    """Fill in a template from INSTRUCTIONS, with VF and X == Y picked often."""
+    x = 0xF if rng.random() < 0.2 else rng.randrange(16)
+    y = x if rng.random() < 0.1 else 0xF if rng.random() < 0.2 else rng.randrange(16)
+    kk = rng.choice((0x00, 0x01, 0x7F, 0x80, 0xFF, rng.randrange(256)))
+
+    if template[0] in "12B":
+        nnn = rng.choice(jump_targets)
+    elif template[0] == "A":
+        nnn = rng.choice(i_targets)
+    else:
+        nnn = rng.randrange(0x1000)
+
+    n = rng.randrange(16)
+
+    opcode, has_nnn, has_kk, has_x, has_y, has_n = TEMPLATE_FIELDS[template]
+    if has_nnn:
+        opcode |= nnn
+    if has_kk:
+        opcode |= kk
+    if has_x:
+        opcode |= x << 8
+    if has_y:
+        opcode |= y << 4
+    if has_n:
+        opcode |= n
+    return opcode
+
+
+def generate_case(case_id, quirks="default"):
+    """The random program for case_id, the same every time, to run with the quirks profile."""
+    rng = Random(case_id)
+
+    prelude = [0x6000 | rng.randrange(256), 0xF015, 0x6000 | rng.randrange(256), 0xF018]
+    for x in range(16):
+        value = rng.choice((0x00, 0x01, 0x0F, 0x80, 0xFF, rng.randrange(16), rng.randrange(256)))
+        prelude.append(0x6000 | x << 8 | value)
+
+    length = rng.randint(16, 96)
+    code_end = 0x200 + 2 * (len(prelude) + 1 + length)
+    data = bytes(rng.randrange(256) for _ in range(rng.randint(16, 64)))
+
+    jump_targets = range(0x200, code_end, 2)
+    i_targets = [rng.randrange(code_end, code_end + len(data)), rng.randrange(0x200, code_end),
+                 rng.randrange(0x50), rng.randrange(0xFF0, 0x1000)]
+    prelude.append(0xA000 | rng.choice(i_targets[:3]))
+
+    words = list(prelude)
+    while len(words) < len(prelude) + length:
+        address = 0x200 + 2 * len(words)
+        idle = rng.random()
+        if idle < 0.02:
+            words.append(0x1000 | address)  # JP to itself
+        elif idle < 0.04:
+            x = rng.randrange(16)           # Delay timer wait: LD Vx, DT / SE Vx, 0 / JP back
+            words += [0xF007 | x << 8, 0x3000 | x << 8, 0x1000 | address]
+        else:
+            words.append(_instruction(rng, rng.choice(INSTRUCTIONS), jump_targets, i_targets))
+    words = words[:len(prelude) + length]
+
+    rom = b"".join(word.to_bytes(2, "big") for word in words) + data
+    keys = bytes(16) if rng.random() < 0.5 else bytes(int(rng.random() < 0.2) for _ in range(16))
+    cycles_per_frame = rng.randint(1, 30)
+    step = rng.choice((1, 2, 3, 7, cycles_per_frame))
+    return FuzzCase(case_id, rom, keys, rng.randrange(2 ** 32), cycles_per_frame,
+                    rng.randint(5, 30), min(step, cycles_per_frame), quirks)
+
+
+# --- Running cases ---
+def _attempt(run, cycles):
+    """Run and return the exception raised, if any."""
+    try:
+        run(cycles)
+    except Exception as error:
+        return error
+    return None
+
+
+def run_case(case, engines):
+    """
+    Run case on ReferenceChip8 and on every engine in lockstep, returns a
+    Divergence for each engine that diverged (the first one only).
+    """
+    reference = ReferenceChip8(case.rom, case.keys, case.seed, case.quirks)
+    machines = {engine: ENGINES[engine](case) for engine in engines}
+    divergences = []
+    done = 0
+
+    for frame in range(case.frames):
+        left = case.cycles_per_frame
+        while left:
+            step = min(case.step, left)
+            expected_error = _attempt(reference.run, step)
+            expected = None if expected_error else machine_digest(reference)
+            done += step
+            left -= step
+
+            for engine, (run, tick_timers, digest, state) in list(machines.items()):
+                error = _attempt(run, step)
+                if expected_error or error:
+                    # Both stopping with the same exception is a match, the state is not compared
+                    if type(expected_error) is not type(error):
+                        divergences.append(Divergence(
+                            engine, case.case_id, case.quirks, done, frame,
+                            f"reference raised {expected_error!r}, {engine} raised {error!r}"))
+                    del machines[engine]
+                    continue
+
+                if digest() != expected:
+                    fields = [name for name, a, b in zip(STATE_FIELDS, machine_state(reference), state()) if a != b]
+                    divergences.append(Divergence(engine, case.case_id, case.quirks, done, frame,
+                                                  "differs in " + ", ".join(fields)))
+                    del machines[engine]
+
+            if not machines:
+                return divergences
+
+        reference.tick_timers()
+        for run, tick_timers, digest, state in machines.values():
+            tick_timers()
+
+    return divergences
+
+
+def minimize(case, engine):
+    """
+    Shrink a diverging case: stop after the diverging frame, then turn each
+    instruction into a halt (0000) or else a no-op (8000: LD V0, V0) and release
+    the keys, wherever the divergence survives it.
+    """
+    divergences = run_case(case, [engine])
+    if not divergences:
+        return case
+    case = case._replace(frames=divergences[0].frame + 1)
+
+    def still_diverges(candidate):
+        return bool(run_case(candidate, [engine]))
+
+    rom = bytearray(case.rom)
+    for offset in range((len(rom) - 2) & ~1, -1, -2):
+        saved = rom[offset:offset + 2]
+        for replacement in (b"\x00\x00", b"\x80\x00"):
+            if saved == replacement:
+                break
+            rom[offset:offset + 2] = replacement
+            if still_diverges(case._replace(rom=bytes(rom))):
+                break
+            rom[offset:offset + 2] = saved
+    case = case._replace(rom=bytes(rom).rstrip(b"\x00") or b"\x00")
+
+    if case.keys != bytes(16) and still_diverges(case._replace(keys=bytes(16))):
+        case = case._replace(keys=bytes(16))
+    return case
+
+
+def fuzz_chunk(job):
+    """Worker: run case_ids [first, first + count) with a quirk profile on every engine, returns the Divergences."""
+    first, count, engines, quirks = job
+    divergences = []
+
+    for case_id in range(first, first + count):
+        divergences.extend(run_case(generate_case(case_id, quirks), engines))
+
+    return divergences
+
+
+def fuzz(cases, engines, start=0, workers=None, chunk=200, profiles=("default",)):
+    """
+    Run case_ids [start, start + cases) with every quirk profile across worker
+    processes, returns every Divergence.
+    """
+    jobs = [(first, min(chunk, start + cases - first), engines, quirks)
+            for quirks in profiles for first in range(start, start + cases, chunk)]
+
+    divergences = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(fuzz_chunk, jobs):
+            divergences.extend(result)
+    return divergences
+
+
+def write_reproducer(case, divergence, output_dir):
+    """Save the case as a ROM plus a JSON file with everything else needed to rerun it."""
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"fuzz-{divergence.engine}-{case.quirks}-{case.case_id}")
+
+    with open(base + ".ch8", "wb") as f:
+        f.write(case.rom)
+    with open(base + ".json", "w") as f:
+        json.dump({
+            "engine": divergence.engine,
+            "case_id": case.case_id,
+            "quirks": case.quirks,
+            "cycle": divergence.cycle,
+            "detail": divergence.detail,
+            "keys": list(case.keys),
+            "seed": case.seed,
+            "cycles_per_frame": case.cycles_per_frame,
+            "frames": case.frames,
+            "step": case.step,
+        }, f, indent=2)
+    return base + ".ch8"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.fuzz", description="Differential fuzzing.")
+    parser.add_argument("--cases", type=int, default=10_000)
+    parser.add_argument("--start", type=int, default=0, help="first case id")
+    parser.add_argument("--case", type=int, help="rerun a single case id")
+    parser.add_argument("--engines", default="cycle,run,compiled",
+                        help=f"comma-separated, from {', '.join(ENGINES)}")
+    parser.add_argument("--quirks", default="default",
+                        help=f"comma-separated quirk profiles, from {', '.join(FUZZ_PROFILES)}, or all")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", default="fuzz-failures", help="directory for reproducers")
+    parser.add_argument("--max-reports", type=int, default=5, help="reproducers to minimize and write")
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(",")
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine!r}")
+    profiles = FUZZ_PROFILES if args.quirks == "all" else args.quirks.split(",")
+    for quirks in profiles:
+        if quirks not in FUZZ_PROFILES:
+            parser.error(f"can't fuzz quirk profile {quirks!r}, only {', '.join(FUZZ_PROFILES)}")
+    if "vector" in engines and profiles != ["default"]:
+        parser.error("the vector engine only runs the default profile")
+
+    start = time.perf_counter()
+    if args.case is not None:
+        divergences = [divergence for quirks in profiles
+                       for divergence in fuzz_chunk((args.case, 1, engines, quirks))]
+        cases = len(profiles)
+    else:
+        divergences = fuzz(args.cases, engines, args.start, args.workers, profiles=profiles)
+        cases = args.cases * len(profiles)
+    elapsed = time.perf_counter() - start
+
+    print(f"{cases} cases x {len(engines)} engines in {elapsed:.1f}s "
+          f"({cases / elapsed:.0f} cases/s), {len(divergences)} divergences")
+
+    for divergence in divergences[:args.max_reports]:
+        case = minimize(generate_case(divergence.case_id, divergence.quirks), divergence.engine)
+        path = write_reproducer(case, divergence, args.output)
+        print(f"case {divergence.case_id} ({divergence.quirks}): {divergence.engine} diverged at cycle {divergence.cycle} "
+              f"({divergence.detail}), reproducer {path}")
+
+    return 1 if divergences else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,223 @@
+"""
+Grid view: python -m mychip8.grid ROMS... [--quirks default,cosmac-vip] [--copies N]
+
+Tiles many machines into one pygame window. Every machine has its own
+Scheduler; each display frame advances them in turn, starting where the
+previous frame stopped, until the frame's emulation budget is used up, so a
+slow frame delays some machines by a frame instead of dropping the display
+rate. Only tiles whose screen changed are redrawn (one 8-bit scale and one
+blit each) and only their rectangles are pushed to the display.
+
+Keys go to every machine; click a tile to send them to that one only, click it
+again to go back to all.
+"""
+import argparse
+import os
+import time
+
+import pygame
+
+from mychip8.quirks import PROFILES, build_machine
+from mychip8.run import engine_runner
+from mychip8.scheduler import Scheduler
+from mychip8.screen import blit_screen, key_codes
+from mychip8.settings import STANDARD_SETTINGS
+
+LABEL_HEIGHT = 16
+BORDER = 2
+FOCUS_COLOR = (255, 255, 0)
+FAULT_COLOR = (255, 0, 0)
+
+
+class Tile:
+    """One machine in the grid and the surfaces its screen goes through."""
+
+    def __init__(self, hardware, run, label, instructions_per_second, rect):
+        self.hardware = hardware
+        self.scheduler = Scheduler(hardware, run, instructions_per_second)
+        self.label = label
+        self.rect = rect            # Where the screen goes in the window
+        self.native = None          # 8-bit surface at the machine's resolution
+        self.scaled = None          # 8-bit surface at the tile's size
+        self.last_time = None
+        self.error = None
+
+
+class GridView:
+    def __init__(self, machines, labels=None, runs=None, columns=None, scale=3,
+                 instructions_per_second=600, display_fps=60, emulation_share=0.75,
+                 bg_color=STANDARD_SETTINGS["bg_color"], pixel_color=STANDARD_SETTINGS["pixel_color"],
+                 plane_colors=None, key_map=STANDARD_SETTINGS["key_map"]):
+        """
+        machines: Chip8Hardware instances, labels: text above each tile, runs:
+        run(cycles) per machine (default: its interpreter). emulation_share is the
+        part of each display frame spent running machines.
+        """
+        self.tile_size = (64 * scale, 32 * scale)
+        # Default: as many columns as make the window about 16:9
+        cell_width, cell_height = 64 * scale + 2 * BORDER, 32 * scale + LABEL_HEIGHT + 2 * BORDER
+        self.columns = columns or max(1, round((len(machines) * 16 / 9 * cell_height / cell_width) ** 0.5))
+        self.display_fps = display_fps
+        self.emulation_share = emulation_share
+        self.key_map = key_map
+
+        midpoint = tuple((bg + pixel) // 2 for bg, pixel in zip(bg_color, pixel_color))
+        self.bg_color = bg_color
+        self.palette = [bg_color, pixel_color, *(plane_colors or (midpoint, pixel_color))]
+
+        width, height = self.tile_size
+        self.tiles = []
+        for number, hardware in enumerate(machines):
+            column, row = number % self.columns, number // self.columns
+            rect = pygame.Rect(column * (width + 2 * BORDER) + BORDER,
+                               row * (height + LABEL_HEIGHT + 2 * BORDER) + LABEL_HEIGHT + BORDER, width, height)
+            run = runs[number] if runs else hardware.run
+            label = labels[number] if labels else str(number)
+            self.tiles.append(Tile(hardware, run, label, instructions_per_second, rect))
+
+        rows = (len(machines) + self.columns - 1) // self.columns
+        self.window_size = (self.columns * (width + 2 * BORDER), rows * (height + LABEL_HEIGHT + 2 * BORDER))
+        self.next_tile = 0          # Where the next frame starts advancing machines
+        self.focus = None           # Tile receiving the keys, None for all
+        self.running = False
+
+    def init(self):
+        pygame.init()
+        self.screen = pygame.display.set_mode(self.window_size)
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont("monospace", 12)
+        pygame.display.set_caption(f"MyPyChip8 - {len(self.tiles)} machines")
+
+        self.key_codes = key_codes(self.key_map)
+
+        self.screen.fill(self.bg_color)
+        for tile in self.tiles:
+            tile.scaled = pygame.Surface(self.tile_size, depth=8)
+            tile.scaled.set_palette(self.palette)
+            tile.hardware.draw_flag = True
+            self.draw_frame(tile)
+        pygame.display.flip()
+        self.running = True
+
+    def draw_frame(self, tile):
+        """Label and border of a tile, returns the rectangle to update."""
+        area = tile.rect.inflate(2 * BORDER, 2 * BORDER).union(
+            pygame.Rect(tile.rect.x, tile.rect.y - LABEL_HEIGHT, tile.rect.width, LABEL_HEIGHT))
+        self.screen.fill(self.bg_color, area)
+        color = FAULT_COLOR if tile.error else FOCUS_COLOR if tile is self.focus else None
+        if color:
+            pygame.draw.rect(self.screen, color, tile.rect.inflate(2 * BORDER, 2 * BORDER), BORDER)
+        text = tile.error or tile.label
+        self.screen.blit(self.font.render(text, True, color or self.palette[1]),
+                         (tile.rect.x, tile.rect.y - LABEL_HEIGHT))
+        tile.hardware.draw_flag = True # The screen itself is drawn by render_tile
+        return area
+
+    def render_tile(self, tile):
+        """Copy a machine's screen into its tile if it changed, returns the rectangle or None."""
+        hardware = tile.hardware
+        if not hardware.draw_flag:
+            return None
+        hardware.draw_flag = False
+
+        tile.native = blit_screen(hardware, tile.native, tile.scaled, self.screen, tile.rect, self.palette)
+        return tile.rect
+
+    def advance(self, budget):
+        """
+        Advance machines round-robin until budget host seconds are used, starting
+        after the last one advanced. Machines not reached catch up next frame.
+        """
+        deadline = time.perf_counter() + budget
+        tiles = self.tiles
+        count = len(tiles)
+        faulted = []
+
+        for offset in range(count):
+            tile = tiles[(self.next_tile + offset) % count]
+            if tile.error:
+                continue
+            now = time.perf_counter()
+            if tile.last_time is None:
+                tile.last_time = now
+            try:
+                tile.scheduler.advance(now - tile.last_time)
+            except Exception as error:
+                tile.error = f"{type(error).__name__} at {tile.hardware.pc:03X}"
+                faulted.append(tile)
+            tile.last_time = now
+
+            if time.perf_counter() >= deadline:
+                self.next_tile = (self.next_tile + offset + 1) % count
+                break
+        return faulted
+
+    def frame(self):
+        """One display frame: advance the machines, redraw the changed tiles, returns how many."""
+        dirty = [self.draw_frame(tile) for tile in self.advance(self.emulation_share / self.display_fps)]
+        for tile in self.tiles:
+            rect = self.render_tile(tile)
+            if rect:
+                dirty.append(rect)
+        if dirty:
+            pygame.display.update(dirty)
+        return len(dirty)
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.running = False
+
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in self.key_codes:
+            pressed = 1 if event.type == pygame.KEYDOWN else 0
+            for tile in [self.focus] if self.focus else self.tiles:
+                tile.hardware.keys[self.key_codes[event.key]] = pressed
+
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            clicked = next((tile for tile in self.tiles if tile.rect.collidepoint(event.pos)), None)
+            if clicked:
+                previous, self.focus = self.focus, None if clicked is self.focus else clicked
+                areas = [self.draw_frame(tile) for tile in (previous, clicked) if tile]
+                pygame.display.update(areas)
+
+    def loop(self):
+        while self.running:
+            for event in pygame.event.get():
+                self.handle_event(event)
+            if not self.running:
+                break
+            self.frame()
+            self.clock.tick(self.display_fps)
+        pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.grid", description="Run many machines in one window.")
+    parser.add_argument("roms", nargs="+", help="ROMs to run")
+    parser.add_argument("--quirks", default="default",
+                        help=f"comma-separated profiles, one machine per ROM and profile ({', '.join(PROFILES)})")
+    parser.add_argument("--copies", type=int, default=1, help="machines per ROM and profile")
+    parser.add_argument("--columns", type=int)
+    parser.add_argument("--scale", type=int, default=3)
+    parser.add_argument("--ips", type=int, default=600, help="instructions per second of every machine")
+    parser.add_argument("--engine", choices=("interpreter", "compiled"), default="interpreter")
+    args = parser.parse_args(argv)
+
+    machines, labels, runs = [], [], []
+    for rom in args.roms:
+        for quirks in args.quirks.split(","):
+            for copy in range(args.copies):
+                hardware = build_machine(quirks)
+                hardware.load_rom(rom)
+                machines.append(hardware)
+                runs.append(engine_runner(hardware, args.engine))
+                label = os.path.basename(rom) + (f" [{quirks}]" if quirks != "default" else "")
+                labels.append(label + (f" #{copy + 1}" if args.copies > 1 else ""))
+
+    view = GridView(machines, labels, runs, args.columns, args.scale, args.ips)
+    view.init()
+    view.loop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
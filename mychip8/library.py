@@ -0,0 +1,257 @@
+"""
+ROM library: python -m mychip8.library scan DIRS... | list [TEXT]
+
+Indexes ROM directories into a SQLite database. Every ROM is hashed once; per
+content hash the index keeps the size, the detected platform and quirk profile,
+a thumbnail (the packed screen after a short headless run) and the decoded
+instruction stream. Later scans only stat the files: a ROM is re-read when its
+mtime or size changed, and re-analysed only when its hash is new or its entry
+in the quirk database was added, changed or removed since it was analysed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from mychip8.disasm import ControlFlowGraph
+from mychip8.quirks import PROFILES, build_machine, load_database, quirks_for_rom
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".mychip8", "library.sqlite")
+ROM_EXTENSIONS = (".ch8", ".c8", ".sc8", ".xo8")
+
+# Instructions only SCHIP / XO-CHIP interpreters know, by (opcode & mask) == value
+SCHIP_SIGNS = [(0xFFF0, 0x00C0), (0xFFFF, 0x00FB), (0xFFFF, 0x00FC), (0xFFFF, 0x00FD), (0xFFFF, 0x00FE),
+               (0xFFFF, 0x00FF), (0xF0FF, 0xF030), (0xF0FF, 0xF075), (0xF0FF, 0xF085)]
+XO_CHIP_SIGNS = [(0xFFF0, 0x00D0), (0xF00F, 0x5002), (0xF00F, 0x5003), (0xFFFF, 0xF000), (0xF0FF, 0xF001),
+                 (0xFFFF, 0xF002), (0xF0FF, 0xF03A)]
+
+# Bumped when the analysis changes, so older indexes are analysed again
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1);
+CREATE TABLE IF NOT EXISTS roms (
+    sha1 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    platform TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    quirks TEXT NOT NULL,
+    thumbnail BLOB,
+    thumbnail_width INTEGER,
+    thumbnail_height INTEGER,
+    instructions TEXT NOT NULL,
+    quirk_db_entry TEXT
+);
+"""
+
+# profile: name of the quirk profile, "custom" when the quirk database overrides some quirks
+RomEntry = namedtuple("RomEntry", "path sha1 size platform profile quirks")
+
+
+def detect_platform(rom_data):
+    """
+    Guess "chip-8", "schip" or "xo-chip" from the instructions a ROM runs. Only
+    the words reachable from 0x200 count, so sprites and tables that happen to
+    look like SCHIP or XO-CHIP opcodes don't.
+    """
+    if len(rom_data) > 0x1000 - 0x200:
+        return "xo-chip"
+
+    # XO-CHIP decodes the instructions of all three, so its flow reaches the most code
+    hardware = build_machine("xo-chip")
+    hardware.load_rom(rom_data)
+    words = {instruction.opcode for instruction in ControlFlowGraph(hardware).instructions.values()}
+    if any(word & mask == value for word in words for mask, value in XO_CHIP_SIGNS):
+        return "xo-chip"
+    if any(word & mask == value for word in words for mask, value in SCHIP_SIGNS):
+        return "schip"
+    return "chip-8"
+
+
+def quirks_for(rom_data, database):
+    """
+    (profile name, quirks) from the ROM hash database, else the profile of the
+    detected platform.
+    """
+    platform = detect_platform(rom_data)
+    default = {"chip-8": "default", "schip": "schip", "xo-chip": "xo-chip"}[platform]
+    quirks = quirks_for_rom(rom_data, database, default)
+    profile = next((name for name, profile in PROFILES.items() if profile == quirks), "custom")
+    return profile, quirks
+
+
+def analyse(job):
+    """Worker: metadata row for one ROM's content. Never raises."""
+    rom_data, database, quirk_db_entry, frames, cycles_per_frame = job
+    sha1 = hashlib.sha1(rom_data).hexdigest()
+    profile, quirks = quirks_for(rom_data, database)
+
+    hardware = build_machine(quirks, seed=0)
+    thumbnail = None
+    try:
+        hardware.load_rom(rom_data)
+    except ValueError:
+        pass # Too big for its platform's memory, nothing to run
+    else:
+        try:
+            for _ in range(frames):
+                hardware.run(cycles_per_frame)
+                hardware.tick_timers()
+        except Exception:
+            pass # Still worth a thumbnail of whatever it drew
+        thumbnail = hardware.frame_bytes()
+
+    # Decoded stream: (address, opcode, handler) for every word
+    instructions = []
+    for offset in range(0, len(rom_data) - 1, 2):
+        opcode = (rom_data[offset] << 8) | rom_data[offset + 1]
+        method = hardware.decode_opcode(opcode)
+        instructions.append((0x200 + offset, opcode, method.__name__ if method else None))
+
+    return (sha1, len(rom_data), quirks["platform"], profile, json.dumps(quirks), thumbnail,
+            hardware.width, hardware.height, json.dumps(instructions), quirk_db_entry)
+
+
+class RomLibrary:
+    def __init__(self, path=DEFAULT_PATH, quirk_db=None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        (version,) = self.db.execute("PRAGMA user_version").fetchone()
+        if version < SCHEMA_VERSION:
+            # Analysed the old way: drop the analyses, the next scan redoes them
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS roms")
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+        self.quirk_db = load_database(quirk_db) if quirk_db else {}
+
+    def close(self):
+        self.db.close()
+
+    def quirk_db_entry(self, sha1):
+        """The quirk database entry of a ROM as stored with its analysis (JSON), None if it has none."""
+        entry = self.quirk_db.get(sha1)
+        return json.dumps(entry, sort_keys=True) if entry is not None else None
+
+    def scan(self, directories, frames=60, cycles_per_frame=10, workers=None):
+        """
+        Bring the index up to date with the ROMs under directories.
+        Returns (files seen, files re-read, ROMs analysed).
+        """
+        known = {path: (mtime, size, sha1)
+                 for path, mtime, size, sha1 in self.db.execute("SELECT path, mtime, size, sha1 FROM files")}
+        # Analyses made with another quirk database entry than the current one are redone
+        analysed = {sha1 for sha1, entry in self.db.execute("SELECT sha1, quirk_db_entry FROM roms")
+                    if entry == self.quirk_db_entry(sha1)}
+
+        seen = set()
+        changed = []    # (path, mtime, size, sha1)
+        jobs = {}       # sha1 -> analyse job
+        for directory in directories:
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if not name.lower().endswith(ROM_EXTENSIONS):
+                        continue
+                    path = os.path.abspath(os.path.join(root, name))
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue # Dangling link, or removed since the walk listed it
+                    seen.add(path)
+                    if path in known and known[path][:2] == (stat.st_mtime, stat.st_size) \
+                            and known[path][2] in analysed:
+                        continue
+
+                    try:
+                        with open(path, "rb") as f:
+                            rom_data = f.read()
+                    except OSError:
+                        seen.discard(path) # Unreadable: dropped from the index until it can be read
+                        continue
+                    sha1 = hashlib.sha1(rom_data).hexdigest()
+                    changed.append((path, stat.st_mtime, stat.st_size, sha1))
+                    if sha1 not in analysed and sha1 not in jobs:
+                        # Only the ROM's own entry is shipped, the platform is detected in the worker
+                        database = {sha1: self.quirk_db[sha1]} if sha1 in self.quirk_db else {}
+                        jobs[sha1] = (rom_data, database, self.quirk_db_entry(sha1), frames, cycles_per_frame)
+
+        if len(jobs) > 16:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(analyse, jobs.values(), chunksize=16))
+        else:
+            rows = [analyse(job) for job in jobs.values()]
+
+        roots = tuple(os.path.join(os.path.abspath(directory), "") for directory in directories)
+        removed = [(path,) for path in known if path.startswith(roots) and path not in seen]
+
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO roms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", changed)
+            self.db.executemany("DELETE FROM files WHERE path = ?", removed)
+            self.db.execute("DELETE FROM roms WHERE sha1 NOT IN (SELECT sha1 FROM files)")
+
+        return len(seen), len(changed), len(rows)
+
+    def entries(self, text=None):
+        """RomEntries sorted by file name, optionally only paths containing text."""
+        query = ("SELECT files.path, roms.sha1, roms.size, roms.platform, roms.profile, roms.quirks "
+                 "FROM files JOIN roms ON files.sha1 = roms.sha1")
+        if text:
+            # A plain substring: % and _ in text are matched literally
+            text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = self.db.execute(query + " WHERE files.path LIKE ? ESCAPE '\\'", (f"%{text}%",))
+        else:
+            rows = self.db.execute(query)
+        entries = (RomEntry(*row[:5], json.loads(row[5])) for row in rows)
+        return sorted(entries, key=lambda entry: os.path.basename(entry.path).lower())
+
+    def thumbnail(self, sha1):
+        """(packed screen bytes, width, height) of a ROM, None if it has none."""
+        row = self.db.execute("SELECT thumbnail, thumbnail_width, thumbnail_height FROM roms WHERE sha1 = ?",
+                              (sha1,)).fetchone()
+        return row if row and row[0] is not None else None
+
+    def instructions(self, sha1):
+        """The decoded (address, opcode, handler name) stream of a ROM."""
+        row = self.db.execute("SELECT instructions FROM roms WHERE sha1 = ?", (sha1,)).fetchone()
+        return [tuple(instruction) for instruction in json.loads(row[0])] if row else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.library", description="Index ROM directories.")
+    parser.add_argument("--db", default=DEFAULT_PATH, help="index file")
+    parser.add_argument("--quirk-db", help="JSON database of quirk profiles by ROM SHA-1")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan", help="index or refresh directories")
+    scan.add_argument("directories", nargs="+")
+    scan.add_argument("--workers", type=int)
+    listing = commands.add_parser("list", help="print the indexed ROMs")
+    listing.add_argument("text", nargs="?", help="only paths containing this")
+    args = parser.parse_args(argv)
+
+    library = RomLibrary(args.db, args.quirk_db)
+    if args.command == "scan":
+        start = time.perf_counter()
+        seen, changed, analysed = library.scan(args.directories, workers=args.workers)
+        print(f"{seen} ROMs, {changed} re-read, {analysed} analysed "
+              f"in {time.perf_counter() - start:.2f}s")
+    else:
+        for entry in library.entries(args.text):
+            print(f"{entry.sha1[:12]}  {entry.platform:8} {entry.profile:11} {entry.size:6}  {entry.path}")
+    library.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -26,6 +26,11 @@ SUB_TABLE_0 = {
     0x00EE: "RET"
 }
 
+# Sub-table for 0x5 when the main table sends 0x5 to "TABLE_5" (Key is last nibble)
+SUB_TABLE_5 = {
+    0x0: "SE_Vx_Vy"
+}
+
 # Sub-table for ALU operations starting with 0x8 (Key is last nibble)
 SUB_TABLE_8 = {
     0x0: "LD_Vx_Vy",
@@ -56,4 +61,75 @@ SUB_TABLE_F = {
     0x33: "LD_B_Vx",   # BCD conversion
     0x55: "LD_I_Vx",   # Store registers in memory (Dump)
     0x65: "LD_Vx_I"    # Load registers from memory (Load)
-}
\ No newline at end of file
+}
+
+# --- SUPER-CHIP / XO-CHIP ---
+# These extend the tables above; pass them to Chip8Hardware as keyword arguments,
+# e.g. Chip8Hardware(**XO_CHIP_TABLES, memory_size=0x10000).
+
+SCHIP_OPCODE_TABLE = {**OPCODE_TABLE, 0xD: "DRW_Vx_Vy_planes"}
+
+SCHIP_SUB_TABLE_0 = {
+    **SUB_TABLE_0,
+    **{0x00C0 | n: "SCD_nibble" for n in range(16)},
+    0x00FB: "SCR",
+    0x00FC: "SCL",
+    0x00FD: "EXIT",
+    0x00FE: "LOW",
+    0x00FF: "HIGH"
+}
+
+SCHIP_SUB_TABLE_F = {
+    **SUB_TABLE_F,
+    0x30: "LD_HF_Vx",  # Point I to the 8x10 digit
+    0x75: "LD_R_Vx",   # Save registers to the user flags
+    0x85: "LD_Vx_R"    # Load registers from the user flags
+}
+
+# XO-CHIP skips step over the whole 4-byte F000 NNNN
+XO_OPCODE_TABLE = {
+    **SCHIP_OPCODE_TABLE,
+    0x3: "SE_Vx_byte_xo",
+    0x4: "SNE_Vx_byte_xo",
+    0x5: "TABLE_5",
+    0x9: "SNE_Vx_Vy_xo"
+}
+
+XO_SUB_TABLE_0 = {
+    **SCHIP_SUB_TABLE_0,
+    **{0x00D0 | n: "SCU_nibble" for n in range(16)},
+    0x00E0: "CLS_planes"
+}
+
+XO_SUB_TABLE_5 = {
+    0x0: "SE_Vx_Vy_xo",
+    0x2: "LD_I_Vx_Vy",  # Store VX..VY at I
+    0x3: "LD_Vx_Vy_I"   # Load VX..VY from I
+}
+
+XO_SUB_TABLE_E = {
+    0x9E: "SKP_Vx_xo",
+    0xA1: "SKNP_Vx_xo"
+}
+
+XO_SUB_TABLE_F = {
+    **SCHIP_SUB_TABLE_F,
+    0x00: "LD_I_long",  # F000 NNNN: 16-bit I
+    0x01: "PLANE",      # FN01: select planes
+    0x02: "LD_AUDIO",   # F002: load the audio pattern from I
+    0x3A: "PITCH_Vx"    # FX3A: audio pitch
+}
+
+SCHIP_TABLES = {
+    "opcode_table": SCHIP_OPCODE_TABLE,
+    "opcode_table0": SCHIP_SUB_TABLE_0,
+    "opcode_tableF": SCHIP_SUB_TABLE_F
+}
+
+XO_CHIP_TABLES = {
+    "opcode_table": XO_OPCODE_TABLE,
+    "opcode_table0": XO_SUB_TABLE_0,
+    "opcode_table5": XO_SUB_TABLE_5,
+    "opcode_tableE": XO_SUB_TABLE_E,
+    "opcode_tableF": XO_SUB_TABLE_F
+}
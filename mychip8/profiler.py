@@ -0,0 +1,115 @@
+import json
+import time
+from collections import defaultdict
+
+# Number of set bits in each byte value
+BIT_COUNT = [bin(byte).count("1") for byte in range(256)]
+
+
+class Profiler:
+    """
+    Opt-in instrumentation for Chip8Hardware.
+
+    attach() installs a dispatch patch that wraps every decoded slot with a counter
+    and a timer; detach() puts the plain handlers back, so a machine that isn't
+    being profiled runs exactly the same code as before.
+    """
+
+    def __init__(self, hardware):
+        self.hardware = hardware
+
+        # (handler name, address) -> [executions, seconds]
+        self.stats = defaultdict(lambda: [0, 0.0])
+        self.pixels = 0           # DXYN sprite pixels drawn in the current frame
+        self.frame_pixels = []    # ... in every finished frame
+
+    def attach(self):
+        self.hardware.patch_dispatch(self.instrument)
+
+    def detach(self):
+        self.hardware.unpatch_dispatch(self.instrument)
+
+    def end_frame(self):
+        """Call once per frame to close the DXYN pixel count for that frame."""
+        self.frame_pixels.append(self.pixels)
+        self.pixels = 0
+
+    def instrument(self, address, slot):
+        method, opcode = slot
+        if method is None:
+            return slot
+
+        stats = self.stats[(method.__name__, address)]
+        clock = time.perf_counter
+
+        if method.__name__.startswith("DRW_"):
+            # Every DXYN variant: plain, _clip, and _planes (a sprite per selected plane, DXY0 16x16)
+            hardware = self.hardware
+            planes = "planes" in method.__name__
+            sprite_bytes = opcode & 0x000F
+            if planes and sprite_bytes == 0:
+                sprite_bytes = 32
+
+            def profiled(opcode):
+                length = sprite_bytes * len(hardware.selected_planes) if planes else sprite_bytes
+                self.pixels += sum(BIT_COUNT[byte] for byte in hardware.memory[hardware.i:hardware.i + length])
+                start = clock()
+                try:
+                    method(opcode)
+                finally:
+                    stats[1] += clock() - start
+                    stats[0] += 1
+        else:
+            def profiled(opcode):
+                start = clock()
+                try:
+                    method(opcode)
+                finally: # Idle-loop handlers end by raising
+                    stats[1] += clock() - start
+                    stats[0] += 1
+
+        profiled.__name__ = method.__name__
+        return (profiled, opcode)
+
+    def report(self, top=20):
+        """Per-handler totals, the hottest addresses and DXYN pixels per frame."""
+        handlers = defaultdict(lambda: [0, 0.0])
+        for (name, _), (count, seconds) in self.stats.items():
+            handlers[name][0] += count
+            handlers[name][1] += seconds
+
+        hot = sorted(self.stats.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        frames = self.frame_pixels
+
+        return {
+            "handlers": [
+                {"handler": name, "count": count, "seconds": seconds,
+                 "ns_per_call": seconds / count * 1e9 if count else 0.0}
+                for name, (count, seconds) in sorted(handlers.items(), key=lambda item: -item[1][1])
+            ],
+            "hot_addresses": [
+                {"address": f"{address:03X}", "handler": name, "count": count, "seconds": seconds}
+                for (name, address), (count, seconds) in hot
+            ],
+            "dxyn_pixels": {
+                "frames": len(frames),
+                "total": sum(frames),
+                "max_per_frame": max(frames, default=0),
+                "mean_per_frame": sum(frames) / len(frames) if frames else 0.0,
+            },
+        }
+
+    def write_report(self, path, top=20):
+        with open(path, "w") as f:
+            json.dump(self.report(top), f, indent=2)
+
+    def write_flamegraph(self, path, weight="time"):
+        """
+        Collapsed-stack file ("chip8;HANDLER;0xADDR value" per line) for flamegraph.pl
+        or speedscope. weight is "time" (microseconds) or "count".
+        """
+        with open(path, "w") as f:
+            for (name, address), (count, seconds) in sorted(self.stats.items()):
+                value = count if weight == "count" else round(seconds * 1e6)
+                if value:
+                    f.write(f"chip8;{name};0x{address:03X} {value}\n")
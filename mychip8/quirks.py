@@ -0,0 +1,105 @@
+"""
+Quirk profiles: the behaviours CHIP-8 interpreters disagree on, per platform.
+
+A profile is resolved once, when the machine is built, into opcode tables that
+name the matching handler variants (see the QUIRK VARIANTS in chip8.py), so the
+interpreter never checks a quirk while running.
+
+Profiles can be picked per ROM from a JSON database keyed by the ROM's SHA-1:
+
+    {"<sha1>": "cosmac-vip", "<sha1>": {"profile": "schip", "clip": false}}
+"""
+import hashlib
+import json
+
+from mychip8.chip8 import Chip8Hardware
+from mychip8.opcodes import (OPCODE_TABLE, SUB_TABLE_0, SUB_TABLE_5, SUB_TABLE_8, SUB_TABLE_E, SUB_TABLE_F,
+                             SCHIP_TABLES, XO_CHIP_TABLES)
+
+# platform:      instruction set, "chip-8", "schip" or "xo-chip"
+# shift_vy:      8XY6/8XYE shift VY into VX instead of shifting VX
+# vf_last:       8XY4-8XYE write VF after the result, so VF as X keeps the flag
+# vf_reset:      8XY1/8XY2/8XY3 clear VF
+# jump_vx:       BNNN is BXNN, jumping to XNN + VX instead of NNN + V0
+# memory:        how far FX55/FX65 move I: None, "x" or "x+1"
+# clip:          sprites are cut at the screen edges instead of wrapping
+PROFILES = {
+    # The behaviour this emulator always had
+    "default": {"platform": "chip-8", "shift_vy": False, "vf_last": False, "vf_reset": False,
+                "jump_vx": False, "memory": None, "clip": False},
+    "cosmac-vip": {"platform": "chip-8", "shift_vy": True, "vf_last": True, "vf_reset": True,
+                   "jump_vx": False, "memory": "x+1", "clip": True},
+    "chip-48": {"platform": "chip-8", "shift_vy": False, "vf_last": True, "vf_reset": False,
+                "jump_vx": True, "memory": "x", "clip": True},
+    "schip": {"platform": "schip", "shift_vy": False, "vf_last": True, "vf_reset": False,
+              "jump_vx": True, "memory": None, "clip": True},
+    "xo-chip": {"platform": "xo-chip", "shift_vy": True, "vf_last": True, "vf_reset": False,
+                "jump_vx": False, "memory": "x+1", "clip": False},
+}
+
+BASE_TABLES = {
+    "opcode_table": OPCODE_TABLE,
+    "opcode_table0": SUB_TABLE_0,
+    "opcode_table5": SUB_TABLE_5,
+    "opcode_table8": SUB_TABLE_8,
+    "opcode_tableE": SUB_TABLE_E,
+    "opcode_tableF": SUB_TABLE_F,
+}
+
+PLATFORM_TABLES = {"chip-8": {}, "schip": SCHIP_TABLES, "xo-chip": XO_CHIP_TABLES}
+MEMORY_SIZES = {"chip-8": 4096, "schip": 4096, "xo-chip": 0x10000}
+
+
+def resolve(quirks):
+    """
+    Chip8Hardware keyword arguments (opcode tables and memory size) for a profile
+    name or a dict of quirks.
+    """
+    if isinstance(quirks, str):
+        quirks = PROFILES[quirks]
+    platform = quirks["platform"]
+
+    tables = {name: dict(table) for name, table in {**BASE_TABLES, **PLATFORM_TABLES[platform]}.items()}
+    main, table8, tableF = tables["opcode_table"], tables["opcode_table8"], tables["opcode_tableF"]
+
+    if quirks["vf_last"]:
+        table8.update({0x4: "ADD_Vx_Vy_vf_last", 0x5: "SUB_Vx_Vy_vf_last", 0x7: "SUBN_Vx_Vy_vf_last",
+                       0x6: "SHR_Vx_Vy_vf_last", 0xE: "SHL_Vx_Vy_vf_last"})
+    if quirks["shift_vy"]:
+        table8.update({0x6: "SHR_Vy", 0xE: "SHL_Vy"})
+    if quirks["vf_reset"]:
+        table8.update({0x1: "OR_Vx_Vy_vf_reset", 0x2: "AND_Vx_Vy_vf_reset", 0x3: "XOR_Vx_Vy_vf_reset"})
+    if quirks["jump_vx"]:
+        main[0xB] = "JUMP_Vx"
+    if quirks["memory"] == "x+1":
+        tableF.update({0x55: "LD_I_Vx_inc", 0x65: "LD_Vx_I_inc"})
+    elif quirks["memory"] == "x":
+        tableF.update({0x55: "LD_I_Vx_inc_x", 0x65: "LD_Vx_I_inc_x"})
+    if quirks["clip"]:
+        main[0xD] = "DRW_Vx_Vy_nibble_clip" if main[0xD] == "DRW_Vx_Vy_nibble" else "DRW_Vx_Vy_planes_clip"
+
+    return {**tables, "memory_size": MEMORY_SIZES[platform]}
+
+
+def build_machine(quirks="default", seed=None):
+    """A Chip8Hardware with the handlers of a profile name or quirks dict."""
+    return Chip8Hardware(seed=seed, **resolve(quirks))
+
+
+def load_database(path):
+    """Read a ROM hash database, returns {sha1 hex: quirks dict}."""
+    with open(path) as f:
+        entries = json.load(f)
+
+    database = {}
+    for rom_hash, entry in entries.items():
+        if isinstance(entry, str):
+            entry = {"profile": entry}
+        overrides = {key: value for key, value in entry.items() if key != "profile"}
+        database[rom_hash.lower()] = {**PROFILES[entry.get("profile", "default")], **overrides}
+    return database
+
+
+def quirks_for_rom(rom_data, database, default="default"):
+    """The quirks database holds for rom_data (bytes), or the default profile."""
+    return database.get(hashlib.sha1(rom_data).hexdigest(), PROFILES[default])
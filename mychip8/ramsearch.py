@@ -0,0 +1,177 @@
+"""
+RAM search: find where a ROM keeps its score, lives or RNG state.
+
+A search starts with every memory byte and V register as a candidate and the
+value each one has. Each filter (equal, changed, increased, decreased,
+equal_to) compares the candidates' values now with the values they had at the
+previous round, as one NumPy comparison, and keeps the ones that pass, so a few
+rounds of "play, then filter" narrow thousands of bytes down to the few that
+matter. undo() steps back a round.
+
+Found locations can be pinned as watches, shown live, and frozen: a frozen
+location is written back after every timer tick (tick_hook, for
+Scheduler.tick_hooks), through invalidate_code for memory so the decode cache
+and compiled blocks see it.
+
+Locations are memory addresses, and REGISTERS + n for VN.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Location of V0, above the largest (XO-CHIP) memory
+REGISTERS = 0x10000
+
+# A pinned location, frozen is the value written back every tick or None
+Watch = namedtuple("Watch", "location label frozen")
+
+
+def parse_location(text):
+    """"2F0" (hex address) or "V3" as a location."""
+    text = text.strip().upper()
+    if len(text) == 2 and text[0] == "V":
+        return REGISTERS + int(text[1], 16)
+    return int(text, 16)
+
+
+def location_name(location):
+    if location >= REGISTERS:
+        return f"V{location - REGISTERS:X}"
+    return f"{location:03X}"
+
+
+class RamSearch:
+    def __init__(self, hardware, registers=True):
+        self.hardware = hardware
+        self.registers = registers  # Search V0-VF as well as memory
+        self.watches = {}           # location -> Watch
+        self.rounds = []            # (candidates, values) before each filter, for undo
+        self.start()
+
+    def read_all(self):
+        """Memory, then V0-VF if searched, as a new uint8 array."""
+        memory = np.frombuffer(self.hardware.memory, dtype=np.uint8)
+        if not self.registers:
+            return memory.copy()
+        return np.concatenate((memory, np.frombuffer(self.hardware.v, dtype=np.uint8)))
+
+    # --- Searching ---
+
+    def start(self):
+        """Start a new search: every location is a candidate. Returns how many."""
+        self.values = self.read_all()
+        self.candidates = np.arange(len(self.values))  # Indices into read_all()
+        self.rounds = []
+        return len(self.candidates)
+
+    def update(self):
+        """Take the candidates' current values as the ones the next filter compares with."""
+        self.values = self.read_all()[self.candidates]
+
+    def _filter(self, keep):
+        current = self.read_all()[self.candidates]
+        passed = keep(current, self.values)
+        self.rounds.append((self.candidates, self.values))
+        self.candidates = self.candidates[passed]
+        self.values = current[passed]
+        return len(self.candidates)
+
+    def equal(self):
+        """Keep the candidates unchanged since the previous round, returns how many are left."""
+        return self._filter(np.equal)
+
+    def changed(self):
+        return self._filter(np.not_equal)
+
+    def increased(self):
+        return self._filter(np.greater)
+
+    def decreased(self):
+        return self._filter(np.less)
+
+    def equal_to(self, value):
+        """Keep the candidates holding value now."""
+        return self._filter(lambda current, previous: current == value)
+
+    def undo(self):
+        """Go back to the candidates before the last filter, False when there is none."""
+        if not self.rounds:
+            return False
+        self.candidates, self.values = self.rounds.pop()
+        return True
+
+    def locations(self, limit=None):
+        """The candidate locations (all of them, or the first limit)."""
+        indices = self.candidates[:limit]
+        memory_size = len(self.hardware.memory)
+        return [int(index) if index < memory_size else REGISTERS + int(index) - memory_size
+                for index in indices]
+
+    def results(self, limit=None):
+        """(location, value at the last round, value now) for the candidates."""
+        return [(location, int(value), self.read(location))
+                for location, value in zip(self.locations(limit), self.values)]
+
+    # --- Reading and writing locations ---
+
+    def read(self, location):
+        if location >= REGISTERS:
+            return self.hardware.v[location - REGISTERS]
+        return self.hardware.memory[location]
+
+    def write(self, location, value):
+        hardware = self.hardware
+        if location >= REGISTERS:
+            hardware.v[location - REGISTERS] = value
+        elif hardware.memory[location] != value:
+            hardware.memory[location] = value
+            hardware.invalidate_code(location, location + 1)
+
+    # --- Watches and freezes ---
+
+    def watch(self, location, label=None):
+        if location not in self.watches:
+            self.watches[location] = Watch(location, label or location_name(location), None)
+
+    def unwatch(self, location):
+        self.watches.pop(location, None)
+
+    def freeze(self, location, value=None):
+        """Hold location at value (default: what it holds now), watching it if it isn't."""
+        value = self.read(location) if value is None else value
+        self.watch(location)
+        self.watches[location] = self.watches[location]._replace(frozen=value)
+        self.write(location, value)
+
+    def unfreeze(self, location):
+        if location in self.watches:
+            self.watches[location] = self.watches[location]._replace(frozen=None)
+
+    def apply_freezes(self):
+        for watch in self.watches.values():
+            if watch.frozen is not None:
+                self.write(watch.location, watch.frozen)
+
+    def tick_hook(self, tick):
+        self.apply_freezes()
+
+    def watch_view(self):
+        """Lines of "label ADDR: XX", frozen ones marked with *."""
+        lines = []
+        for location, watch in self.watches.items():
+            name = location_name(location)
+            label = name if watch.label == name else f"{watch.label} {name}"
+            lines.append(f"{label}: {self.read(location):02X}" + (" *" if watch.frozen is not None else ""))
+        return lines
+
+
+def parse_watch(text):
+    """"2F0" or "2F0 score" (hex address or V0-VF, then an optional label) as (location, label or None)."""
+    location, _, label = text.strip().partition(" ")
+    return parse_location(location), label.strip() or None
+
+
+def parse_freeze(text):
+    """"2F0=09" (hex value) or "2F0" (frozen at whatever it holds) as (location, value or None)."""
+    location, _, value = text.partition("=")
+    return parse_location(location), int(value, 16) if value.strip() else None
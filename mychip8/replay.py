@@ -0,0 +1,178 @@
+"""
+Deterministic input recording and replay.
+
+A recording holds the RNG seed, the CPU speed, the ROM hash, the quirks of the
+machine it was made on, every key change
+stamped with the timer tick (frame) it happened before, and the frame hash after
+every tick. Replaying feeds the key changes into Chip8Hardware.keys at the same
+ticks, headless and unthrottled, and checks the frame hashes still match:
+
+    python -m mychip8.replay ROM RECORDING
+"""
+import argparse
+import hashlib
+import json
+import struct
+import time
+
+from mychip8.quirks import PROFILES, build_machine, resolve
+from mychip8.run import engine_runner
+from mychip8.scheduler import Scheduler
+
+MAGIC = b"C8RP"
+VERSION = 2
+# magic, version, seed, instructions_per_second, rom sha1, event count, frame count, quirks length
+HEADER = struct.Struct("<4sHQI20sIIH")
+# Version 1 had no quirks, it was always the default machine
+HEADER_V1 = struct.Struct("<4sHQI20sII")
+# tick, key << 1 | pressed
+EVENT = struct.Struct("<IB")
+FRAME_HASH_SIZE = 8
+
+
+class Recording:
+    def __init__(self, seed, instructions_per_second, rom_hash, events=None, frame_hashes=None,
+                 quirks="default"):
+        self.seed = seed
+        self.instructions_per_second = instructions_per_second
+        self.rom_hash = rom_hash                # sha1 digest of the ROM
+        # Quirks dict (a profile name is stored as its quirks)
+        self.quirks = dict(PROFILES[quirks] if isinstance(quirks, str) else quirks)
+        self.events = events or []              # (tick, key, pressed)
+        self.frame_hashes = frame_hashes or []  # raw digest after every tick
+
+    def save(self, path):
+        quirks = json.dumps(self.quirks, sort_keys=True).encode()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, self.instructions_per_second, self.rom_hash,
+                                len(self.events), len(self.frame_hashes), len(quirks)))
+            f.write(quirks)
+            f.write(b"".join(EVENT.pack(tick, key << 1 | pressed) for tick, key, pressed in self.events))
+            f.write(b"".join(self.frame_hashes))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, version = data[:4], int.from_bytes(data[4:6], "little")
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"{path} is not a MyChip8 recording")
+
+        if version == 1:
+            _, _, seed, ips, rom_hash, event_count, frame_count = HEADER_V1.unpack_from(data)
+            offset = HEADER_V1.size
+            quirks = "default"
+        else:
+            _, _, seed, ips, rom_hash, event_count, frame_count, quirks_length = HEADER.unpack_from(data)
+            offset = HEADER.size
+            quirks = json.loads(data[offset:offset + quirks_length])
+            offset += quirks_length
+
+        events = []
+        for tick, packed in EVENT.iter_unpack(data[offset:offset + event_count * EVENT.size]):
+            events.append((tick, packed >> 1, packed & 1))
+        offset += event_count * EVENT.size
+
+        frame_hashes = [data[offset + n * FRAME_HASH_SIZE:offset + (n + 1) * FRAME_HASH_SIZE]
+                        for n in range(frame_count)]
+        return cls(seed, ips, rom_hash, events, frame_hashes, quirks)
+
+
+def rom_sha1(rom_path):
+    with open(rom_path, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def same_machine(hardware, quirks):
+    """True if hardware was built with these quirks (same opcode tables and memory size)."""
+    machine = resolve(quirks)
+    return len(hardware.memory) == machine.pop("memory_size") and \
+        all(getattr(hardware, name) == table for name, table in machine.items())
+
+
+class InputRecorder:
+    """
+    Records a live session driven by a Scheduler. Call key_event() for every key
+    change; the frame hash is captured after every tick through the scheduler's hooks.
+    quirks are what hardware was built with (a profile name or quirks dict).
+    """
+
+    def __init__(self, hardware, scheduler, rom_path, seed, quirks="default"):
+        if not same_machine(hardware, quirks):
+            raise ValueError("the machine was not built with the quirks given to the recorder")
+        self.hardware = hardware
+        self.scheduler = scheduler
+        self.recording = Recording(seed, scheduler.instructions_per_second, rom_sha1(rom_path), quirks=quirks)
+
+        hardware.rng.seed(seed)
+        scheduler.tick_hooks.append(self.on_tick)
+
+    def key_event(self, key, pressed):
+        self.recording.events.append((self.scheduler.ticks, key, 1 if pressed else 0))
+
+    def on_tick(self, tick):
+        self.recording.frame_hashes.append(bytes.fromhex(self.hardware.frame_hash()))
+
+    def save(self, path):
+        self.recording.save(path)
+
+
+def replay(rom_path, recording, engine="interpreter", quirks=None):
+    """
+    Replay a recording headless as fast as possible, on a machine built with the
+    recording's quirks. quirks, if given, must be the same (ValueError otherwise).
+    Returns the first tick whose frame hash differs, or None if they all match.
+    """
+    if rom_sha1(rom_path) != recording.rom_hash:
+        raise ValueError(f"{rom_path} is not the ROM this recording was made with")
+    if quirks is not None and resolve(quirks) != resolve(recording.quirks):
+        raise ValueError("the recording was made with other quirks")
+
+    hardware = build_machine(recording.quirks, seed=recording.seed)
+    hardware.load_rom(rom_path)
+    scheduler = Scheduler(hardware, engine_runner(hardware, engine), recording.instructions_per_second)
+
+    events = iter(recording.events)
+    pending = next(events, None)
+
+    for tick, expected in enumerate(recording.frame_hashes):
+        while pending is not None and pending[0] <= tick:
+            hardware.keys[pending[1]] = pending[2]
+            pending = next(events, None)
+
+        scheduler.step()
+        if bytes.fromhex(hardware.frame_hash()) != expected:
+            return tick
+
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.replay", description="Replay a recorded session.")
+    parser.add_argument("rom")
+    parser.add_argument("recording")
+    parser.add_argument("--engine", choices=("interpreter", "compiled"), default="interpreter")
+    parser.add_argument("--quirks", choices=PROFILES, help="refuse the recording unless it used this profile")
+    args = parser.parse_args(argv)
+
+    recording = Recording.load(args.recording)
+    start = time.perf_counter()
+    try:
+        diverged = replay(args.rom, recording, args.engine, args.quirks)
+    except ValueError as error:
+        print(error)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    frames = len(recording.frame_hashes)
+    if diverged is None:
+        print(f"{frames} frames replayed in {elapsed:.2f}s, every frame hash matches")
+        return 0
+
+    print(f"frame hash mismatch at frame {diverged} of {frames}")
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
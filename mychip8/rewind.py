@@ -0,0 +1,88 @@
+import time
+import zlib
+from collections import deque
+
+
+def xor_bytes(a, b):
+    """XOR two equally sized byte strings."""
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+class RewindSegment:
+    def __init__(self, keyframe):
+        self.keyframe = keyframe
+        self.deltas = []          # zlib-compressed XOR of each later snapshot against the keyframe
+        self.size = len(keyframe)
+
+
+class RewindBuffer:
+    """
+    Ring buffer of per-frame Chip8Hardware snapshots under a fixed memory cap.
+
+    Every keyframe_interval frames a full snapshot (keyframe) is stored, the frames
+    in between only keep their compressed XOR delta against that keyframe. When the
+    cap is exceeded the oldest keyframe is dropped together with its deltas.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, keyframe_interval=60):
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+
+        self.segments = deque()
+        self.size = 0
+
+        # Measured snapshot cost
+        self.pushes = 0
+        self.push_seconds = 0.0
+
+    def __len__(self):
+        return sum(1 + len(segment.deltas) for segment in self.segments)
+
+    @property
+    def average_push_ms(self):
+        return self.push_seconds / self.pushes * 1000 if self.pushes else 0.0
+
+    def push(self, hardware):
+        """Record the current state of hardware, call once per frame."""
+        start = time.perf_counter()
+        snapshot = hardware.snapshot()
+
+        segment = self.segments[-1] if self.segments else None
+        if (segment is None or len(segment.deltas) + 1 >= self.keyframe_interval
+                or len(snapshot) != len(segment.keyframe)):
+            segment = RewindSegment(snapshot)
+            self.segments.append(segment)
+            self.size += segment.size
+        else:
+            delta = zlib.compress(xor_bytes(snapshot, segment.keyframe), 1)
+            segment.deltas.append(delta)
+            segment.size += len(delta)
+            self.size += len(delta)
+
+        while self.size > self.max_bytes and len(self.segments) > 1:
+            self.size -= self.segments.popleft().size
+
+        self.pushes += 1
+        self.push_seconds += time.perf_counter() - start
+
+    def pop(self, hardware):
+        """Restore the most recent snapshot into hardware and drop it. False when empty."""
+        if not self.segments:
+            return False
+
+        segment = self.segments[-1]
+        if segment.deltas:
+            delta = segment.deltas.pop()
+            segment.size -= len(delta)
+            self.size -= len(delta)
+            hardware.restore(xor_bytes(zlib.decompress(delta), segment.keyframe))
+        else:
+            self.segments.pop()
+            self.size -= segment.size
+            hardware.restore(segment.keyframe)
+
+        return True
+
+    def clear(self):
+        self.segments.clear()
+        self.size = 0
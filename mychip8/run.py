@@ -0,0 +1,134 @@
+"""
+Headless runner: python -m mychip8.run ROM [--cycles N | --frames N]
+
+Runs a ROM as fast as possible without pygame or tkinter and dumps the final
+framebuffer, registers and frame hash. Meant for CI and batch jobs.
+"""
+import argparse
+import json
+import time
+
+from mychip8.compiler import BlockCompiler
+from mychip8.profiler import Profiler
+from mychip8.quirks import PROFILES, build_machine, load_database, quirks_for_rom
+from mychip8.trace import TraceWriter
+
+
+def engine_runner(hardware, engine="interpreter"):
+    """A run(count) function executing count instructions with the chosen engine."""
+    if engine == "compiled":
+        return BlockCompiler(hardware).run
+
+    return hardware.run
+
+
+def run_rom(rom_path, cycles=None, frames=None, cycles_per_frame=10, engine="interpreter",
+            profile=False, trace=None, quirks="default", seed=0):
+    """
+    Run rom_path headless. With frames, timers tick once every cycles_per_frame
+    cycles like in EmulatorScreen.loop; with cycles, timers never tick.
+    Returns the hardware, the elapsed wall time and, with profile, the Profiler
+    that was attached for the whole run (None otherwise). With trace, every
+    instruction is written to that path (see mychip8.trace). quirks is a
+    profile name or a quirks dict (see mychip8.quirks), seed seeds CXKK so a
+    run's final state is the same every time.
+    """
+    hardware = build_machine(quirks, seed=seed)
+    hardware.load_rom(rom_path)
+    run = engine_runner(hardware, engine)
+
+    profiler = Profiler(hardware) if profile else None
+    if profiler:
+        profiler.attach()
+    tracer = TraceWriter(hardware, trace) if trace else None
+    if tracer:
+        tracer.attach()
+
+    start = time.perf_counter()
+
+    # A trace is most useful when the ROM crashed, so it is finished either way
+    try:
+        if frames is not None:
+            for _ in range(frames):
+                run(cycles_per_frame)
+                hardware.tick_timers()
+                if profiler:
+                    profiler.end_frame()
+        else:
+            run(cycles if cycles is not None else cycles_per_frame)
+    finally:
+        if tracer:
+            tracer.close()
+        if profiler:
+            profiler.detach()
+
+    elapsed = time.perf_counter() - start
+    return hardware, elapsed, profiler
+
+
+def dump_state(hardware, seed=0):
+    """Registers, frame hash and framebuffer as a JSON-friendly dict, with the CXKK seed that reproduces them."""
+    return {
+        "seed": seed,
+        "pc": hardware.pc,
+        "i": hardware.i,
+        "sp": hardware.sp,
+        "v": list(hardware.v),
+        "stack": list(hardware.stack[:hardware.sp]),
+        "delay_timer": hardware.delay_timer,
+        "sound_timer": hardware.sound_timer,
+        "frame_hash": hardware.frame_hash(),
+        "framebuffer": ["".join("#" if pixel else "." for pixel in row) for row in hardware.framebuffer()],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.run", description="Run a CHIP-8 ROM headless.")
+    parser.add_argument("rom", help="path to the .ch8 file")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument("--cycles", type=int, help="number of instructions to execute")
+    budget.add_argument("--frames", type=int, help="number of 60 Hz frames to execute")
+    parser.add_argument("--cycles-per-frame", type=int, default=10)
+    parser.add_argument("--engine", choices=("interpreter", "compiled"), default="interpreter")
+    parser.add_argument("--quirks", choices=PROFILES, help="quirk profile (default: from --quirk-db, else default)")
+    parser.add_argument("--quirk-db", help="JSON database of quirk profiles by ROM SHA-1")
+    parser.add_argument("--seed", type=int, default=0, help="CXKK seed")
+    parser.add_argument("--json", action="store_true", help="print the final state as JSON")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="write an opcode profile to PREFIX.json and PREFIX.folded (flamegraph)")
+    parser.add_argument("--trace", metavar="PATH", help="write a binary instruction trace to PATH")
+    args = parser.parse_args(argv)
+
+    if args.cycles is None and args.frames is None:
+        args.frames = 600
+
+    quirks = args.quirks or "default"
+    if args.quirks is None and args.quirk_db:
+        with open(args.rom, "rb") as f:
+            quirks = quirks_for_rom(f.read(), load_database(args.quirk_db))
+
+    hardware, elapsed, profiler = run_rom(args.rom, args.cycles, args.frames, args.cycles_per_frame,
+                                          args.engine, profile=bool(args.profile), trace=args.trace,
+                                          quirks=quirks, seed=args.seed)
+
+    if profiler:
+        profiler.write_report(args.profile + ".json")
+        profiler.write_flamegraph(args.profile + ".folded")
+    state = dump_state(hardware, args.seed)
+    state["seconds"] = elapsed
+
+    if args.json:
+        print(json.dumps(state))
+        return 0
+
+    print("\n".join(state["framebuffer"]))
+    print()
+    print(" ".join(f"V{i:X}={value:02X}" for i, value in enumerate(state["v"])))
+    print(f"I={state['i']:03X} PC={state['pc']:03X} SP={state['sp']} "
+          f"DT={state['delay_timer']} ST={state['sound_timer']}")
+    print(f"frame hash: {state['frame_hash']}  (seed {state['seed']}, {elapsed:.3f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+import time
+
+from mychip8.chip8 import Stop
+
+
+class Scheduler:
+    """
+    Decouples emulation speed, timer rate and display rate.
+
+    Emulated time advances in timer ticks (1/timer_hz s): each tick runs the CPU
+    for its share of instructions_per_second, then decrements the timers. advance()
+    turns host time into ticks, so the display can run at any rate and simply shows
+    the latest state (frame skipping). Every tick runs a fixed, reproducible number
+    of cycles, wherever the host frame boundaries fall.
+    """
+
+    def __init__(self, hardware, run, instructions_per_second=600, timer_hz=60,
+                 max_catchup=0.25, turbo=False):
+        self.hardware = hardware
+        self.run = run                  # run(cycles), e.g. Chip8Hardware.run or BlockCompiler.run
+        self.instructions_per_second = instructions_per_second
+        self.timer_hz = timer_hz
+        self.max_catchup = max_catchup  # Host seconds emulated at most per advance()
+        self.turbo = turbo
+
+        self.ticks = 0                  # Timer ticks (emulated frames) so far
+        self.cycles = 0
+        self.tick_cycles = 0            # Cycles of the current tick already run (it was stopped)
+        self.backlog = 0.0              # Host seconds not emulated yet
+        self.tick_hooks = []            # Called with the tick number after every tick
+
+    @property
+    def emulated_seconds(self):
+        return self.ticks / self.timer_hz
+
+    def cycles_for_tick(self, tick):
+        """Instructions in a given tick, spread evenly when the rate isn't a multiple of timer_hz."""
+        ips, hz = self.instructions_per_second, self.timer_hz
+        return (tick + 1) * ips // hz - tick * ips // hz
+
+    def step(self):
+        """
+        Run exactly one timer tick of emulated time. If a Stop (e.g. a debugger
+        Break) cuts it short, the next step() runs only the rest of it.
+        """
+        cycles = self.cycles_for_tick(self.ticks)
+        try:
+            self.run(cycles - self.tick_cycles)
+        except Stop as stop:
+            self.tick_cycles += stop.cycles
+            raise
+        self.tick_cycles = 0
+        self.hardware.tick_timers()
+
+        self.cycles += cycles
+        self.ticks += 1
+        for hook in self.tick_hooks:
+            hook(self.ticks)
+
+    def add_cycles(self, cycles):
+        """
+        Count cycles run outside step() (e.g. single-stepped in a debugger) in the
+        current tick, finishing the tick (timers and hooks) once they are all run.
+        """
+        self.tick_cycles += cycles
+        if self.tick_cycles >= self.cycles_for_tick(self.ticks):
+            self.step()
+
+    def advance(self, elapsed, budget=1 / 60):
+        """
+        Emulate `elapsed` host seconds, returns the number of ticks run.
+
+        Throttled, a stall longer than max_catchup is dropped instead of replayed.
+        In turbo mode ticks run back to back for `budget` host seconds instead,
+        while timers still follow emulated time.
+        """
+        if self.turbo:
+            deadline = time.perf_counter() + budget
+            ticks = 0
+            while True:
+                self.step()
+                ticks += 1
+                if time.perf_counter() >= deadline:
+                    break
+            self.backlog = 0.0
+            return ticks
+
+        self.backlog = min(self.backlog + elapsed, self.max_catchup)
+        ticks = int(self.backlog * self.timer_hz)
+        self.backlog -= ticks / self.timer_hz
+
+        for _ in range(ticks):
+            self.step()
+        return ticks
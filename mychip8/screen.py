@@ -1,102 +1,390 @@
+import random
+import time
+
 import pygame
 
+from mychip8.audio import AUDIO_BUFFER, AUDIO_RATE, make_beeper
+from mychip8.compiler import BlockCompiler
+from mychip8.debugger import Break, Debugger, parse_breakpoint, parse_watchpoint
+from mychip8.disasm import analyse
+from mychip8.replay import InputRecorder
+from mychip8.rewind import RewindBuffer
+from mychip8.scheduler import Scheduler
+
+
+def key_codes(key_map):
+    """{pygame key code: CHIP-8 key} for a key_map using key names (see settings.py) or pygame key codes."""
+    return {
+        pygame.key.key_code(key) if isinstance(key, str) else key: chip8_key
+        for key, chip8_key in key_map.items()
+    }
+
+
+def native_surface(hardware, palette):
+    """An 8-bit surface at the machine's current resolution."""
+    native = pygame.Surface((hardware.width, hardware.height), depth=8)
+    native.set_palette(palette)
+    return native
+
+
+def blit_screen(hardware, native, scaled, target, position, palette):
+    """
+    Write the machine's frame into native (8-bit, palette indexed by plane bits),
+    scale it into scaled and blit that onto target at position. Returns native,
+    or the new surface replacing it when it is None or the resolution changed.
+    """
+    width, height = hardware.width, hardware.height
+    if native is None or native.get_size() != (width, height):
+        native = native_surface(hardware, palette) # 00FE / 00FF switched resolution
+
+    pixels = hardware.pixel_bytes()
+    pitch = native.get_pitch()
+    buffer = native.get_buffer()
+    if pitch == width:
+        buffer.write(pixels, 0)
+    else:
+        for y in range(height):
+            buffer.write(pixels[y * width:(y + 1) * width], y * pitch)
+    del buffer # Unlocks the surface
+
+    pygame.transform.scale(native, scaled.get_size(), scaled)
+    target.blit(scaled, position)
+    return native
+
+
 class EmulatorScreen:
     def __init__(self, chip8hardware,width: int, height: int, scale: int,
                  bg_color: tuple, pixel_color: tuple,
-                 show_debug: bool, cycles_per_frame: int, key_map: dict):
+                 show_debug: bool, cycles_per_frame: int, key_map: dict,
+                 engine: str = "interpreter", rewind_memory: int = 8 * 1024 * 1024,
+                 instructions_per_second: int = None, display_fps: int = 60, turbo: bool = False,
+                 record_path: str = None, plane_colors: tuple = None,
+                 breakpoints: list = (), watchpoints: list = (), sound: bool = True, volume: float = 0.25,
+                 ram_watches: list = (), ram_freezes: list = (), quirks="default"):
         
+        # Freezes write into the machine behind the recording's back, so a
+        # recorded session can't have any
+        if record_path and ram_freezes:
+            raise ValueError("ram_freezes can't be used while recording (record_path)")
+
         self.chip8 = chip8hardware
         self.width = width
         self.height = height
         self.scale = scale
         self.bg_color = bg_color
         self.pixel_color = pixel_color
+        # XO-CHIP colors for pixels set only in the second plane and in both planes
+        midpoint = tuple((bg + pixel) // 2 for bg, pixel in zip(bg_color, pixel_color))
+        self.plane_colors = plane_colors or (midpoint, pixel_color)
         self.show_debug = show_debug
         self.cycles_per_frame = cycles_per_frame
         self.key_map = key_map
+        self.engine = engine
+
+        # CPU speed defaults to cycles_per_frame at 60 Hz; F3 toggles turbo (unthrottled)
+        self.instructions_per_second = instructions_per_second or cycles_per_frame * 60
+        self.display_fps = display_fps
+        self.turbo = turbo
+
+        # Save a replayable recording of the session there (see mychip8.replay)
+        self.record_path = record_path
+        # Profile name or quirks dict the machine was built with, stored in the recording
+        self.quirks = quirks
+
+        # Hold BACKSPACE to scrub backwards, one frame per frame (0 disables rewind)
+        self.rewind = RewindBuffer(rewind_memory) if rewind_memory else None
+        self.rewinding = False
+
+        # Debugger: stops on these, and while paused F6/F7/F8 step
+        self.breakpoints = breakpoints
+        self.watchpoints = watchpoints
+        self.debugger = Debugger(chip8hardware)
+        self.paused = False
+        self.scheduler = None       # Set by loop(), single steps are counted in its tick
+        self.recorder = None        # Set by loop() when recording
+
+        # RAM search (F9-F12), and the locations shown and held in the overlay. It
+        # needs numpy, so it is only imported and created once watched or used
+        self.ram_search = None
+        if ram_watches:
+            from mychip8.ramsearch import parse_watch
+
+            search = self.start_ram_search()
+            for watch in ram_watches:
+                search.watch(*parse_watch(watch))
+        self.ram_freezes = ram_freezes
+
+        # Beep while the sound timer runs (XO-CHIP: the F002 pattern at the FX3A pitch)
+        self.sound = sound
+        self.volume = volume
 
         self.running = False
 
     def init(self):
+        # A small mixer buffer keeps the beep within a frame of the sound timer
+        pygame.mixer.pre_init(AUDIO_RATE, -16, 1, AUDIO_BUFFER)
         pygame.init()
 
         self.screen = pygame.display.set_mode((self.width * self.scale, self.height * self.scale))
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("monospace", 15)
+        # (text, color) -> rendered surface, so the overlay only renders values that changed
+        self.glyphs = {}
+        self.overlay = None
+
+        # The frame is written at native resolution into an 8-bit surface whose
+        # palette holds the colors (indexed by plane bits), then scaled to the window in one call
+        self.palette = [self.bg_color, self.pixel_color, *self.plane_colors]
+        self.native = native_surface(self.chip8, self.palette)
+        self.scaled = pygame.Surface(self.screen.get_size(), depth=8)
+        self.scaled.set_palette(self.palette)
 
         pygame.display.set_caption("MyPyChip8")
 
+        self.key_codes = key_codes(self.key_map)
+
         self.running = True
 
     def clear(self):
         self.screen.fill(self.bg_color)
     
+    def glyph(self, text, color=(255, 255, 255)):
+        """text rendered in the overlay font, cached."""
+        surface = self.glyphs.get((text, color))
+        if surface is None:
+            if len(self.glyphs) > 4096:
+                self.glyphs.clear()
+            surface = self.glyphs[(text, color)] = self.font.render(text, True, color)
+        return surface
+
     def draw_debug_overlay(self):
-        overlay = pygame.Surface((200, self.height * self.scale), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
+        if self.overlay is None:
+            self.overlay = pygame.Surface((700, self.height * self.scale), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 180))
+        self.screen.blit(self.overlay, (0, 0))
 
+        chip8 = self.chip8
+        blit = self.screen.blit
         y_offset = 10
         for i in range(16):
-            text = self.font.render(f"V{i:X}: {self.chip8.v[i]:02X}", True, (255, 255, 255))
-            overlay.blit(text, (10, y_offset))
+            blit(self.glyph(f"V{i:X}: {chip8.v[i]:02X}"), (10, y_offset))
+            y_offset += 20
+
+        blit(self.glyph(f"I:  {chip8.i:03X}", (255, 255, 0)), (10, y_offset + 10))
+        blit(self.glyph(f"PC: {chip8.pc:03X}", (0, 255, 255)), (10, y_offset + 30))
+
+        # Second column: debugger state, next instructions, stack and memory at I
+        debugger = self.debugger
+        status = f"PAUSED {debugger.stop_reason or ''}" if self.paused else "running"
+        lines = [(status, (255, 128, 0)), (f"SP: {chip8.sp:X}  DT: {chip8.delay_timer:02X}  "
+                                           f"ST: {chip8.sound_timer:02X}", (255, 255, 255))]
+        lines += [(line, (0, 255, 255)) for line in debugger.disassembly(5)]
+        lines += [("stack:", (255, 255, 0))] + [(line, (255, 255, 255)) for line in debugger.stack_view()[:4]]
+        lines += [("memory at I:", (255, 255, 0))] + [(line, (255, 255, 255))
+                                                       for line in debugger.hex_view(chip8.i, rows=6)]
+        y_offset = 10
+        for text, color in lines:
+            blit(self.glyph(text, color), (150, y_offset))
+            y_offset += 20
+
+        # Third column: RAM search candidates and watches
+        search = self.ram_search
+        if search is None:
+            return
+        from mychip8.ramsearch import location_name
+
+        lines = [(f"search: {len(search.candidates)} left", (255, 255, 0))]
+        lines += [(f"{location_name(location)}: {previous:02X} -> {current:02X}", (255, 255, 255))
+                  for location, previous, current in search.results(8)]
+        lines += [("watches:", (255, 255, 0))] + [(line, (0, 255, 255)) for line in search.watch_view()[:8]]
+        y_offset = 10
+        for text, color in lines:
+            blit(self.glyph(text, color), (470, y_offset))
             y_offset += 20
-        
-        text_i = self.font.render(f"I:  {self.chip8.i:03X}", True, (255, 255, 0))
-        text_pc = self.font.render(f"PC: {self.chip8.pc:03X}", True, (0, 255, 255))
-        overlay.blit(text_i, (10, y_offset + 10))
-        overlay.blit(text_pc, (10, y_offset + 30))
 
-        self.screen.blit(overlay, (0, 0))
-        
     def render(self):
-        self.clear()
+        """Redraw the window, returns False when nothing changed since the last frame."""
+        if not self.chip8.draw_flag and not self.show_debug:
+            return False
+        self.chip8.draw_flag = False
+
+        self.native = blit_screen(self.chip8, self.native, self.scaled, self.screen, (0, 0), self.palette)
 
-        for y in range(32):
-            for x in range(64):
-                if self.chip8.screen[y][x]: # Só desenha se for 1
-                    pygame.draw.rect(self.screen, self.pixel_color, 
-                                    (x * self.scale, y * self.scale, self.scale, self.scale))
-        
         if self.show_debug:
             self.draw_debug_overlay()
+
+        return True
+
+    def search_key(self, key, shift):
+        """
+        F9 new search (shift: undo), F10 keep changed (shift: unchanged),
+        F11 keep increased (shift: decreased), F12 watch the candidates once
+        at most 8 are left (shift: freeze or unfreeze every watch, no
+        freezing while recording).
+        """
+        search = self.start_ram_search()
+        self.show_debug = True
+        if key == pygame.K_F9:
+            search.undo() if shift else search.start()
+        elif key == pygame.K_F10:
+            search.equal() if shift else search.changed()
+        elif key == pygame.K_F11:
+            search.decreased() if shift else search.increased()
+        elif shift:
+            frozen = any(watch.frozen is not None for watch in search.watches.values())
+            if frozen or self.recorder is None:
+                for location in list(search.watches):
+                    search.unfreeze(location) if frozen else search.freeze(location)
+        elif len(search.candidates) <= 8:
+            for location in search.locations():
+                search.watch(location)
+
+    def debug_key(self, key):
+        """F5 pause/continue, and while paused F6 step, F7 step over, F8 run to return."""
+        debugger = self.debugger
+        if key == pygame.K_F5:
+            self.paused = not self.paused
+            self.show_debug = self.show_debug or self.paused
+            if not self.paused:
+                debugger.resume()
+        elif not self.paused:
+            return
+        elif key != pygame.K_F6 and \
+                (debugger.arm_step_over() if key == pygame.K_F7 else debugger.arm_run_to_return()):
+            # Run on until the temporary breakpoint stops it
+            debugger.resume()
+            self.paused = False
+        else:
+            debugger.step()
+            # The stepped instruction is part of the current tick
+            self.scheduler.add_cycles(1)
     
+    def start_ram_search(self):
+        """The RamSearch, created on first use and from then on applied every tick."""
+        if self.ram_search is None:
+            from mychip8.ramsearch import RamSearch
+
+            self.ram_search = RamSearch(self.chip8)
+            if self.scheduler:
+                self.scheduler.tick_hooks.append(self.ram_search.tick_hook)
+        return self.ram_search
+
     def load_rom(self, filename):
-        with open(filename, "rb") as f:
-            rom_data = f.read()
-            for i in range(len(rom_data)):
-                self.chip8.memory[0x200 + i] = rom_data[i]
+        return self.chip8.load_rom(filename)
     
     def loop(self, hardware, rom_path):
-        self.load_rom(rom_path)
+        # Decode everything reachable up front instead of on first execution
+        analyse(hardware, self.load_rom(rom_path)).prewarm(hardware)
+
+        for breakpoint in self.breakpoints:
+            self.debugger.break_at(*parse_breakpoint(breakpoint))
+        for watchpoint in self.watchpoints:
+            watchpoint = parse_watchpoint(watchpoint)
+            self.debugger.watch(watchpoint.start, watchpoint.end, watchpoint.read, watchpoint.write)
+
+        # "compiled" runs the ROM through the basic-block compiler
+        run = BlockCompiler(hardware).run if self.engine == "compiled" else hardware.run
+        scheduler = self.scheduler = Scheduler(hardware, run, self.instructions_per_second, turbo=self.turbo)
+        beeper = make_beeper(hardware, self.sound, self.volume)
+        scheduler.tick_hooks.append(beeper.tick_hook)
+
+        # The search made for the watches; one started from here on hooks itself in
+        if self.ram_search:
+            scheduler.tick_hooks.append(self.ram_search.tick_hook)
+        if self.ram_freezes:
+            from mychip8.ramsearch import parse_freeze
+
+            search = self.start_ram_search()
+            for freeze in self.ram_freezes:
+                search.freeze(*parse_freeze(freeze))
+        last_time = time.perf_counter()
+
+        recorder = self.recorder = None
+        if self.record_path:
+            recorder = self.recorder = InputRecorder(hardware, scheduler, rom_path, random.getrandbits(64),
+                                                     self.quirks)
 
         while self.running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    if recorder:
+                        recorder.save(self.record_path)
+                    beeper.close()
                     self.running = False
                     pygame.quit()
                     return False
                 
                 if event.type == pygame.KEYDOWN:
-                    if event.key in self.key_map:
-                        hardware.keys[self.key_map[event.key]] = 1
+                    if event.key in self.key_codes:
+                        hardware.keys[self.key_codes[event.key]] = 1
+                        if recorder:
+                            recorder.key_event(self.key_codes[event.key], True)
                     
                     if event.key == pygame.K_TAB:
                         self.show_debug = not self.show_debug
+                        self.chip8.draw_flag = True # Repaint without the overlay
+
+                    if event.key == pygame.K_BACKSPACE:
+                        # Rewinding would break a recording
+                        self.rewinding = self.rewind is not None and recorder is None
+
+                    if event.key == pygame.K_F3:
+                        scheduler.turbo = not scheduler.turbo
+
+                    if event.key in (pygame.K_F5, pygame.K_F6, pygame.K_F7, pygame.K_F8):
+                        self.debug_key(event.key)
+                        self.chip8.draw_flag = True
+
+                    if event.key in (pygame.K_F9, pygame.K_F10, pygame.K_F11, pygame.K_F12):
+                        self.search_key(event.key, event.mod & pygame.KMOD_SHIFT)
+                        self.chip8.draw_flag = True
 
                 if event.type == pygame.KEYUP:
-                    if event.key in self.key_map:
-                        hardware.keys[self.key_map[event.key]] = 0
+                    if event.key in self.key_codes:
+                        hardware.keys[self.key_codes[event.key]] = 0
+                        if recorder:
+                            recorder.key_event(self.key_codes[event.key], False)
+
+                    if event.key == pygame.K_BACKSPACE:
+                        self.rewinding = False
+
+            if self.rewinding or self.paused:
+                beeper.silence()
+
+            if self.rewinding:
+                # Keep the live key state, only the machine goes back in time
+                keys = bytes(hardware.keys)
+                self.rewind.pop(hardware)
+                scheduler.tick_cycles = 0 # Snapshots are taken between ticks
+                hardware.keys[:] = keys
+
+                if self.render():
+                    pygame.display.flip()
+                self.clock.tick(self.display_fps)
+                last_time = time.perf_counter()
+                continue
 
-            for _ in range(self.cycles_per_frame):
-                self.chip8.cycle()
+            if self.paused:
+                if self.render():
+                    pygame.display.flip()
+                self.clock.tick(self.display_fps)
+                last_time = time.perf_counter()
+                continue
 
-            if self.chip8.delay_timer > 0:
-                self.chip8.delay_timer -= 1
-            if self.chip8.sound_timer > 0:
-                self.chip8.sound_timer -= 1
+            now = time.perf_counter()
+            try:
+                ticks = scheduler.advance(now - last_time, 1 / self.display_fps)
+            except Break as stop:
+                # Continuing runs the rest of the tick that stopped
+                self.debugger.stop_reason = stop.reason
+                self.paused = self.show_debug = True
+                ticks = 0
+            last_time = now
 
-            # Rendering logic would go here
-            self.render()
+            if self.rewind is not None and ticks:
+                self.rewind.push(hardware)
 
-            pygame.display.flip()
-            self.clock.tick(60)
\ No newline at end of file
+            # However many ticks ran, only the latest frame is shown
+            if self.render():
+                pygame.display.flip()
+            self.clock.tick(0 if scheduler.turbo else self.display_fps)
\ No newline at end of file
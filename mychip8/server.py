@@ -0,0 +1,350 @@
+"""
+Frame server: python -m mychip8.server ROMS... [--port 8765 | --unix PATH]
+
+Hosts many headless machines in one asyncio process, each running at its own
+instructions_per_second, and streams their screens to local clients. A client
+subscribes to one machine by name and then receives a frame every time DXYN or
+CLS changed the screen (the draw flag), and can send key events back.
+
+Messages both ways are a MESSAGE header (type, payload length) and a payload:
+
+    client -> server  SUBSCRIBE  machine name (UTF-8), empty asks for MACHINES
+                      KEY        key number, 1 pressed / 0 released
+                      READY      no payload, the client wants the next frame
+    server -> client  FRAME      FRAME_HEADER, then the run-length encoded XOR of
+                                 the frame with the previous one that client got
+                      MACHINES   JSON list of machine names
+                      ERROR      UTF-8 text
+
+A frame is both planes' packed rows (Chip8Hardware.frame_bytes). A keyframe
+(flag set, first frame or new resolution) is XORed with zeros instead.
+
+A client gets one frame per request: SUBSCRIBE asks for the first one and
+READY for each next one, answered as soon as the screen has changed since the
+frame it got last. The frame sent is always the newest, XORed with the last one
+that client got, so a slow client skips frames instead of queueing them and
+never slows down the machine or the other clients.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import struct
+
+from mychip8.quirks import PROFILES, build_machine
+from mychip8.run import engine_runner
+from mychip8.scheduler import Scheduler
+
+MESSAGE = struct.Struct("<BI")
+# frame number, width, height, keyframe
+FRAME_HEADER = struct.Struct("<IHHB")
+
+SUBSCRIBE, KEY, READY = 1, 2, 3
+FRAME, MACHINES, ERROR = 1, 2, 3
+
+NONZERO_RUNS = re.compile(rb"[^\x00]+")
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_delta(previous, frame):
+    """
+    XOR frame with previous (same length, or None for a keyframe) and run-length
+    encode it as (zero run, literal length, literal bytes) groups of varints.
+    """
+    delta = frame if previous is None else \
+        (int.from_bytes(frame, "big") ^ int.from_bytes(previous, "big")).to_bytes(len(frame), "big")
+
+    out = bytearray()
+    position = 0
+    for run in NONZERO_RUNS.finditer(delta):
+        out += _varint(run.start() - position)
+        out += _varint(run.end() - run.start())
+        out += run.group()
+        position = run.end()
+    return bytes(out)
+
+
+def decode_delta(previous, encoded, size):
+    """The frame encode_delta(previous, frame) was made from (previous None for a keyframe)."""
+    delta = bytearray(size)
+    position = offset = 0
+    while offset < len(encoded):
+        zeros, offset = _read_varint(encoded, offset)
+        length, offset = _read_varint(encoded, offset)
+        position += zeros
+        delta[position:position + length] = encoded[offset:offset + length]
+        position += length
+        offset += length
+
+    if previous is None:
+        return bytes(delta)
+    return (int.from_bytes(delta, "big") ^ int.from_bytes(previous, "big")).to_bytes(size, "big")
+
+
+def message(kind, payload=b""):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+
+async def read_message(reader):
+    """(type, payload), raises asyncio.IncompleteReadError when the peer is gone."""
+    kind, length = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    return kind, await reader.readexactly(length)
+
+
+class MachineHost:
+    """
+    One machine run in real time by a Scheduler on the event loop. frame holds
+    the latest (number, width, height, bytes); every subscriber's event is set
+    when a new one is published.
+    """
+
+    def __init__(self, hardware, run=None, instructions_per_second=600, timer_hz=60):
+        self.hardware = hardware
+        self.scheduler = Scheduler(hardware, run or hardware.run, instructions_per_second, timer_hz)
+        self.frame = None
+        self.subscribers = set()    # asyncio.Event per client, set on every new frame
+        self.encoded = {}           # Previous frame number (None: keyframe) -> FRAME message of frame
+        self.error = None
+        self.publish()
+
+    def publish(self):
+        hardware = self.hardware
+        hardware.draw_flag = False
+        number = self.frame[0] + 1 if self.frame else 0
+        self.frame = (number, hardware.width, hardware.height, hardware.frame_bytes() + hardware.frame_bytes(1))
+        self.encoded = {}
+        for changed in self.subscribers:
+            changed.set()
+
+    def frame_message(self, previous):
+        """FRAME message of the latest frame for a client whose last frame was previous (or None)."""
+        number, width, height, data = self.frame
+        if previous is not None and previous[1:3] != (width, height):
+            previous = None # Resolution changed
+        key = previous[0] if previous else None
+        if key not in self.encoded:
+            payload = FRAME_HEADER.pack(number, width, height, previous is None)
+            payload += encode_delta(previous[3] if previous else None, data)
+            self.encoded[key] = message(FRAME, payload)
+        return self.encoded[key]
+
+    async def run(self):
+        """Emulate in real time until cancelled or the machine faults."""
+        loop = asyncio.get_running_loop()
+        period = 1 / self.scheduler.timer_hz
+        last = loop.time()
+        while True:
+            await asyncio.sleep(period)
+            now = loop.time()
+            try:
+                self.scheduler.advance(now - last)
+            except Exception as error:
+                self.error = f"{type(error).__name__}: {error} (pc={self.hardware.pc:03X})"
+                for changed in self.subscribers:
+                    changed.set()
+                return
+            last = now
+            if self.hardware.draw_flag:
+                self.publish()
+
+
+class FrameServer:
+    def __init__(self, hosts):
+        self.hosts = hosts      # name -> MachineHost
+        self.tasks = []
+        self.handlers = set()   # Tasks running handle(), one per connected client
+        self.writers = set()    # Connected clients
+
+    async def start(self, port=8765, host="127.0.0.1", unix_path=None):
+        """Start every machine and listen on TCP host:port, or on unix_path."""
+        self.tasks = [asyncio.create_task(machine.run()) for machine in self.hosts.values()]
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle, unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def stop(self):
+        """Stop the machines and disconnect every client, waiting for their tasks (the listener is the caller's)."""
+        tasks = self.tasks + list(self.handlers)
+        for task in tasks:
+            task.cancel()
+        for writer in list(self.writers):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        self.writers.add(writer)
+        try:
+            kind, payload = await read_message(reader)
+            name = payload.decode()
+            if kind == SUBSCRIBE and not name:
+                writer.write(message(MACHINES, json.dumps(sorted(self.hosts)).encode()))
+            elif kind != SUBSCRIBE or name not in self.hosts:
+                writer.write(message(ERROR, f"no machine {name!r}".encode()))
+            if kind != SUBSCRIBE or name not in self.hosts:
+                await writer.drain()
+                return
+
+            machine = self.hosts[name]
+            ready = asyncio.Event()
+            ready.set() # SUBSCRIBE asks for the first frame
+            sender = asyncio.create_task(self.send_frames(machine, writer, ready))
+            try:
+                while True:
+                    kind, payload = await read_message(reader)
+                    if kind == READY:
+                        ready.set()
+                    elif kind == KEY and len(payload) == 2 and payload[0] < 16:
+                        machine.hardware.keys[payload[0]] = 1 if payload[1] else 0
+            finally:
+                sender.cancel()
+                await asyncio.gather(sender, return_exceptions=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # stop(): end normally, asyncio.start_server's callback logs a cancelled handler as an error
+            pass
+        finally:
+            self.handlers.discard(asyncio.current_task())
+            self.writers.discard(writer)
+            writer.close()
+
+    async def send_frames(self, machine, writer, ready):
+        """Answer each request (ready) with the newest frame once there is one the client hasn't got."""
+        changed = asyncio.Event()
+        machine.subscribers.add(changed)
+        changed.set()
+        sent = None
+        try:
+            while True:
+                await ready.wait()
+                await changed.wait()
+                changed.clear()
+                if machine.error:
+                    writer.write(message(ERROR, machine.error.encode()))
+                    await writer.drain()
+                    return
+                frame = machine.frame
+                if sent is not None and frame[0] == sent[0]:
+                    continue
+                ready.clear()
+                writer.write(machine.frame_message(sent))
+                sent = frame
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            machine.subscribers.discard(changed)
+
+
+class FrameClient:
+    """Asyncio client: subscribe to a machine, read its frames and press its keys."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.frame = None   # (number, width, height, bytes), as the server has it
+        self.requested = True   # SUBSCRIBE asked for the first frame
+
+    @classmethod
+    async def connect(cls, name, port=8765, host="127.0.0.1", unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write(message(SUBSCRIBE, name.encode()))
+        return cls(reader, writer)
+
+    async def next_frame(self):
+        """Wait for the next frame, returns (number, width, height, frame bytes)."""
+        if not self.requested:
+            self.writer.write(message(READY))
+        self.requested = False
+        kind, payload = await read_message(self.reader)
+        if kind != FRAME:
+            raise RuntimeError(payload.decode())
+
+        number, width, height, keyframe = FRAME_HEADER.unpack_from(payload)
+        size = 2 * height * ((width + 7) // 8)
+        previous = None if keyframe else self.frame[3]
+        self.frame = (number, width, height, decode_delta(previous, payload[FRAME_HEADER.size:], size))
+        return self.frame
+
+    async def key(self, key, pressed):
+        self.writer.write(message(KEY, bytes((key, pressed))))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def machines(port=8765, host="127.0.0.1", unix_path=None):
+    """Names of the machines a server hosts."""
+    client = await FrameClient.connect("", port, host, unix_path)
+    kind, payload = await read_message(client.reader)
+    await client.close()
+    return json.loads(payload)
+
+
+async def serve(hosts, port, host, unix_path):
+    server = FrameServer(hosts)
+    listener = await server.start(port, host, unix_path)
+    where = unix_path or f"{host}:{port}"
+    print(f"serving {', '.join(sorted(hosts))} on {where}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.server", description="Stream headless machines.")
+    parser.add_argument("roms", nargs="+", help="ROMs to run, one machine each (named after the file)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--ips", type=int, default=600, help="instructions per second of every machine")
+    parser.add_argument("--engine", choices=("interpreter", "compiled"), default="interpreter")
+    parser.add_argument("--quirks", choices=PROFILES, default="default")
+    args = parser.parse_args(argv)
+
+    hosts = {}
+    for rom in args.roms:
+        name = os.path.splitext(os.path.basename(rom))[0]
+        while name in hosts:
+            name += "_"
+        hardware = build_machine(args.quirks)
+        hardware.load_rom(rom)
+        hosts[name] = MachineHost(hardware, engine_runner(hardware, args.engine), args.ips)
+
+    try:
+        asyncio.run(serve(hosts, args.port, args.host, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
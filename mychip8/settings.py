@@ -1,5 +1,3 @@
-import pygame
-
 PALETTES = {
     "matrix": {"bg": (0, 0, 0), "pixel": (0, 255, 65)},
     "gameboy": {"bg": (155, 188, 15), "pixel": (15, 56, 15)},
@@ -12,12 +10,28 @@ STANDARD_SETTINGS = {
     "scale": 15,
     "bg_color": PALETTES["matrix"]["bg"],
     "pixel_color": PALETTES["matrix"]["pixel"],
+    "plane_colors": None,  # XO-CHIP (second plane only, both planes), None derives them from the palette
     "show_debug": False,
+    # Debugger (TAB shows it, F5 pause/continue, F6 step, F7 step over, F8 run to return)
+    "breakpoints": [],  # e.g. ["2A4", "2B0 if V3 == 5"], hex addresses
+    "watchpoints": [],  # e.g. ["300-30F w", "3A0 r"]
+    # RAM search (F9 new search, F10 changed, F11 increased, F12 watch; shift: undo, unchanged, decreased, freeze)
+    "ram_watches": [],  # e.g. ["2F0 score", "V3"], shown in the overlay
+    "ram_freezes": [],  # e.g. ["2F1=03"], held at that value every tick (not while recording)
     "cycles_per_frame": 10,
+    "engine": "interpreter",  # or "compiled"
+    "instructions_per_second": None,  # None means cycles_per_frame * 60
+    "display_fps": 60,
+    "turbo": False,  # F3 toggles running as fast as possible
+    "record_path": None,  # file to save a replayable input recording to
+    "rewind_memory": 8 * 1024 * 1024,  # bytes kept for BACKSPACE rewind, 0 disables it
+    "sound": True,  # beep while the sound timer runs, silent without an audio device
+    "volume": 0.25,
+    # Key names (pygame.key.name) -> CHIP-8 key, resolved to key codes by EmulatorScreen.init
     "key_map": {
-            pygame.K_1: 0x1, pygame.K_2: 0x2, pygame.K_3: 0x3, pygame.K_4: 0xC,
-            pygame.K_q: 0x4, pygame.K_w: 0x5, pygame.K_e: 0x6, pygame.K_r: 0xD,
-            pygame.K_a: 0x7, pygame.K_s: 0x8, pygame.K_d: 0x9, pygame.K_f: 0xE,
-            pygame.K_z: 0xA, pygame.K_x: 0x0, pygame.K_c: 0xB, pygame.K_v: 0xF
+            "1": 0x1, "2": 0x2, "3": 0x3, "4": 0xC,
+            "q": 0x4, "w": 0x5, "e": 0x6, "r": 0xD,
+            "a": 0x7, "s": 0x8, "d": 0x9, "f": 0xE,
+            "z": 0xA, "x": 0x0, "c": 0xB, "v": 0xF
         }
 }
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Streaming execution trace in a compact binary format.
+
+Each executed instruction becomes a fixed-width record: pc, opcode, I and V0-VF
+after the step. Records are grouped in chunks, each optionally compressed
+(gzip, or zstd when the zstandard package is installed), and an index of the
+chunks at the end of the file lets TraceReader seek straight to a cycle.
+
+    python -m mychip8.trace FILE [--start CYCLE] [--count N]
+"""
+import argparse
+import bisect
+import gzip
+import os
+import struct
+from collections import namedtuple
+
+from mychip8.chip8 import IdleLoop
+
+MAGIC = b"C8TR"
+# magic, version, compression, record size
+HEADER = struct.Struct("<4sHHH")
+# pc, opcode, I, V0-VF
+RECORD = struct.Struct("<HHH16s")
+# file offset, first cycle, records, stored bytes, V0-VF before the first record
+INDEX_ENTRY = struct.Struct("<QQII16s")
+# index offset, chunk count, magic
+FOOTER = struct.Struct("<QI4s")
+
+COMPRESSIONS = {None: 0, "gzip": 1, "zstd": 2}
+
+TraceRecord = namedtuple("TraceRecord", "cycle pc opcode i v changed")
+
+
+def _codec(compression):
+    """(compress, decompress) functions for a compression name."""
+    if compression is None:
+        return bytes, bytes
+    if compression == "gzip":
+        return (lambda data: gzip.compress(data, compresslevel=1)), gzip.decompress
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd traces need the zstandard package") from None
+        return zstandard.ZstdCompressor(level=1).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"unknown compression {compression!r}")
+
+
+class TraceWriter:
+    """
+    Records every instruction a Chip8Hardware executes while attached.
+
+    Tracing is a dispatch patch, so machines without a trace run unchanged. Idle
+    loops are not fast-forwarded while tracing, so every cycle gets a record.
+    Records are packed straight into a preallocated chunk buffer.
+    """
+
+    def __init__(self, hardware, path, compression="gzip", chunk_records=65536):
+        self.hardware = hardware
+        self.compression = compression
+        self.compress = _codec(compression)[0]
+        self.chunk_records = chunk_records
+
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, 1, COMPRESSIONS[compression], RECORD.size))
+
+        self.buffer = bytearray(chunk_records * RECORD.size)
+        self.flushed = 0                # Records already written out
+        self.chunk_v = bytes(hardware.v)
+        self.index = []
+        self.trace, self.filled = self._patch()
+
+    @property
+    def cycles(self):
+        return self.flushed + self.filled() // RECORD.size
+
+    def attach(self):
+        self.hardware.patch_dispatch(self.trace)
+
+    def close(self):
+        """Detach, flush the last chunk and write the index."""
+        if self.trace in self.hardware.dispatch_patches:
+            self.hardware.unpatch_dispatch(self.trace)
+        self.flush(self.filled(reset=True))
+
+        index_offset = self.file.tell()
+        self.file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+        self.file.write(FOOTER.pack(index_offset, len(self.index), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def flush(self, used):
+        """Write out the first used bytes of the buffer as a chunk."""
+        if not used:
+            return
+
+        data = self.compress(bytes(self.buffer[:used]))
+        records = used // RECORD.size
+        self.index.append((self.file.tell(), self.flushed, records, len(data), self.chunk_v))
+        self.file.write(data)
+
+        self.flushed += records
+        self.chunk_v = bytes(self.buffer[used - 16:used])
+
+    def _patch(self):
+        """
+        The dispatch patch and filled(reset=False), the bytes of the buffer in use.
+        Every traced handler shares the write position as a closure variable,
+        the cheapest state to update on every instruction.
+        """
+        hardware = self.hardware
+        buffer = self.buffer
+        end = len(buffer)
+        pack_into = RECORD.pack_into
+        size = RECORD.size
+        position = 0
+
+        def trace(address, slot):
+            method, opcode = slot
+            if method is None:
+                return slot
+
+            def traced(opcode):
+                nonlocal position
+                try:
+                    method(opcode)
+                except IdleLoop:
+                    pass # Run every iteration so each one is traced
+                pack_into(buffer, position, address, opcode, hardware.i, hardware.v)
+                position += size
+                if position == end:
+                    self.flush(end)
+                    position = 0
+
+            traced.__name__ = method.__name__
+            return (traced, opcode)
+
+        def filled(reset=False):
+            nonlocal position
+            used = position
+            if reset:
+                position = 0
+            return used
+
+        return trace, filled
+
+
+class TraceReader:
+    """
+    Iterates the records of a trace file, seeking by cycle through the chunk
+    index. Only the index is read up front, chunks are read one at a time.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a MyChip8 trace")
+        magic, version, compression, record_size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a MyChip8 trace")
+        self.decompress = _codec({code: name for name, code in COMPRESSIONS.items()}[compression])[1]
+
+        # A writer that was never closed leaves no index or footer
+        if size < HEADER.size + FOOTER.size:
+            self.file.close()
+            raise ValueError(f"{path}: truncated trace")
+        self.file.seek(size - FOOTER.size)
+        index_offset, chunks, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != MAGIC or index_offset + chunks * INDEX_ENTRY.size > size - FOOTER.size:
+            self.file.close()
+            raise ValueError(f"{path}: truncated trace")
+        self.file.seek(index_offset)
+        self.index = list(INDEX_ENTRY.iter_unpack(self.file.read(chunks * INDEX_ENTRY.size)))
+        self.first_cycles = [entry[1] for entry in self.index]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(entry[2] for entry in self.index)
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=0):
+        """Yield TraceRecords from cycle `start` on."""
+        chunk = max(bisect.bisect_right(self.first_cycles, start) - 1, 0)
+
+        for offset, first_cycle, count, size, previous_v in self.index[chunk:]:
+            self.file.seek(offset)
+            data = self.decompress(self.file.read(size))
+            for n, (pc, opcode, i, v) in enumerate(RECORD.iter_unpack(data)):
+                cycle = first_cycle + n
+                if cycle >= start:
+                    changed = [reg for reg in range(16) if v[reg] != previous_v[reg]]
+                    yield TraceRecord(cycle, pc, opcode, i, v, changed)
+                previous_v = v
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m mychip8.trace", description="Print a trace file.")
+    parser.add_argument("trace")
+    parser.add_argument("--start", type=int, default=0, help="first cycle to print")
+    parser.add_argument("--count", type=int, default=50, help="number of records to print")
+    args = parser.parse_args(argv)
+
+    with TraceReader(args.trace) as reader:
+        for n, record in enumerate(reader.records(args.start)):
+            if n >= args.count:
+                break
+            changes = " ".join(f"V{reg:X}={record.v[reg]:02X}" for reg in record.changed)
+            print(f"{record.cycle:>10} {record.pc:03X}: {record.opcode:04X} I={record.i:03X} {changes}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
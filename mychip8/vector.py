@@ -0,0 +1,295 @@
+from array import array
+from random import Random
+
+import numpy as np
+
+from mychip8.chip8 import FONTSET, Chip8Hardware
+
+
+class VectorChip8:
+    """
+    N CHIP-8 machines stored as NumPy arrays and stepped together.
+
+    Every step fetches one opcode per lane, groups the lanes by opcode class and
+    runs each group as a handful of array operations, so diverging lanes are just
+    different masks. Each lane follows the same semantics as Chip8Hardware,
+    CXKK included: lane n draws from its own Random(seed + n) (or Random(seeds[n])
+    when seed is a sequence), the stream Chip8Hardware(seed=seed + n) draws from.
+
+    Where Chip8Hardware would raise (stack overflow, reads past the end of memory,
+    key index out of range) the lane is marked in `faulted` and stops executing.
+    """
+
+    def __init__(self, lanes, seed=None):
+        self.lanes = lanes
+        self.width, self.height = 64, 32
+
+        self.memory = np.zeros((lanes, 4096), dtype=np.uint8)
+        self.v = np.zeros((lanes, 16), dtype=np.uint8)
+        self.i = np.zeros(lanes, dtype=np.int32)
+        self.pc = np.full(lanes, 0x200, dtype=np.int32)
+        self.stack = np.zeros((lanes, 16), dtype=np.int32)
+        self.sp = np.zeros(lanes, dtype=np.int32)
+        self.keys = np.zeros((lanes, 16), dtype=np.uint8)
+        self.delay_timer = np.zeros(lanes, dtype=np.int32)
+        self.sound_timer = np.zeros(lanes, dtype=np.int32)
+        self.screen = np.zeros((lanes, self.height, self.width), dtype=np.uint8)
+        self.faulted = np.zeros(lanes, dtype=bool)
+
+        if seed is None or isinstance(seed, int):
+            seeds = [None if seed is None else seed + lane for lane in range(lanes)]
+        else:
+            seeds = list(seed)
+        self.rngs = [Random(lane_seed) for lane_seed in seeds]
+
+        self.memory[:, :len(FONTSET)] = np.frombuffer(FONTSET, dtype=np.uint8)
+
+        self.handlers = {
+            0x0: self._system, 0x1: self._jump, 0x2: self._call,
+            0x3: self._skip_byte, 0x4: self._skip_byte,
+            0x5: self._skip_reg, 0x9: self._skip_reg,
+            0x6: self._load_byte, 0x7: self._add_byte, 0x8: self._alu,
+            0xA: self._load_i, 0xB: self._jump_v0, 0xC: self._random,
+            0xD: self._draw, 0xE: self._keys, 0xF: self._misc,
+        }
+
+    def load_rom(self, rom_data, lanes=None):
+        """Copy rom_data to 0x200 in every lane (or only in `lanes`)."""
+        rom = np.frombuffer(bytes(rom_data), dtype=np.uint8)
+        target = slice(None) if lanes is None else lanes
+        self.memory[target, 0x200:0x200 + len(rom)] = rom
+
+    def tick_timers(self):
+        """Decrement the delay and sound timers of every lane, called at 60 Hz."""
+        np.subtract(self.delay_timer, 1, out=self.delay_timer, where=self.delay_timer > 0)
+        np.subtract(self.sound_timer, 1, out=self.sound_timer, where=self.sound_timer > 0)
+
+    def run(self, cycles):
+        for _ in range(cycles):
+            self.step()
+
+    def run_frames(self, frames, cycles_per_frame=10):
+        """Like EmulatorScreen.loop: cycles_per_frame steps, then a timer tick."""
+        for _ in range(frames):
+            self.run(cycles_per_frame)
+            self.tick_timers()
+
+    def step(self):
+        """Execute one instruction in every live lane."""
+        self._fault(np.nonzero(~self.faulted & (self.pc > 4094))[0])
+        lanes = np.nonzero(~self.faulted)[0]
+
+        pc = self.pc[lanes]
+        opcode = (self.memory[lanes, pc].astype(np.int32) << 8) | self.memory[lanes, pc + 1]
+
+        # 0x0000 halts: the PC doesn't move
+        running = opcode != 0
+        lanes, opcode = lanes[running], opcode[running]
+        self.pc[lanes] += 2
+
+        first = opcode >> 12
+        for group in np.unique(first):
+            selected = first == group
+            self.handlers[int(group)](lanes[selected], opcode[selected])
+
+    # --- Helpers ---
+    def _fault(self, lanes):
+        self.faulted[lanes] = True
+
+    def _vx(self, lanes, opcode):
+        x = (opcode & 0x0F00) >> 8
+        return x, self.v[lanes, x].astype(np.int32)
+
+    def _skip(self, lanes, condition):
+        self.pc[lanes[condition]] += 2
+
+    # --- Opcode classes ---
+    def _system(self, lanes, opcode):
+        cls = lanes[opcode == 0x00E0]
+        self.screen[cls] = 0
+
+        ret = opcode == 0x00EE
+        lanes = lanes[ret]
+        self.sp[lanes] -= 1
+        # Negative stack pointers index from the end like a Python list
+        bad = self.sp[lanes] < -16
+        self._fault(lanes[bad])
+        lanes = lanes[~bad]
+        self.pc[lanes] = self.stack[lanes, self.sp[lanes] % 16]
+
+    def _jump(self, lanes, opcode):
+        self.pc[lanes] = opcode & 0x0FFF
+
+    def _call(self, lanes, opcode):
+        sp = self.sp[lanes]
+        bad = (sp >= 16) | (sp < -16)
+        self._fault(lanes[bad])
+        lanes, opcode, sp = lanes[~bad], opcode[~bad], sp[~bad]
+
+        self.stack[lanes, sp % 16] = self.pc[lanes]
+        self.sp[lanes] += 1
+        self.pc[lanes] = opcode & 0x0FFF
+
+    def _skip_byte(self, lanes, opcode):
+        _, vx = self._vx(lanes, opcode)
+        equal = vx == (opcode & 0x00FF)
+        self._skip(lanes, np.where(opcode >> 12 == 0x3, equal, ~equal))
+
+    def _skip_reg(self, lanes, opcode):
+        _, vx = self._vx(lanes, opcode)
+        vy = self.v[lanes, (opcode & 0x00F0) >> 4]
+        equal = vx == vy
+        self._skip(lanes, np.where(opcode >> 12 == 0x5, equal, ~equal))
+
+    def _load_byte(self, lanes, opcode):
+        self.v[lanes, (opcode & 0x0F00) >> 8] = opcode & 0x00FF
+
+    def _add_byte(self, lanes, opcode):
+        x, vx = self._vx(lanes, opcode)
+        self.v[lanes, x] = (vx + (opcode & 0x00FF)) & 0xFF
+
+    def _alu(self, lanes, opcode):
+        v = self.v
+        for n in np.unique(opcode & 0x000F):
+            selected = (opcode & 0x000F) == n
+            group = lanes[selected]
+            x = (opcode[selected] & 0x0F00) >> 8
+            y = (opcode[selected] & 0x00F0) >> 4
+
+            # Statements follow Chip8Hardware's order so VF as X or Y behaves the same
+            if n == 0x0:
+                v[group, x] = v[group, y]
+            elif n == 0x1:
+                v[group, x] |= v[group, y]
+            elif n == 0x2:
+                v[group, x] &= v[group, y]
+            elif n == 0x3:
+                v[group, x] ^= v[group, y]
+            elif n == 0x4:
+                total = v[group, x].astype(np.int32) + v[group, y]
+                v[group, 0xF] = total > 255
+                v[group, x] = total & 0xFF
+            elif n == 0x5:
+                v[group, 0xF] = v[group, x] >= v[group, y]
+                v[group, x] = (v[group, x].astype(np.int32) - v[group, y]) & 0xFF
+            elif n == 0x6:
+                v[group, 0xF] = v[group, x] & 0x1
+                v[group, x] = v[group, x] >> 1
+            elif n == 0x7:
+                v[group, 0xF] = v[group, y] >= v[group, x]
+                v[group, x] = (v[group, y].astype(np.int32) - v[group, x]) & 0xFF
+            elif n == 0xE:
+                v[group, 0xF] = (v[group, x] & 0x80) >> 7
+                v[group, x] = (v[group, x].astype(np.int32) << 1) & 0xFF
+
+    def _load_i(self, lanes, opcode):
+        self.i[lanes] = opcode & 0x0FFF
+
+    def _jump_v0(self, lanes, opcode):
+        self.pc[lanes] = (opcode & 0x0FFF) + self.v[lanes, 0]
+
+    def _random(self, lanes, opcode):
+        x = (opcode & 0x0F00) >> 8
+        rngs = self.rngs
+        self.v[lanes, x] = np.array([rngs[lane].randrange(256) for lane in lanes]) & (opcode & 0x00FF)
+
+    def _draw(self, lanes, opcode):
+        height = opcode & 0x000F
+        bad = self.i[lanes] + height > 4096
+        self._fault(lanes[bad])
+        lanes, opcode, height = lanes[~bad], opcode[~bad], height[~bad]
+
+        x_start = self.v[lanes, (opcode & 0x0F00) >> 8].astype(np.int32) % self.width
+        y_start = self.v[lanes, (opcode & 0x00F0) >> 4].astype(np.int32) % self.height
+        collision = np.zeros(len(lanes), dtype=np.uint8)
+
+        for row in range(int(height.max(initial=0))):
+            drawing = row < height
+            group = lanes[drawing]
+            sprite_byte = self.memory[group, self.i[group] + row]
+            curr_y = (y_start[drawing] + row) % self.height
+
+            for col in range(8):
+                pixel = (sprite_byte >> (7 - col)) & 1
+                curr_x = (x_start[drawing] + col) % self.width
+                collision[drawing] |= self.screen[group, curr_y, curr_x] & pixel
+                self.screen[group, curr_y, curr_x] ^= pixel
+
+        self.v[lanes, 0xF] = collision
+
+    def _keys(self, lanes, opcode):
+        kk = opcode & 0x00FF
+        known = (kk == 0x9E) | (kk == 0xA1)
+        lanes, opcode, kk = lanes[known], opcode[known], kk[known]
+
+        _, key = self._vx(lanes, opcode)
+        bad = key > 15
+        self._fault(lanes[bad])
+        lanes, key, kk = lanes[~bad], key[~bad], kk[~bad]
+
+        pressed = self.keys[lanes, key] == 1
+        self._skip(lanes, np.where(kk == 0x9E, pressed, ~pressed))
+
+    def _misc(self, lanes, opcode):
+        for kk in np.unique(opcode & 0x00FF):
+            selected = (opcode & 0x00FF) == kk
+            group = lanes[selected]
+            x = (opcode[selected] & 0x0F00) >> 8
+            vx = self.v[group, x].astype(np.int32)
+
+            if kk == 0x07:
+                self.v[group, x] = self.delay_timer[group]
+            elif kk == 0x0A:
+                pressed = self.keys[group] == 1
+                found = pressed.any(axis=1)
+                self.v[group[found], x[found]] = pressed[found].argmax(axis=1)
+                self.pc[group[~found]] -= 2
+            elif kk == 0x15:
+                self.delay_timer[group] = vx
+            elif kk == 0x18:
+                self.sound_timer[group] = vx
+            elif kk == 0x1E:
+                self.i[group] = (self.i[group] + vx) & 0xFFF
+            elif kk == 0x29:
+                self.i[group] = (vx & 0x0F) * 5
+            elif kk == 0x33:
+                self._memory_access(group, 3)
+                group, vx = group[~self.faulted[group]], vx[~self.faulted[group]]
+                address = self.i[group]
+                self.memory[group, address] = vx // 100
+                self.memory[group, address + 1] = (vx % 100) // 10
+                self.memory[group, address + 2] = vx % 10
+            elif kk in (0x55, 0x65):
+                self._memory_access(group, x + 1)
+                keep = ~self.faulted[group]
+                group, x = group[keep], x[keep]
+                for count in range(int(x.max(initial=-1)) + 1):
+                    copying = count <= x
+                    lanes_copying = group[copying]
+                    address = self.i[lanes_copying] + count
+                    if kk == 0x55:
+                        self.memory[lanes_copying, address] = self.v[lanes_copying, count]
+                    else:
+                        self.v[lanes_copying, count] = self.memory[lanes_copying, address]
+
+    def _memory_access(self, lanes, length):
+        self._fault(lanes[self.i[lanes] + length > 4096])
+
+    # --- Comparing with Chip8Hardware ---
+    def lane_hardware(self, lane):
+        """A Chip8Hardware holding a copy of one lane's state."""
+        hardware = Chip8Hardware()
+        hardware.memory[:] = self.memory[lane].tolist()
+        hardware.invalidate_code(0, len(hardware.memory))
+        hardware.v[:] = self.v[lane].tolist()
+        hardware.i = int(self.i[lane])
+        hardware.pc = int(self.pc[lane])
+        hardware.sp = int(self.sp[lane])
+        hardware.stack[:] = array("H", self.stack[lane].tolist())
+        hardware.keys[:] = self.keys[lane].tolist()
+        hardware.delay_timer = int(self.delay_timer[lane])
+        hardware.sound_timer = int(self.sound_timer[lane])
+        hardware.rng.setstate(self.rngs[lane].getstate())
+
+        hardware.screen[:] = [int.from_bytes(np.packbits(row).tobytes(), "big") for row in self.screen[lane]]
+        return hardware